@@ -3,7 +3,7 @@ Database engine, session, and utilities for Xcloud.
 Uses SQLAlchemy with SQLite.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import declarative_base, sessionmaker
 import os
 import uuid
@@ -30,10 +30,30 @@ def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+# Columns added to tables after they were first released; create_all does
+# not add columns to a table that already exists.
+_ADDED_COLUMNS = {
+    "chats": {"history_summary": "TEXT", "summarized_until": "INTEGER"},
+}
+
+
 def init_db():
     """Create all tables if they don't exist."""
     # Import models so they are registered on Base.metadata
     Base.metadata.create_all(engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in _ADDED_COLUMNS.items():
+            present = {c["name"] for c in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in present:
+                    conn.execute(
+                        text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+                    )
 
 
 def get_db():
@@ -81,6 +81,10 @@ class Chat(Base):
                      nullable=False, index=True)
     title = Column(String(255), default="New Chat")
     model = Column(String(100), nullable=True)
+    # Rolling summary of the messages up to summarized_until (a Message id),
+    # kept by history_service in place of those older turns.
+    history_summary = Column(Text, nullable=True)
+    summarized_until = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=utcnow)
     updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
@@ -0,0 +1,12 @@
+"""
+Benchmarks for the RAG pipeline.
+
+Run from the src directory, e.g.:
+
+    uv run python -m benchmarks.indexing --txt 120 --md 40 --pdf 40 --latency-ms 40
+
+Each benchmark works in a scratch directory (its own .chroma_db and
+.rag_state), embeds through a local stand-in for Ollama's embedding API
+(see common.FakeOllamaServer) so runs are repeatable without a GPU, and
+writes its results as JSON so runs can be compared across commits.
+"""
@@ -0,0 +1,359 @@
+"""
+Shared pieces of the RAG benchmarks: synthetic corpora, a fake Ollama
+embedding server with stand-in embedders, and result/RSS helpers.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# --- synthetic corpus ---
+
+_SYLLABLES = (
+    "ka lo mi ne su ra to vi pe do ga ri mu sa te no li be fo zu ha ye "
+    "qui ster tran pol gen ver dex lum cor"
+).split()
+
+
+def make_vocabulary(size: int, seed: int = 0) -> list:
+    """Deterministic pseudo-words, e.g. 'kapolmi'."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES)
+                          for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_document(rng: random.Random, vocabulary: list, n_words: int,
+                  topic: list | None = None) -> str:
+    """
+    Paragraphs of sentences drawn from `vocabulary`; about a fifth of the
+    words come from `topic` when given, so documents are separable.
+    """
+    paragraphs = []
+    words_left = n_words
+    while words_left > 0:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            length = min(words_left, rng.randint(8, 20))
+            if length <= 0:
+                break
+            words = [
+                rng.choice(topic) if topic and rng.random() < 0.2
+                else rng.choice(vocabulary)
+                for _ in range(length)
+            ]
+            words_left -= length
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: str, text: str, chars_per_line: int = 90,
+                   lines_per_page: int = 50) -> int:
+    """
+    Write `text` as a minimal text-based PDF (Helvetica, one Tj per line) so
+    pypdf extracts it like a real document. Returns the page count.
+    """
+    lines = []
+    for paragraph in text.split("\n\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > chars_per_line:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        lines.append("")
+    pages = [
+        lines[i:i + lines_per_page]
+        for i in range(0, len(lines), lines_per_page)
+    ] or [[""]]
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then (page, content) pairs.
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 "
+               b"/BaseFont /Helvetica >>"]
+    kids = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 50 800 Td\n" + "".join(
+            f"({_pdf_escape(line)}) Tj T*\n" for line in page_lines
+        ) + "ET"
+        data = stream.encode("latin-1", "replace")
+        content_num = len(objects) + 2
+        kids.append(len(objects) + 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {content_num} 0 R >>".encode()
+        )
+        objects.append(
+            f"<< /Length {len(data)} >>\nstream\n".encode() + data
+            + b"\nendstream"
+        )
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = (
+        f"<< /Type /Pages /Count {len(kids)} /Kids ["
+        + " ".join(f"{k} 0 R" for k in kids) + "] >>"
+    ).encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+    with open(path, "wb") as f:
+        f.write(out)
+    return len(pages)
+
+
+def make_corpus(folder: str, n_txt: int = 50, n_md: int = 25, n_pdf: int = 25,
+                words_per_doc: int = 800, seed: int = 0,
+                vocabulary_size: int = 5000, subdirs: int = 4) -> dict:
+    """
+    Generate a corpus of .txt, .md and text .pdf files under `folder`,
+    spread over `subdirs` sub-folders. Returns a description of it.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size, seed)
+    os.makedirs(folder, exist_ok=True)
+    files = []
+    kinds = ["txt"] * n_txt + ["md"] * n_md + ["pdf"] * n_pdf
+    for i, kind in enumerate(kinds):
+        sub = os.path.join(folder, f"part{i % max(1, subdirs)}")
+        os.makedirs(sub, exist_ok=True)
+        text = make_document(
+            rng, vocabulary, rng.randint(words_per_doc // 2,
+                                         words_per_doc * 3 // 2)
+        )
+        full = os.path.join(sub, f"doc{i:05d}.{kind}")
+        if kind == "pdf":
+            write_text_pdf(full, text)
+        else:
+            if kind == "md":
+                text = f"# Document {i}\n\n{text}"
+            with open(full, "w") as f:
+                f.write(text)
+        files.append(full)
+    return {
+        "folder": folder,
+        "files": len(files),
+        "txt": n_txt,
+        "md": n_md,
+        "pdf": n_pdf,
+        "words_per_doc": words_per_doc,
+        "bytes": sum(os.path.getsize(p) for p in files),
+        "seed": seed,
+    }
+
+
+# --- fake Ollama ---
+
+def fake_embedding(text: str, dim: int) -> list:
+    """A deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def hashing_embedding(text: str, dim: int) -> list:
+    """
+    A deterministic bag-of-words embedding (signed feature hashing of the
+    lower-cased words, L2-normalized): texts sharing words are similar, so
+    retrieval quality can be measured without a real model.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little")
+        vector[bucket % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class FakeOllamaServer:
+    """
+    Serves Ollama's /api/embed (and legacy /api/embeddings) on localhost
+    with a configurable delay: latency_ms per request plus per_input_ms per
+    input text, optionally +-jitter. `embed` maps texts to vectors
+    (default: fake_embedding). Use as a context manager; .url is the
+    base_url for OllamaEmbedding.
+    """
+
+    def __init__(self, dim: int = 768, latency_ms: float = 20.0,
+                 per_input_ms: float = 1.0, jitter: float = 0.0,
+                 embed=None, seed: int = 0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.per_input_ms = per_input_ms
+        self.jitter = jitter
+        self.embed = embed or (lambda text: fake_embedding(text, dim))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.inputs = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._server = None
+        self._thread = None
+
+    def _delay(self, n_inputs: int) -> float:
+        seconds = (self.latency_ms + self.per_input_ms * n_inputs) / 1000
+        if self.jitter:
+            with self._lock:
+                seconds *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, seconds)
+
+    def _handle(self, route: str, body: dict):
+        if route == "/api/embed":
+            texts = body.get("input") or []
+            if isinstance(texts, str):
+                texts = [texts]
+            key = "embeddings"
+        elif route == "/api/embeddings":
+            texts = [body.get("prompt", "")]
+            key = "embedding"
+        else:
+            return 404, {"error": f"not found: {route}"}
+
+        with self._lock:
+            self.requests += 1
+            self.inputs += len(texts)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self._delay(len(texts)))
+            vectors = [self.embed(text) for text in texts]
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if key == "embedding":
+            return 200, {"embedding": vectors[0]}
+        return 200, {"model": body.get("model", ""), "embeddings": vectors}
+
+    def __enter__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                status, payload = server._handle(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "inputs": self.inputs,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+# --- environment and results ---
+
+def enter_workdir(path: str) -> str:
+    """
+    chdir into a scratch directory before services are imported: Chroma
+    and the RAG state directory are resolved relative to the cwd.
+    """
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    return path
+
+
+def peak_rss_mb() -> dict:
+    """Peak resident set size so far of this process and of its children."""
+    # ru_maxrss is in KiB on Linux, bytes on macOS.
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return {
+        "self": round(own / 2**20, 1),
+        "children": round(children / 2**20, 1),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(args) -> dict:
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def write_results(path: str, results: dict) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
@@ -0,0 +1,196 @@
+"""
+RAG indexing throughput benchmark.
+
+Generates a synthetic corpus (txt, md and text PDFs), starts a fake Ollama
+embedding server with the requested latency and drives
+rag_service.create_index_from_folder_cancellable end to end: a full build,
+a streaming build and an incremental update after changing part of the
+corpus. Reports docs/sec, nodes/sec, time per phase and peak RSS per run.
+
+    uv run python -m benchmarks.indexing --txt 100 --md 50 --pdf 50 \\
+        --latency-ms 40 --per-input-ms 2 --output bench_results/indexing.json
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks import common
+
+SCENARIOS = ("full", "streaming", "incremental")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    corpus = parser.add_argument_group("corpus")
+    corpus.add_argument("--txt", type=int, default=60)
+    corpus.add_argument("--md", type=int, default=20)
+    corpus.add_argument("--pdf", type=int, default=20)
+    corpus.add_argument("--words", type=int, default=800,
+                        help="average words per document")
+    corpus.add_argument("--seed", type=int, default=0)
+    server = parser.add_argument_group("fake Ollama")
+    server.add_argument("--latency-ms", type=float, default=20.0,
+                        help="fixed delay per embedding request")
+    server.add_argument("--per-input-ms", type=float, default=1.0,
+                        help="extra delay per text in a request")
+    server.add_argument("--jitter", type=float, default=0.0,
+                        help="relative random +- on the delay, e.g. 0.2")
+    server.add_argument("--dim", type=int, default=768)
+    run = parser.add_argument_group("run")
+    run.add_argument("--scenarios", default=",".join(SCENARIOS),
+                     help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    run.add_argument("--change-fraction", type=float, default=0.1,
+                     help="share of text files modified before incremental")
+    run.add_argument("--backend", default="chroma", choices=("chroma", "flat"))
+    run.add_argument("--extract-workers", type=int, default=None)
+    run.add_argument("--embed-concurrency", type=int, default=None)
+    run.add_argument("--embed-cache", action="store_true",
+                     help="keep the on-disk embedding cache enabled")
+    run.add_argument("--text-cache", action="store_true",
+                     help="keep the extracted PDF text cache enabled")
+    run.add_argument("--workdir", default=None,
+                     help="scratch directory (default: a temp dir, removed)")
+    run.add_argument("--output", default="bench_results/indexing.json")
+    return parser.parse_args(argv)
+
+
+def _phase_times(start: float, marks: list, end: float) -> dict:
+    """Turn [(phase, t)] marks into {phase: seconds}, 'setup' before them."""
+    times = {}
+    previous_name, previous_t = "setup", start
+    for name, t in marks + [("", end)]:
+        times[previous_name] = round(
+            times.get(previous_name, 0.0) + t - previous_t, 4
+        )
+        previous_name, previous_t = name, t
+    return times
+
+
+def run_index(rag_service, name: str, folder: str, collection: str,
+              args, **kwargs) -> dict:
+    marks = []
+    started = time.perf_counter()
+    result = rag_service.create_index_from_folder_cancellable(
+        folder, collection,
+        on_phase=lambda phase: marks.append((phase, time.perf_counter())),
+        extract_workers=args.extract_workers,
+        backend=args.backend,
+        **kwargs,
+    )
+    seconds = time.perf_counter() - started
+    docs = result["documents_indexed"]
+    nodes = result["nodes_indexed"]
+    run = {
+        "scenario": name,
+        "seconds": round(seconds, 4),
+        "docs_per_sec": round(docs / seconds, 2) if seconds else None,
+        "nodes_per_sec": round(nodes / seconds, 2) if seconds else None,
+        "phases": _phase_times(started, marks, time.perf_counter()),
+        "peak_rss_mb": common.peak_rss_mb(),
+        "result": result,
+    }
+    print(f"{name:>12}: {seconds:8.2f}s  {docs:6d} docs  {nodes:7d} nodes  "
+          f"{run['nodes_per_sec'] or 0:9.1f} nodes/s  "
+          f"rss {run['peak_rss_mb']['self']} MB")
+    return run
+
+
+def change_files(folder: str, fraction: float, seed: int) -> int:
+    """Append a paragraph to a share of the .txt/.md files."""
+    rng = random.Random(seed + 1)
+    candidates = sorted(
+        os.path.join(root, name)
+        for root, _dirs, files in os.walk(folder)
+        for name in files
+        if name.endswith((".txt", ".md"))
+    )
+    changed = rng.sample(candidates, int(len(candidates) * fraction))
+    vocabulary = common.make_vocabulary(500, seed + 1)
+    for full in changed:
+        with open(full, "a") as f:
+            f.write("\n\n" + common.make_document(rng, vocabulary, 120))
+    return len(changed)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = os.path.abspath(args.output)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="xcloud-bench-")
+    common.enter_workdir(workdir)
+    # Read by the services at import time.
+    if not args.embed_cache:
+        os.environ["XCLOUD_RAG_EMBED_CACHE_MB"] = "0"
+    if not args.text_cache:
+        os.environ["XCLOUD_RAG_TEXT_CACHE_MB"] = "0"
+    if args.embed_concurrency:
+        os.environ["XCLOUD_RAG_EMBED_CONCURRENCY"] = str(args.embed_concurrency)
+
+    from llama_index.embeddings.ollama import OllamaEmbedding
+    from services import rag_service
+
+    folder = os.path.join(workdir, "corpus")
+    shutil.rmtree(folder, ignore_errors=True)
+    started = time.perf_counter()
+    corpus = common.make_corpus(
+        folder, args.txt, args.md, args.pdf, args.words, args.seed
+    )
+    corpus["generate_seconds"] = round(time.perf_counter() - started, 3)
+    print(f"Corpus: {corpus['files']} files, "
+          f"{corpus['bytes'] / 2**20:.1f} MB in {folder}")
+
+    runs = []
+    with common.FakeOllamaServer(
+        dim=args.dim, latency_ms=args.latency_ms,
+        per_input_ms=args.per_input_ms, jitter=args.jitter, seed=args.seed,
+    ) as server:
+        rag_service.embed_model = OllamaEmbedding(
+            model_name="nomic-embed-text:latest", base_url=server.url
+        )
+        if "full" in scenarios:
+            runs.append(run_index(rag_service, "full", folder, "bench", args))
+        if "streaming" in scenarios:
+            runs.append(run_index(
+                rag_service, "streaming", folder, "bench_stream", args,
+                streaming=True,
+            ))
+        if "incremental" in scenarios:
+            if "full" not in scenarios:
+                run_index(rag_service, "full (setup)", folder, "bench", args)
+            changed = change_files(folder, args.change_fraction, args.seed)
+            run = run_index(
+                rag_service, "incremental", folder, "bench", args,
+                incremental=True,
+            )
+            run["files_modified"] = changed
+            runs.append(run)
+        server_stats = server.stats()
+
+    common.write_results(output, {
+        "benchmark": "indexing",
+        "meta": common.run_metadata(args),
+        "corpus": corpus,
+        "server": {
+            "latency_ms": args.latency_ms,
+            "per_input_ms": args.per_input_ms,
+            "jitter": args.jitter,
+            "dim": args.dim,
+            **server_stats,
+        },
+        "runs": runs,
+    })
+    if not args.workdir:
+        os.chdir(os.path.dirname(output))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+RAG retrieval latency and recall benchmark.
+
+Generates a labelled corpus in which every document carries a few unique
+keywords and a reference id, indexes it once per vector backend through a
+fake Ollama server using a deterministic bag-of-words embedder, and runs a
+fixed query set (each query targets one document) through
+rag_service.get_context_for_llm and through the agent's rag_search tool.
+
+For every backend x top_k x variant x cache mode it reports p50/p95/p99
+latency, recall@k (target file among the returned sources), how often the
+target's keyword survives into the text the LLM gets, and context size.
+
+    uv run python -m benchmarks.retrieval --docs 500 --queries 200 \\
+        --backends chroma,flat --top-k 3,5,10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import common
+
+# Retrieval options of get_context_for_llm compared per run.
+VARIANTS = {
+    "vector": {"hybrid": False, "mmr": False},
+    "hybrid": {"hybrid": True, "mmr": False},
+    "hybrid+mmr": {"hybrid": True, "mmr": True},
+}
+CACHE_MODES = ("cold", "warm")
+PATHS = ("context", "agent")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    corpus = parser.add_argument_group("corpus")
+    corpus.add_argument("--docs", type=int, default=300)
+    corpus.add_argument("--topics", type=int, default=20)
+    corpus.add_argument("--words", type=int, default=600,
+                        help="average words per document")
+    corpus.add_argument("--queries", type=int, default=100)
+    corpus.add_argument("--seed", type=int, default=0)
+    server = parser.add_argument_group("fake Ollama")
+    server.add_argument("--latency-ms", type=float, default=5.0,
+                        help="delay per embedding request")
+    server.add_argument("--dim", type=int, default=384)
+    run = parser.add_argument_group("run")
+    run.add_argument("--backends", default="chroma,flat")
+    run.add_argument("--top-k", default="3,5,10")
+    run.add_argument("--variants", default=",".join(VARIANTS),
+                     help=f"comma-separated subset of {', '.join(VARIANTS)}")
+    run.add_argument("--cache", default=",".join(CACHE_MODES),
+                     help="cold: clear the query caches before every query; "
+                     "warm: time a second pass over the query set")
+    run.add_argument("--paths", default=",".join(PATHS),
+                     help="context: get_context_for_llm; agent: rag_search")
+    run.add_argument("--workdir", default=None,
+                     help="scratch directory (default: a temp dir, removed)")
+    run.add_argument("--output", default="bench_results/retrieval.json")
+    return parser.parse_args(argv)
+
+
+def _split(value: str, allowed=None, cast=str) -> list:
+    items = [cast(v.strip()) for v in value.split(",") if v.strip()]
+    if allowed is not None:
+        unknown = set(items) - set(allowed)
+        if unknown:
+            raise SystemExit(f"Unknown values: {', '.join(sorted(unknown))}")
+    return items
+
+
+# --- labelled corpus ---
+
+def make_labelled_corpus(folder: str, n_docs: int, n_topics: int,
+                         words_per_doc: int, n_queries: int, seed: int):
+    """
+    Write n_docs .txt/.md documents and return (corpus info, queries).
+
+    Each document belongs to a topic, and has three unique keywords and a
+    reference id ("REF-00042") planted in its text. A query targets one
+    document: half use two of its keywords plus topic words, half its
+    reference id plus a topic word (the kind of lookup BM25 is for).
+    """
+    rng = random.Random(seed)
+    vocabulary = common.make_vocabulary(
+        4000 + n_topics * 10 + n_docs * 3, seed
+    )
+    rng.shuffle(vocabulary)
+    topic_words = [
+        vocabulary[i * 10:(i + 1) * 10] for i in range(n_topics)
+    ]
+    keywords_pool = vocabulary[n_topics * 10:n_topics * 10 + n_docs * 3]
+    filler = vocabulary[n_topics * 10 + n_docs * 3:]
+
+    os.makedirs(folder, exist_ok=True)
+    docs = []
+    for i in range(n_docs):
+        topic = i % n_topics
+        keywords = keywords_pool[i * 3:(i + 1) * 3]
+        ref = f"REF-{i:05d}"
+        words = common.make_document(
+            rng, filler, rng.randint(words_per_doc // 2,
+                                     words_per_doc * 3 // 2),
+            topic=topic_words[topic],
+        ).split(" ")
+        for planted in keywords * 2 + [ref]:
+            words.insert(rng.randrange(len(words) + 1), planted)
+        ext = "md" if i % 2 else "txt"
+        full = os.path.join(folder, f"topic{topic:03d}", f"doc{i:05d}.{ext}")
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w") as f:
+            f.write(" ".join(words))
+        docs.append({
+            "path": full, "topic": topic, "keywords": keywords, "ref": ref,
+        })
+
+    queries = []
+    for q in range(n_queries):
+        doc = docs[rng.randrange(n_docs)]
+        topic = topic_words[doc["topic"]]
+        if q % 2:
+            text = f"what does {doc['ref']} say about {rng.choice(topic)}"
+            expect = doc["ref"]
+        else:
+            picked = rng.sample(doc["keywords"], 2)
+            text = " ".join(picked + rng.sample(topic, 2))
+            expect = picked[0]
+        queries.append({
+            "query": text, "target": doc["path"], "expect": expect,
+            "kind": "reference" if q % 2 else "keywords",
+        })
+
+    info = {
+        "folder": folder,
+        "docs": n_docs,
+        "topics": n_topics,
+        "words_per_doc": words_per_doc,
+        "queries": n_queries,
+        "seed": seed,
+    }
+    return info, queries
+
+
+# --- measurement ---
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {}
+    data = np.asarray(values, dtype=np.float64)
+    return {
+        "p50": round(float(np.percentile(data, 50)), 3),
+        "p95": round(float(np.percentile(data, 95)), 3),
+        "p99": round(float(np.percentile(data, 99)), 3),
+        "mean": round(float(data.mean()), 3),
+    }
+
+
+def _summarize(samples: list) -> dict:
+    """samples: (latency ms, target found, keyword in text, context chars)."""
+    n = len(samples)
+    return {
+        "queries": n,
+        "latency_ms": _percentiles([s[0] for s in samples]),
+        "recall_at_k": round(sum(s[1] for s in samples) / n, 4) if n else None,
+        "keyword_in_context": (
+            round(sum(s[2] for s in samples) / n, 4) if n else None
+        ),
+        "context_chars": _percentiles([s[3] for s in samples]),
+    }
+
+
+def _measure(call, queries: list, cache: str, rag_cache) -> list:
+    """Time call(query) -> (found, keyword_in_text, chars) over the set."""
+    if cache == "warm":
+        for q in queries:
+            call(q)
+    samples = []
+    for q in queries:
+        if cache == "cold":
+            rag_cache.query_embeddings.clear()
+            rag_cache.retrievals.clear()
+        started = time.perf_counter()
+        found, in_text, chars = call(q)
+        samples.append(
+            ((time.perf_counter() - started) * 1000, found, in_text, chars)
+        )
+    return samples
+
+
+def context_call(rag_service, collection: str, top_k: int, variant: dict):
+    def call(q):
+        context, sources = rag_service.get_context_for_llm(
+            q["query"], top_k, variant["hybrid"], collection, variant["mmr"]
+        )
+        found = any(s.get("file_path") == q["target"] for s in sources)
+        return found, q["expect"] in context, len(context)
+    return call
+
+
+def agent_call(agent_service, loop, collection: str, top_k: int):
+    def call(q):
+        output = loop.run_until_complete(agent_service._execute_tool(
+            "rag_search", {"query": q["query"], "top_k": top_k},
+            None, None, collection,
+        ))
+        if output.startswith("Error executing"):
+            raise RuntimeError(f"Agent rag_search failed: {output}")
+        title = os.path.basename(q["target"])
+        found = f"─ {title} " in output
+        return found, q["expect"] in output, len(output)
+    return call
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = os.path.abspath(args.output)
+    backends = _split(args.backends, ("chroma", "flat"))
+    top_ks = _split(args.top_k, cast=int)
+    variants = _split(args.variants, VARIANTS)
+    cache_modes = _split(args.cache, CACHE_MODES)
+    paths = _split(args.paths, PATHS)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="xcloud-bench-")
+    common.enter_workdir(workdir)
+    os.environ["XCLOUD_RAG_EMBED_CACHE_MB"] = "0"
+
+    from llama_index.embeddings.ollama import OllamaEmbedding
+    from services import rag_cache, rag_service
+
+    folder = os.path.join(workdir, "corpus")
+    shutil.rmtree(folder, ignore_errors=True)
+    corpus, queries = make_labelled_corpus(
+        folder, args.docs, args.topics, args.words, args.queries, args.seed
+    )
+    print(f"Corpus: {corpus['docs']} docs, {len(queries)} queries")
+
+    runs = []
+    builds = {}
+    loop = asyncio.new_event_loop()
+    with common.FakeOllamaServer(
+        dim=args.dim, latency_ms=args.latency_ms, per_input_ms=0.0,
+        embed=lambda text: common.hashing_embedding(text, args.dim),
+    ) as server:
+        rag_service.embed_model = OllamaEmbedding(
+            model_name="bench-hashing", base_url=server.url
+        )
+        agent_service = None
+        if "agent" in paths:
+            from services import agent_service
+
+        for backend in backends:
+            collection = f"bench_{backend}"
+            started = time.perf_counter()
+            result = rag_service.create_index_from_folder_cancellable(
+                folder, collection, backend=backend
+            )
+            builds[backend] = {
+                "seconds": round(time.perf_counter() - started, 3),
+                "nodes": result["nodes_indexed"],
+            }
+            for top_k in top_ks:
+                for cache in cache_modes:
+                    configs = []
+                    if "context" in paths:
+                        configs.extend(
+                            ("context", name, context_call(
+                                rag_service, collection, top_k,
+                                VARIANTS[name],
+                            ))
+                            for name in variants
+                        )
+                    if agent_service is not None:
+                        configs.append(("agent", "hybrid", agent_call(
+                            agent_service, loop, collection, top_k,
+                        )))
+                    for path, variant, call in configs:
+                        summary = _summarize(
+                            _measure(call, queries, cache, rag_cache)
+                        )
+                        runs.append({
+                            "backend": backend,
+                            "top_k": top_k,
+                            "path": path,
+                            "variant": variant,
+                            "cache": cache,
+                            **summary,
+                        })
+                        latency = summary["latency_ms"]
+                        print(
+                            f"{backend:>6} k={top_k:<3} {path:>7} "
+                            f"{variant:>10} {cache:>4}: "
+                            f"p50 {latency['p50']:7.2f} ms  "
+                            f"p95 {latency['p95']:7.2f} ms  "
+                            f"recall {summary['recall_at_k']:.3f}  "
+                            f"in-context {summary['keyword_in_context']:.3f}"
+                        )
+            rag_service.delete_collection(collection)
+        server_stats = server.stats()
+    loop.close()
+
+    common.write_results(output, {
+        "benchmark": "retrieval",
+        "meta": common.run_metadata(args),
+        "corpus": corpus,
+        "server": {
+            "latency_ms": args.latency_ms,
+            "dim": args.dim,
+            "embedder": "hashing",
+            **server_stats,
+        },
+        "builds": builds,
+        "runs": runs,
+    })
+    if not args.workdir:
+        os.chdir(os.path.dirname(output))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
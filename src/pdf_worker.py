@@ -0,0 +1,24 @@
+"""
+PDF text extraction run in rag_extraction's worker processes.
+
+Kept outside the `services` package on purpose: workers are started with
+the "forkserver" (or "spawn") method, which imports the target function's
+module in a fresh interpreter, and importing anything under `services`
+would load the whole app (its package __init__ pulls in every service,
+including the Whisper model). This module only needs pypdf.
+"""
+
+import pypdf
+
+
+def extract_page_range(file_path: str, start: int = 0,
+                       stop: int | None = None) -> list:
+    """Text of pages [start, stop) of a PDF; unreadable pages are empty."""
+    reader = pypdf.PdfReader(file_path)
+    pages = []
+    for page in reader.pages[start:stop]:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception:
+            pages.append("")
+    return pages
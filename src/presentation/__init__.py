@@ -17,8 +17,11 @@ from .email_api import router as email_router
 from .agent_api import router as agent_router
 from .calendar_api import router as calendar_router
 from Data.database import init_db
+from services import llm_service, model_residency, ollama_client
 from services.dir_config import ensure_xcloud_dirs
 from services.recording_watcher import start_recording_watcher
+from services.rag_service import collect_garbage as collect_rag_garbage
+from services.rag_watcher import start_rag_watchers, stop_rag_watchers
 from services.reminder_service import check_and_fire_due_reminders
 
 
@@ -32,6 +35,27 @@ async def _reminder_background_loop():
         await asyncio.sleep(60)
 
 
+async def _model_startup():
+    """
+    Pull a default model if none is installed (never done on a request
+    path), then warm the models up and track which ones stay resident.
+    """
+    await asyncio.get_running_loop().run_in_executor(
+        None, llm_service.ensure_default_model
+    )
+    await model_residency.run()
+
+
+def _log_rag_garbage(future) -> None:
+    try:
+        dropped = future.result()
+    except Exception as e:
+        print(f"[rag] Dropping leftover collection generations failed: {e}")
+        return
+    if dropped:
+        print(f"[rag] Dropped leftover collection generations: {dropped}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: create DB tables and Xcloud user dirs
@@ -39,13 +63,26 @@ async def lifespan(app: FastAPI):
     ensure_xcloud_dirs()
     # Start recording watcher background thread
     recording_observer = start_recording_watcher()
+    # Re-arm auto-reindex watches of RAG collections
+    start_rag_watchers()
+    # Drop RAG collection generations left over from rebuilds before the
+    # last shutdown, off the startup path
+    asyncio.get_running_loop().run_in_executor(
+        None, collect_rag_garbage
+    ).add_done_callback(_log_rag_garbage)
+    # Pull a default model if needed, preload the default and embedding
+    # models, then track which models Ollama keeps resident
+    residency_task = asyncio.create_task(_model_startup())
     # Start background reminder checker
     task = asyncio.create_task(_reminder_background_loop())
     yield
-    # Shutdown: cancel background task and stop watcher
+    # Shutdown: cancel background tasks and stop watcher
     task.cancel()
+    residency_task.cancel()
     recording_observer.stop()
     recording_observer.join()
+    stop_rag_watchers()
+    await ollama_client.aclose()
 
 
 app = FastAPI(title="Xcloud", version="0.3.0", lifespan=lifespan)
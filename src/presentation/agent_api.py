@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 import json
 
 from services import auth_service, chat_service, llm_service, agent_service
+from services import history_service
 from Data.models import User, Chat as ChatModel
 from Data.database import get_db
 
@@ -15,6 +16,7 @@ async def agent_chat(
     prompt: str,
     chat_id: str = None,
     think: bool = False,
+    collection: str | None = None,
     user: User = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -26,6 +28,8 @@ async def agent_chat(
 
     - chat_id: If provided, continues an existing chat. Otherwise creates a new one.
     - think: Enable extended thinking (if model supports it).
+    - collection: RAG collection for the rag_search tool (default: the one
+      loaded via /rag/load).
     """
 
     if chat_id:
@@ -39,7 +43,7 @@ async def agent_chat(
     chat_record = db.query(ChatModel).filter(ChatModel.id == chat_id).first()
     model = chat_record.model if chat_record and chat_record.model else llm_service.get_default_model() or ""
 
-    db_messages = chat_service.get_chat_messages(db, chat_id)
+    history = history_service.build_history(db, chat_id)
 
     chat_service.add_message(db, chat_id, "user", prompt)
 
@@ -50,16 +54,18 @@ async def agent_chat(
 
         async for event_json in agent_service.stream_agent_response(
             prompt=prompt,
-            messages=db_messages,
+            messages=history,
             model=model,
             user=user,
             db=db,
+            collection=collection,
         ):
             parsed = json.loads(event_json)
             if parsed.get("type") == "content":
                 full_reply += parsed["content"]
             elif parsed.get("type") == "done":
                 chat_service.add_message(db, chat_id, "assistant", full_reply)
+                history_service.schedule_summary(chat_id, model)
             yield event_json
 
     return StreamingResponse(stream_with_metadata(), media_type="text/event-stream")
@@ -48,7 +48,7 @@ async def browse_directory(
 
 
 @router.get("/view")
-async def view_file(
+def view_file(
     path: str = Query(..., description="File path to view"),
     user: User = Depends(auth_service.get_current_user),
 ):
@@ -56,6 +56,8 @@ async def view_file(
     Read a file's content with metadata.
     Text files return content as a string, binary files as base64.
     """
+    # A plain def, run in the threadpool: reading a large file or extracting
+    # a PDF's text would otherwise block the event loop.
     expanded = os.path.expanduser(path)
     try:
         return files_service.read_file(expanded)
@@ -3,9 +3,12 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from services import llm_service, whisper, rag_service, search_service
-from services import chat_service, auth_service
+from services import chat_service, auth_service, context_packer
+from services import history_service
+from services import model_residency, ollama_client
 from Data.models import User, Chat as ChatModel
 from Data.database import get_db
+import asyncio
 import os
 import json
 
@@ -23,6 +26,30 @@ async def list_models():
     return llm_service.get_available_models()
 
 
+@router.get("/ollama/pool")
+async def ollama_pool():
+    """Usage of the shared Ollama connection pool."""
+    return ollama_client.pool_stats()
+
+
+@router.get("/ollama/queue")
+async def ollama_queue():
+    """
+    The Ollama request scheduler: running and queued requests and queue
+    waits per priority class, and queued requests per user.
+    """
+    return llm_service.scheduler.stats()
+
+
+@router.get("/models/resident")
+async def resident_models():
+    """
+    Models Ollama has loaded, the interactive model, warm-up results and
+    the keep-alive per kind of model.
+    """
+    return model_residency.status()
+
+
 @router.get("/default-model")
 async def default_model():
     """Return the current default model (from settings.json)."""
@@ -95,6 +122,9 @@ async def set_model(
                 detail=f"Cannot reach Ollama: {available['error']}. Make sure Ollama is running.",
             )
         if name not in available:
+            # Pulled since the cached list was fetched?
+            available = llm_service.get_available_models(refresh=True)
+        if isinstance(available, list) and name not in available:
             raise HTTPException(
                 status_code=400,
                 detail=f"Model '{name}' is not installed. Available models: {available}",
@@ -209,6 +239,9 @@ async def chat(
     use_web_search: bool = False,
     think: bool = False,
     top_k: int = 3,
+    hybrid: bool = True,
+    mmr: bool = False,
+    collection: str | None = None,
     search_results: int = 5,
     user: User = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db),
@@ -218,8 +251,15 @@ async def chat(
 
     - chat_id: If provided, continues an existing chat. Otherwise creates a new one.
     - use_rag: Enrich prompt with local document context from ChromaDB.
+    - hybrid: Fuse vector search with keyword (BM25) search for RAG context.
+    - mmr: Re-rank over-fetched RAG chunks for diversity (fewer near-duplicates).
+    - collection: RAG collection to query (default: the one loaded via /rag/load).
     - use_web_search: Search the web and inject results as context.
     - think: Enable extended thinking (model must support it).
+
+    RAG and web context are packed into the model's context token budget
+    (see context_packer); the "sources" event reports the tokens used and
+    dropped, and each source's "context_tokens" (0 if it did not fit).
     """
 
     # Resolve or create chat
@@ -236,58 +276,84 @@ async def chat(
     model = chat_record.model if chat_record else llm_service.session.model
 
     sources = []
-    context_parts = []
+    context_sections = []  # (header, context_packer chunks)
+    budgeted = []  # (source, its chunk)
+    retrieval_timings = {}
 
     # 1. RAG context
     if use_rag:
-        if rag_service.current_index is None:
+        if not rag_service.has_index(collection):
             raise HTTPException(
                 status_code=400,
                 detail="No RAG index loaded. Please load or create a collection first.",
             )
         try:
-            rag_context, rag_sources = rag_service.get_context_for_llm(prompt, top_k)
-            context_parts.append(f"=== Document Context ===\n{rag_context}")
-            sources.extend([{**s, "type": "rag"} for s in rag_sources])
+            # Off the event loop: the query embedding may queue for Ollama.
+            loop = asyncio.get_running_loop()
+            rag_sources = await loop.run_in_executor(
+                None,
+                lambda: rag_service.retrieve_context(
+                    prompt, top_k, hybrid, collection, mmr,
+                    retrieval_timings, user=user.id,
+                ),
+            )
+            rag_chunks = rag_service.context_chunks(rag_sources)
+            context_sections.append(("=== Document Context ===", rag_chunks))
+            for source, chunk in zip(rag_sources, rag_chunks):
+                source = {**source, "type": "rag"}
+                sources.append(source)
+                budgeted.append((source, chunk))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"RAG error: {str(e)}")
 
     # 2. Web search context
     if use_web_search:
         try:
-            search_context = search_service.format_search_results_as_context(
-                prompt, max_results=search_results
-            )
-            context_parts.append(f"=== Web Search Results ===\n{search_context}")
             web_results = search_service.web_search(prompt, max_results=search_results)
+            web_chunks = []
+            if not web_results:
+                web_chunks.append({"label": "[Web Search]", "text": "No web search results found."})
             for i, result in enumerate(web_results, 1):
-                if "error" not in result:
-                    sources.append(
-                        {
-                            "id": f"web-{i}",
-                            "type": "web",
-                            "title": result.get("title", ""),
-                            "url": result.get("href", ""),
-                            "text": result.get("body", "")[:200] + "...",
-                        }
-                    )
+                if "error" in result:
+                    web_chunks.append({"label": "[Web Search]", "text": f"Web search failed: {result['error']}"})
+                    continue
+                source = {
+                    "id": f"web-{i}",
+                    "type": "web",
+                    "title": result.get("title", ""),
+                    "url": result.get("href", ""),
+                    "text": result.get("body", "")[:200] + "...",
+                }
+                chunk = {
+                    "label": f"[Web Source {i}]",
+                    "text": search_service.format_result(result),
+                    "source": result.get("href"),
+                }
+                sources.append(source)
+                web_chunks.append(chunk)
+                budgeted.append((source, chunk))
+            context_sections.append(("=== Web Search Results ===", web_chunks))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Web search error: {str(e)}")
 
     # Build a per-request LLM session with chat history from DB
-    llm_session = llm_service.LLMSession(model=model)
-
-    # Load conversation history from database
-    db_messages = chat_service.get_chat_messages(db, chat_id)
-    llm_session.conversation_history = [
-        {"role": m["role"], "content": m["content"]}
-        for m in db_messages
-        if m["role"] in ("user", "assistant")
-    ]
-
-    # Set context (FIXED: set on the session instance, not module)
-    if context_parts:
-        llm_session.extra_context = "\n\n".join(context_parts)
+    llm_session = llm_service.LLMSession(model=model, user_id=user.id)
+
+    # Recent turns verbatim, older ones as the chat's rolling summary
+    llm_session.conversation_history = history_service.build_history(
+        db, chat_id
+    )
+
+    # Pack the context into the model's budget and set it on the session
+    context_report = None
+    if context_sections:
+        extra_context, context_report = context_packer.pack(
+            context_sections, context_packer.budget_for_model(model)
+        )
+        for source, chunk in budgeted:
+            source["context_tokens"] = chunk["tokens"]
+        if extra_context:
+            llm_session.extra_context = extra_context
 
     # Save user message to DB
     chat_service.add_message(db, chat_id, "user", prompt)
@@ -298,8 +364,14 @@ async def chat(
         yield json.dumps({"type": "chat_id", "data": chat_id}) + "\n"
 
         # Send sources as first event
-        if sources:
-            yield json.dumps({"type": "sources", "data": sources}) + "\n"
+        if sources or context_report:
+            yield json.dumps(
+                {"type": "sources", "data": sources, "context": context_report}
+            ) + "\n"
+        if retrieval_timings:
+            yield json.dumps(
+                {"type": "retrieval", "data": retrieval_timings}
+            ) + "\n"
 
         # Stream LLM response, collecting full reply and thinking
         full_reply = ""
@@ -320,6 +392,7 @@ async def chat(
                     full_reply,
                     thinking=full_thinking if full_thinking else None,
                 )
+                history_service.schedule_summary(chat_id, model)
             yield chunk_json
 
     return StreamingResponse(stream_with_metadata(), media_type="text/event-stream")
@@ -1,26 +1,49 @@
 import os
 
 from fastapi import APIRouter, HTTPException
-from services import rag_service, rag_job
+from services import rag_flat, rag_service, rag_job, rag_watcher
 
 router = APIRouter()
 
 
 @router.post("/index")
-async def index_folder(folder_path: str, collection_name: str = "default"):
+async def index_folder(
+    folder_path: str,
+    collection_name: str = "default",
+    incremental: bool = False,
+    priority: int = 0,
+    streaming: bool = False,
+    backend: str | None = None,
+):
     """
-    Start indexing a folder for RAG retrieval (runs in the background).
-
-    Returns immediately with a job id. Poll GET /rag/index/status for progress
-    and POST /rag/index/cancel to stop it.
+    Queue a folder for RAG indexing (runs in the background).
+
+    Returns immediately with a job id. Poll GET /rag/index/status/{job_id}
+    for progress and POST /rag/index/cancel?job_id=... to pause (or abort)
+    it.
+
+    - incremental: only re-embed files added or changed since the last index
+      of this collection and drop removed ones (used by the UI's "Update").
+    - priority: higher-priority jobs start first.
+    - streaming: split and embed as one bounded-memory pipeline; progress is
+      then reported in source bytes against a pre-scan of the folder.
+    - backend: "chroma" (HNSW, the default) or "flat" (memory-mapped,
+      int8-quantized brute force); kept across later updates.
     """
     if not os.path.exists(folder_path):
         raise HTTPException(
             status_code=400,
             detail=f"Folder path does not exist: {folder_path}",
         )
+    if backend is not None and backend not in rag_flat.BACKENDS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown vector backend: {backend}"
+        )
     try:
-        return rag_job.start_index_job(folder_path, collection_name)
+        return rag_job.start_index_job(
+            folder_path, collection_name, incremental, priority, streaming,
+            backend=backend,
+        )
     except RuntimeError as e:
         raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
@@ -29,20 +52,68 @@ async def index_folder(folder_path: str, collection_name: str = "default"):
 
 @router.get("/index/status")
 async def index_status():
-    """Get the status/progress of the current (or last) indexing job."""
+    """
+    Get the status/progress of the most recent indexing job, plus all
+    queued, running and finished jobs with their timings.
+    """
     return rag_job.get_index_status()
 
 
+@router.get("/index/status/{job_id}")
+async def index_job_status(job_id: str):
+    """Get the status/progress of one indexing job."""
+    try:
+        return rag_job.get_job_status(job_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+
 @router.post("/index/cancel")
-async def index_cancel():
-    """Cancel the running indexing job, if any."""
-    return rag_job.cancel_index_job()
+async def index_cancel(
+    job_id: str | None = None,
+    rollback: bool = False,
+    collection_name: str | None = None,
+):
+    """
+    Cancel an indexing job by id (default: the one running or queued for
+    collection_name, else the most recent one). Queued jobs are removed
+    from the queue; running jobs stop at the next check.
+
+    By default a running job is paused: everything embedded so far is kept
+    and POST /rag/index/resume continues it. With rollback=true it is
+    aborted instead and its partial work is rolled back. A paused or failed
+    run (of the job, or of collection_name when nothing runs for it) is
+    discarded with rollback=true: a rebuild's unfinished generation is
+    deleted, an update keeps the files it finished.
+    """
+    try:
+        return rag_job.cancel_index_job(job_id, rollback, collection_name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/index/resume")
+async def index_resume(collection_name: str = "default", priority: int = 0):
+    """
+    Continue a collection's paused, failed or interrupted (e.g. by a server
+    restart) indexing job from its last checkpoint, without re-embedding
+    the files it already finished. Returns the new job like /rag/index.
+    """
+    try:
+        return rag_job.resume_index_job(collection_name, priority)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 @router.post("/load")
 async def load_collection(collection_name: str):
     """
-    Load an existing RAG collection.
+    Load (or reload) an existing RAG collection and make it the default for
+    requests that do not pass a collection.
     """
     try:
         result = rag_service.load_existing_index(collection_name)
@@ -54,7 +125,7 @@ async def load_collection(collection_name: str):
 @router.get("/collections")
 async def list_rag_collections():
     """
-    List all available RAG collections.
+    List all available RAG collections with their file/chunk totals.
     """
     return rag_service.list_collections()
 
@@ -62,7 +133,8 @@ async def list_rag_collections():
 @router.get("/collections/{collection_name}/files")
 async def list_collection_files(collection_name: str):
     """
-    List the distinct source files indexed in a collection.
+    List the distinct source files indexed in a collection, with their
+    chunk counts and sizes when known.
     """
     try:
         return rag_service.get_collection_files(collection_name)
@@ -75,8 +147,8 @@ async def list_collection_files(collection_name: str):
 @router.get("/collections/{collection_name}/source")
 async def collection_source(collection_name: str):
     """
-    Recover the source folder a collection was indexed from (best-effort,
-    from stored file paths). Used by the UI's "Update" action.
+    The source folder a collection was indexed from (from its manifest, or
+    best-effort from stored file paths). Used by the UI's "Update" action.
     """
     try:
         return rag_service.get_collection_source_folder(collection_name)
@@ -91,6 +163,10 @@ async def delete_rag_collection(collection_name: str):
     """
     Delete a RAG collection.
     """
+    try:
+        rag_watcher.unwatch_collection(collection_name)
+    except KeyError:
+        pass
     try:
         return rag_service.delete_collection(collection_name)
     except ValueError as e:
@@ -99,9 +175,54 @@ async def delete_rag_collection(collection_name: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/watches")
+async def list_rag_watches():
+    """
+    List the collections whose source folders are watched for changes.
+    """
+    return rag_watcher.list_watches()
+
+
+@router.post("/collections/{collection_name}/watch")
+async def watch_rag_collection(collection_name: str):
+    """
+    Keep a collection in sync with its source folder: file changes are
+    debounced and applied as small background incremental jobs.
+    """
+    try:
+        return rag_watcher.watch_collection(collection_name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/collections/{collection_name}/watch")
+async def unwatch_rag_collection(collection_name: str):
+    """
+    Stop watching a collection's source folder.
+    """
+    try:
+        return rag_watcher.unwatch_collection(collection_name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+
 @router.get("/status")
-async def rag_status():
+async def rag_status(collection_name: str | None = None):
+    """
+    Get the status of a RAG collection (default: the current one) and of
+    the in-memory index registry.
+    """
+    return rag_service.get_current_collection_info(collection_name)
+
+
+@router.get("/cache/stats")
+async def rag_cache_stats():
     """
-    Get current RAG collection status.
+    Hit rates of the RAG query-embedding and retrieval caches and of the
+    extracted PDF text cache.
     """
-    return rag_service.get_current_collection_info()
+    return rag_service.get_cache_stats()
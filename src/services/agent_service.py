@@ -1,10 +1,11 @@
+import asyncio
 import json
 from googleapiclient.discovery import build
-from ollama import AsyncClient
 from services import gmail_service, task_service
+from services import llm_service, model_residency
 from services import google_calendar_service
 from services import google_tasks_service as gtasks_service
-from services import search_service, rag_service
+from services import search_service, rag_service, context_packer
 from services.google_auth_service import get_google_credentials
 
 AGENT_SYSTEM_PROMPT = """You are Xcloud, an AI assistant with access to Google services, web search, and local documents.
@@ -371,7 +372,8 @@ TOOL_DEFINITIONS = [
 ]
 
 
-async def _execute_tool(name: str, args: dict, user, db) -> str:
+async def _execute_tool(name: str, args: dict, user, db,
+                        collection: str | None = None) -> str:
     try:
         if name == "list_emails":
             folder = args.get("folder", "inbox")
@@ -569,16 +571,32 @@ async def _execute_tool(name: str, args: dict, user, db) -> str:
         elif name == "rag_search":
             query = args["query"]
             top_k = args.get("top_k", 3)
-            if rag_service.current_index is None:
+            if not rag_service.has_index(collection):
                 return "No document index is loaded. Use the RAG API to load a collection first."
-            context, sources = rag_service.get_context_for_llm(query, top_k=top_k)
-            if not context:
+            loop = asyncio.get_running_loop()
+            sources = await loop.run_in_executor(
+                None,
+                lambda: rag_service.retrieve_context(
+                    query, top_k=top_k, collection_name=collection,
+                    priority=llm_service.AGENT,
+                    user=getattr(user, "id", None),
+                ),
+            )
+            if not sources:
                 return "No relevant documents found."
+            context, report = context_packer.pack(
+                [("=== Document Context ===", rag_service.context_chunks(sources))],
+                context_packer.TOOL_BUDGET,
+            )
             lines = [f"Retrieved {len(sources)} relevant document chunk(s):"]
             for s in sources:
                 lines.append(f"  ─ {s.get('title','doc')} (score: {s.get('score',0):.2f})")
+                if s.get("also_in"):
+                    lines.append(f"      also in: {', '.join(s['also_in'])}")
+            if report["chunks_dropped"] or report["chunks_truncated"]:
+                lines.append(f"  ({report['tokens_dropped']} tokens of context left out)")
             lines.append("")
-            lines.append(context[:2000])
+            lines.append(context)
             return "\n".join(lines)
 
         else:
@@ -593,28 +611,32 @@ async def stream_agent_response(
     model: str,
     user,
     db,
+    collection: str | None = None,
 ):
     yield json.dumps({"type": "agent_start"}) + "\n"
 
     full_messages = (
         [{"role": "system", "content": AGENT_SYSTEM_PROMPT}]
-        + [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] in ("user", "assistant")]
+        + [{"role": m["role"], "content": m["content"]} for m in messages if m["role"] in ("user", "assistant", "system")]
         + [{"role": "user", "content": prompt}]
     )
 
     max_turns = 10
     turn = 0
+    model_residency.mark_interactive(model)
 
     while turn < max_turns:
         turn += 1
         response_content = ""
         tool_calls = None
 
-        async for part in await AsyncClient().chat(
+        async for part in llm_service.chat_stream(
+            llm_service.AGENT,
+            user.id,
             model=model,
             messages=full_messages,
             tools=TOOL_DEFINITIONS,
-            stream=True,
+            keep_alive=model_residency.keep_alive(model),
         ):
             msg = part.get("message", {})
             if msg.get("tool_calls"):
@@ -641,7 +663,7 @@ async def stream_agent_response(
 
             yield json.dumps({"type": "tool_call", "name": name, "args": args}) + "\n"
 
-            result = await _execute_tool(name, args, user, db)
+            result = await _execute_tool(name, args, user, db, collection)
 
             yield json.dumps({"type": "tool_result", "name": name, "result": result[:1000]}) + "\n"
 
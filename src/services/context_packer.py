@@ -0,0 +1,194 @@
+"""
+Token-budgeted packing of retrieved context (RAG chunks, web results) into
+the prompt.
+
+Prompt evaluation time grows with every token of injected context, so
+instead of concatenating everything that was retrieved, pack() fills a
+token budget: chunks are taken best score first (sections interleaved by
+rank), text a chunk shares with an already packed chunk of the same source
+— the splitter's overlap between adjacent chunks — is cut, and the last
+chunk that only partly fits is truncated at a word boundary. Tokens are
+estimated from characters and words; no tokenizer is loaded.
+
+The budget depends on the model (see budget_for_model): the default
+XCLOUD_CONTEXT_BUDGET tokens, overridden per model or model family by
+XCLOUD_CONTEXT_BUDGETS, e.g. "qwen3:1.7b=1024,llama3.1=6000".
+"""
+
+import math
+import os
+import re
+
+
+def _parse_budgets(spec: str) -> dict:
+    budgets = {}
+    for item in spec.split(","):
+        name, _, tokens = item.partition("=")
+        if name.strip() and tokens.strip().isdigit():
+            budgets[name.strip()] = int(tokens)
+    return budgets
+
+
+# Context tokens per chat request unless the model has its own budget.
+DEFAULT_BUDGET = int(os.environ.get("XCLOUD_CONTEXT_BUDGET", "2048"))
+MODEL_BUDGETS = _parse_budgets(os.environ.get("XCLOUD_CONTEXT_BUDGETS", ""))
+# Budget of the context a tool call (the agent's rag_search) returns.
+TOOL_BUDGET = int(os.environ.get("XCLOUD_CONTEXT_TOOL_BUDGET", "512"))
+
+# Shared text shorter than this is not treated as chunk overlap.
+MIN_OVERLAP_CHARS = 32
+# A chunk is only truncated into the remaining budget if at least this
+# many tokens of it fit; otherwise it is dropped.
+MIN_TRUNCATED_TOKENS = 48
+_TRUNCATED = " …"
+_WORD_RE = re.compile(r"\S+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count: about 4 characters per token for prose, at least
+    4 tokens per 3 words.
+    """
+    if not text:
+        return 0
+    return math.ceil(max(len(text) / 4, len(text.split()) * 4 / 3))
+
+
+def budget_for_model(model: str | None) -> int:
+    """
+    Context budget of a model: its entry in MODEL_BUDGETS (the exact name,
+    else the longest entry the name starts with, e.g. "qwen3" for
+    "qwen3:8b"), else DEFAULT_BUDGET.
+    """
+    if model:
+        if model in MODEL_BUDGETS:
+            return MODEL_BUDGETS[model]
+        matches = [name for name in MODEL_BUDGETS if model.startswith(name)]
+        if matches:
+            return MODEL_BUDGETS[max(matches, key=len)]
+    return DEFAULT_BUDGET
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest end of `a` that `b` starts with, or 0."""
+    probe = b[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    pos = a.find(probe, max(0, len(a) - len(b)))
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+def _trim_overlap(text: str, packed: list) -> str:
+    """`text` without what it shares with the packed texts of its source."""
+    for other in packed:
+        if text in other:
+            return ""
+        cut = _overlap(other, text)
+        if cut:
+            text = text[cut:]
+        cut = _overlap(text, other)
+        if cut:
+            text = text[:-cut]
+    return text.strip()
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """The longest prefix of `text` ending at a word that fits `tokens`."""
+    ends = [m.end() for m in _WORD_RE.finditer(text)]
+    lo, hi = 0, len(ends)  # binary search for the number of words kept
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:ends[mid - 1]] + _TRUNCATED) <= tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:ends[lo - 1]] + _TRUNCATED if lo else ""
+
+
+def pack(sections: list, budget: int) -> tuple[str, dict]:
+    """
+    Fit retrieved context into `budget` tokens.
+
+    `sections` is [(header, chunks)] with each section's chunks in rank
+    order; a chunk is a dict with "label" (e.g. "[Source 1]"), "text",
+    optional "score" (higher is better; chunks are re-sorted by it within
+    their section) and optional "source" (chunks with the same source get
+    their overlap removed). Each chunk dict is given "tokens": the tokens
+    it was packed with, 0 if it was dropped.
+
+    Returns (context_text, report) where the report holds the budget,
+    tokens_used, tokens_dropped (cut to fit the budget), overlap_tokens
+    (cut as duplicate text) and chunks_packed / chunks_truncated /
+    chunks_dropped.
+    """
+    report = {
+        "budget": budget,
+        "tokens_used": 0,
+        "tokens_dropped": 0,
+        "overlap_tokens": 0,
+        "chunks_packed": 0,
+        "chunks_truncated": 0,
+        "chunks_dropped": 0,
+    }
+    ranked = []  # (rank, section index, chunk)
+    for s, (_header, chunks) in enumerate(sections):
+        order = list(range(len(chunks)))
+        if any(c.get("score") is not None for c in chunks):
+            order.sort(key=lambda i: (-(chunks[i].get("score") or 0.0), i))
+        ranked += [(rank, s, chunks[i]) for rank, i in enumerate(order)]
+    ranked.sort(key=lambda item: item[:2])
+
+    remaining = budget
+    packed = {}  # section index -> [(label, text)]
+    by_source = {}  # source -> [packed text]
+    for _rank, s, chunk in ranked:
+        chunk["tokens"] = 0
+        text = chunk["text"].strip()
+        source = chunk.get("source")
+        if source is not None:
+            trimmed = _trim_overlap(text, by_source.get(source, []))
+            report["overlap_tokens"] += (
+                estimate_tokens(text) - estimate_tokens(trimmed)
+            )
+            text = trimmed
+        if not text:
+            report["chunks_dropped"] += 1
+            continue
+
+        # The section header is paid for with the section's first chunk.
+        overhead = estimate_tokens(chunk["label"]) + (
+            0 if s in packed else estimate_tokens(sections[s][0])
+        )
+        needed = overhead + estimate_tokens(text)
+        if needed > remaining:
+            room = remaining - overhead
+            cut = _truncate(text, room) if room >= MIN_TRUNCATED_TOKENS else ""
+            report["tokens_dropped"] += (
+                estimate_tokens(text) - estimate_tokens(cut)
+            )
+            if not cut:
+                report["chunks_dropped"] += 1
+                continue
+            report["chunks_truncated"] += 1
+            text = cut
+            needed = overhead + estimate_tokens(text)
+
+        remaining -= needed
+        chunk["tokens"] = needed
+        report["chunks_packed"] += 1
+        packed.setdefault(s, []).append((chunk["label"], text))
+        if source is not None:
+            by_source.setdefault(source, []).append(text)
+
+    report["tokens_used"] = budget - remaining
+    parts = [
+        sections[s][0] + "\n" + "\n".join(
+            f"{label}\n{text}\n" for label, text in packed[s]
+        )
+        for s in sorted(packed)
+    ]
+    return "\n\n".join(parts), report
@@ -23,3 +23,9 @@ def get_transcriptions_dir() -> str:
 
 def get_summarization_dir() -> str:
     return os.path.join(XDCLOUD_HOME, "summarization")
+
+# Local RAG bookkeeping (manifests, caches) lives next to ./.chroma_db.
+RAG_STATE_DIR = os.path.abspath("./.rag_state")
+
+def get_rag_state_dir() -> str:
+    return RAG_STATE_DIR
@@ -7,6 +7,12 @@ import stat
 import mimetypes
 from datetime import datetime, timezone
 
+# PDFs over this size are previewed only if their text is already in the
+# RAG extracted-text cache; extracting them per request is too slow.
+PDF_PREVIEW_MAX_SIZE = int(
+    os.environ.get("XCLOUD_PDF_PREVIEW_MAX_MB", "50")
+) * 1024 * 1024
+
 
 def _file_entry(filepath: str, name: str) -> dict:
     """Build metadata dict for a single file or directory."""
@@ -80,6 +86,10 @@ def read_file(path: str, max_size: int = 10 * 1024 * 1024) -> dict:
     Read a file and return its content with metadata.
     Text files return the content as a string.
     Binary files return base64-encoded content.
+    PDFs also return their extracted text ("text", "pages"), served from the
+    RAG extracted-text cache or extracted in this process; a PDF over the
+    size limit returns only that (content is None), and one over
+    PDF_PREVIEW_MAX_SIZE only if its text is cached.
     max_size limits to 10MB by default.
     """
     import base64
@@ -93,10 +103,11 @@ def read_file(path: str, max_size: int = 10 * 1024 * 1024) -> dict:
         raise IsADirectoryError(f"Path is a directory, use browse instead: {path}")
 
     st = os.stat(abs_path)
-    if st.st_size > max_size:
+    mime, _ = mimetypes.guess_type(abs_path)
+    is_pdf = mime == "application/pdf"
+    if st.st_size > max_size and not is_pdf:
         raise ValueError(f"File too large ({st.st_size} bytes). Max: {max_size} bytes.")
 
-    mime, _ = mimetypes.guess_type(abs_path)
     is_text = (mime or "").startswith("text/") or mime in (
         "application/json",
         "application/xml",
@@ -123,7 +134,29 @@ def read_file(path: str, max_size: int = 10 * 1024 * 1024) -> dict:
         "is_text": is_text,
     }
 
-    if is_text:
+    if is_pdf:
+        from services import rag_extraction
+
+        try:
+            pages = rag_extraction.cached_pdf_pages(abs_path)
+        except Exception:
+            pages = None
+        if pages is None and st.st_size > PDF_PREVIEW_MAX_SIZE:
+            raise ValueError(
+                f"PDF too large to preview ({st.st_size} bytes) and not "
+                f"indexed yet. Max: {PDF_PREVIEW_MAX_SIZE} bytes."
+            )
+        if pages is None:
+            try:
+                pages = rag_extraction.extract_pdf_pages(abs_path, workers=1)
+            except Exception:
+                pages = None
+        result["text"] = "\n".join(pages).strip() if pages else ""
+        result["pages"] = len(pages) if pages is not None else None
+
+    if is_pdf and st.st_size > max_size:
+        result["content"] = None
+    elif is_text:
         with open(abs_path, "r", encoding="utf-8", errors="replace") as f:
             result["content"] = f.read()
     else:
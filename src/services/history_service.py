@@ -0,0 +1,201 @@
+"""
+History service - the conversation history sent to the LLM with each turn.
+
+Sending a chat's whole history every turn makes prompt evaluation grow
+with the chat and eventually overflows the model's context. Instead the
+last HISTORY_TURNS turns (a user message and the replies to it) are sent
+verbatim, within HISTORY_BUDGET tokens, and everything older is replaced
+by a rolling summary stored on the Chat (history_summary, covering the
+messages up to summarized_until).
+
+The summary is brought up to date in the background after each turn
+(schedule_summary), folding the turns that dropped out of the verbatim
+window into it, so the request path only reads it (build_history). Turns
+not folded in yet are sent verbatim as long as the budget allows.
+"""
+
+import asyncio
+import os
+
+from sqlalchemy.orm import Session
+
+from Data.database import SessionLocal
+from Data.models import Chat, Message
+from services import context_packer, llm_service, model_residency
+
+# Most recent turns sent verbatim.
+HISTORY_TURNS = int(os.environ.get("XCLOUD_HISTORY_TURNS", "6"))
+# Tokens of verbatim history (the latest message is always sent).
+HISTORY_BUDGET = int(os.environ.get("XCLOUD_HISTORY_BUDGET", "3000"))
+# Tokens the summary is asked to stay within.
+SUMMARY_TOKENS = int(os.environ.get("XCLOUD_HISTORY_SUMMARY_TOKENS", "400"))
+# Tokens of older messages folded into the summary per LLM call.
+FOLD_BUDGET = 4000
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the existing summary with the new messages. Keep facts, names, numbers, decisions, open questions and the user's preferences; drop pleasantries.
+Write compact prose or bullet points, at most {words} words. Reply with the updated summary only."""
+
+_running = set()  # chat ids being summarized
+_again = set()  # chat ids with turns added while they were
+_tasks = set()  # strong references to the scheduled tasks
+
+
+def _history_messages(messages: list) -> list:
+    return [
+        {"role": m.role, "content": m.content}
+        for m in messages
+        if m.role in ("user", "assistant")
+    ]
+
+
+def _window_start(messages: list) -> int:
+    """Index of the first message of the last HISTORY_TURNS turns."""
+    user_turns = [i for i, m in enumerate(messages) if m.role == "user"]
+    if len(user_turns) <= HISTORY_TURNS:
+        return 0
+    return user_turns[-HISTORY_TURNS]
+
+
+def build_history(db: Session, chat_id: str) -> list:
+    """
+    The conversation history for the next turn of a chat: the rolling
+    summary (as a system message) followed by the unsummarized messages,
+    oldest dropped first to fit HISTORY_BUDGET.
+    """
+    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    if chat is None:
+        return []
+    query = db.query(Message).filter(Message.chat_id == chat_id)
+    if chat.summarized_until is not None:
+        query = query.filter(Message.id > chat.summarized_until)
+    recent = _history_messages(query.order_by(Message.id).all())
+
+    kept = []
+    budget = HISTORY_BUDGET
+    for message in reversed(recent):
+        tokens = context_packer.estimate_tokens(message["content"])
+        if kept and tokens > budget:
+            break
+        kept.append(message)
+        budget -= tokens
+    kept.reverse()
+    # Never start mid-turn with an orphaned reply.
+    while len(kept) > 1 and kept[0]["role"] != "user":
+        kept.pop(0)
+
+    if chat.history_summary:
+        kept.insert(0, {
+            "role": "system",
+            "content": "Summary of the earlier conversation:\n"
+            + chat.history_summary,
+        })
+    return kept
+
+
+def _transcript(messages: list) -> str:
+    return "\n\n".join(f"{m.role.upper()}: {m.content}" for m in messages)
+
+
+async def _fold(summary: str | None, messages: list, model: str,
+                user) -> str:
+    prompt = (
+        f"Existing summary:\n{summary or '(none yet)'}\n\n"
+        f"New messages:\n{_transcript(messages)}"
+    )
+    result = ""
+    async for part in llm_service.chat_stream(
+        llm_service.BACKGROUND,
+        user,
+        model=model,
+        messages=[
+            {
+                "role": "system",
+                "content": SUMMARY_SYSTEM_PROMPT.format(
+                    words=SUMMARY_TOKENS * 3 // 4
+                ),
+            },
+            {"role": "user", "content": prompt},
+        ],
+        keep_alive=model_residency.keep_alive(model, background=True),
+        options={"num_predict": SUMMARY_TOKENS * 2},
+    ):
+        result += part["message"]["content"]
+    return result.strip()
+
+
+async def update_summary(chat_id: str, model: str) -> bool:
+    """
+    Fold the chat's turns that are older than the verbatim window into its
+    rolling summary, FOLD_BUDGET tokens of messages per LLM call. Returns
+    whether the summary changed.
+    """
+    db = SessionLocal()
+    try:
+        chat = db.query(Chat).filter(Chat.id == chat_id).first()
+        if chat is None:
+            return False
+        summary, until = chat.history_summary, chat.summarized_until
+        user = chat.user_id
+        query = db.query(Message).filter(Message.chat_id == chat_id)
+        if until is not None:
+            query = query.filter(Message.id > until)
+        messages = [
+            m for m in query.order_by(Message.id).all()
+            if m.role in ("user", "assistant")
+        ]
+        older = messages[:_window_start(messages)]
+        if not older:
+            return False
+
+        model = model_residency.background_model(model)
+        while older:
+            batch, tokens = [], 0
+            for m in older:
+                tokens += context_packer.estimate_tokens(m.content)
+                if batch and tokens > FOLD_BUDGET:
+                    break
+                batch.append(m)
+            summary = await _fold(summary, batch, model, user)
+            until = batch[-1].id
+            older = older[len(batch):]
+            # Leave updated_at alone: summarizing is not chat activity.
+            db.query(Chat).filter(Chat.id == chat_id).update({
+                "history_summary": summary,
+                "summarized_until": until,
+                "updated_at": Chat.updated_at,
+            })
+            db.commit()
+        return True
+    finally:
+        db.close()
+
+
+async def _summarize(chat_id: str, model: str) -> None:
+    try:
+        while True:
+            _again.discard(chat_id)
+            try:
+                await update_summary(chat_id, model)
+            except Exception as e:
+                print(f"[history] Summarizing chat {chat_id} failed: {e}")
+                return
+            if chat_id not in _again:
+                return
+    finally:
+        _running.discard(chat_id)
+        _again.discard(chat_id)
+
+
+def schedule_summary(chat_id: str, model: str) -> None:
+    """
+    Update the chat's rolling summary in the background (on the running
+    event loop) after a turn; one update runs per chat at a time.
+    """
+    if chat_id in _running:
+        _again.add(chat_id)
+        return
+    _running.add(chat_id)
+    task = asyncio.get_running_loop().create_task(_summarize(chat_id, model))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
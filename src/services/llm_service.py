@@ -1,34 +1,61 @@
-from ollama import list as list_models
-from ollama import AsyncClient
 import os
 import json
+import asyncio
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass, field
 
+from services import model_residency, ollama_client
+
 # ---- Settings persistence ------------------------------------------------- #
 
 SETTINGS_PATH = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "..", "..", "settings.json")
 )
 
+# settings.json as last read, re-read only when the file's mtime changes.
+_settings = None
+_settings_mtime = None
+_settings_lock = threading.Lock()
+
 
 def _load_settings() -> dict:
     """Load settings.json, creating it with defaults if missing."""
+    global _settings, _settings_mtime
     defaults = {"default_model": "auto"}
-    if not os.path.exists(SETTINGS_PATH):
-        _save_settings(defaults)
-        return defaults
-    try:
-        with open(SETTINGS_PATH, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, OSError):
-        _save_settings(defaults)
-        return defaults
+    with _settings_lock:
+        try:
+            mtime = os.stat(SETTINGS_PATH).st_mtime_ns
+        except OSError:
+            mtime = None
+        if _settings is not None and mtime == _settings_mtime:
+            return dict(_settings)
+        if mtime is None:
+            _save_settings_locked(defaults)
+            return dict(defaults)
+        try:
+            with open(SETTINGS_PATH, "r") as f:
+                _settings = json.load(f)
+            _settings_mtime = mtime
+        except (json.JSONDecodeError, OSError):
+            _save_settings_locked(defaults)
+        return dict(_settings)
+
+
+def _save_settings_locked(settings: dict) -> None:
+    global _settings, _settings_mtime
+    with open(SETTINGS_PATH, "w") as f:
+        json.dump(settings, f, indent=2)
+    _settings = dict(settings)
+    _settings_mtime = os.stat(SETTINGS_PATH).st_mtime_ns
 
 
 def _save_settings(settings: dict) -> None:
     """Write settings dict to settings.json."""
-    with open(SETTINGS_PATH, "w") as f:
-        json.dump(settings, f, indent=2)
+    with _settings_lock:
+        _save_settings_locked(settings)
 
 
 def get_settings() -> dict:
@@ -40,8 +67,10 @@ def get_default_model() -> str | None:
     """
     Resolve the default model.
     - If settings has a specific model name, return it.
-    - If "auto", detect the first model installed in Ollama.
-    - Returns None if no models are available.
+    - If "auto", pick the first LLM installed in Ollama (from the cached
+      model list).
+    - Returns None if no models are available; ensure_default_model pulls
+      one at startup.
     """
     settings = _load_settings()
     model_pref = settings.get("default_model", "auto")
@@ -49,11 +78,24 @@ def get_default_model() -> str | None:
     if model_pref and model_pref != "auto":
         return model_pref
 
-    # Auto-detect: pick the first available Ollama LLM model
     models = get_available_llm_models()
     if isinstance(models, list) and models:
         return models[0]
-        
+    return None
+
+
+def ensure_default_model() -> str | None:
+    """
+    Startup task (blocking): in "auto" mode with no LLM installed, pull one
+    sized to the GPU's VRAM, plus the embedding model. Request paths never
+    do this. Returns the default model.
+    """
+    model = get_default_model()
+    if model or _load_settings().get("default_model", "auto") != "auto":
+        return model
+    if not isinstance(get_available_models(refresh=True), list):
+        return None  # Ollama is not reachable; nothing to pull into
+
     # If no models are available, download one based on VRAM size
     import subprocess
     import platform
@@ -67,7 +109,7 @@ def get_default_model() -> str | None:
             vram_gb = int(output.strip().split('\n')[0]) / 1024.0
     except Exception:
         pass
-        
+
     if vram_gb >= 16:
         target_model = "qwen3:8b"
     elif vram_gb >= 8:
@@ -76,24 +118,21 @@ def get_default_model() -> str | None:
         target_model = "qwen3:1.7b"
     else:
         target_model = "qwen3:1.7b" # Fast/light for CPU or unknown VRAM
-        
+
     print(f"No LLM found. VRAM detected: {vram_gb:.1f}GB. Pulling {target_model} via Ollama...")
     try:
-        from ollama import pull
-        pull(target_model)
+        ollama_client.pull(target_model)
         print(f"Successfully pulled {target_model}")
-        
+
         # Also ensure index model exists
-        index_model = "nomic-embed-text:latest"
+        index_model = ollama_client.EMBED_MODEL
         print(f"Checking for indexing model {index_model}...")
-        pull(index_model)
+        ollama_client.pull(index_model)
         print(f"Successfully ensured {index_model} is available.")
-        
-        return target_model
     except Exception as e:
         print(f"Failed to pull models: {e}")
-
-    return None
+    get_available_models(refresh=True)
+    return get_default_model()
 
 
 def save_default_model(model_name: str) -> dict:
@@ -183,12 +222,54 @@ def _is_embedding_model(model_name: str) -> bool:
     return any(kw in name_lower for kw in embedding_keywords)
 
 
-def get_available_models():
+# ---- Installed models ------------------------------------------------------ #
+
+# Seconds the Ollama model list is served from memory; after that it is
+# still served while a background thread fetches a fresh one.
+MODELS_TTL = float(os.environ.get("XCLOUD_MODELS_TTL", "30"))
+
+_models = None  # last successful model list
+_models_at = 0.0
+_models_refreshing = False
+_models_lock = threading.Lock()
+
+
+def _fetch_models():
+    """Fetch the model list from Ollama and cache it (or return the error)."""
+    global _models, _models_at, _models_refreshing
     try:
-        response = list_models()
-        return [m.model for m in response.models]
+        response = ollama_client.list_models()
+        models = [m.model for m in response.models]
     except Exception as e:
+        with _models_lock:
+            _models_refreshing = False
         return {"error": str(e)}
+    with _models_lock:
+        _models, _models_at = models, time.monotonic()
+        _models_refreshing = False
+    return list(models)
+
+
+def get_available_models(refresh: bool = False):
+    """
+    Installed Ollama models, from a MODELS_TTL cache refreshed in the
+    background when stale. The first call (or refresh=True) fetches them.
+    """
+    global _models_refreshing
+    with _models_lock:
+        cached = _models
+        stale = time.monotonic() - _models_at >= MODELS_TTL
+        start_refresh = (
+            cached is not None and stale and not refresh
+            and not _models_refreshing
+        )
+        if start_refresh:
+            _models_refreshing = True
+    if cached is None or refresh:
+        return _fetch_models()
+    if start_refresh:
+        threading.Thread(target=_fetch_models, daemon=True).start()
+    return list(cached)
 
 
 def get_available_llm_models():
@@ -206,11 +287,254 @@ def get_suggested_prompts(category: str = None) -> list:
     return SUGGESTED_PROMPTS
 
 
+# ---- Ollama request scheduler --------------------------------------------- #
+
+# Priority classes, highest first: chats a user is waiting on, agent loops,
+# then background work (meeting and history summaries, indexing embeddings).
+INTERACTIVE = "interactive"
+AGENT = "agent"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, AGENT, BACKGROUND)
+
+# Ollama requests (chat streams, embedding batches) run at once; match it to
+# Ollama's OLLAMA_NUM_PARALLEL so requests wait here, by priority, instead of
+# in Ollama's own first-come queue.
+LLM_CONCURRENCY = max(1, int(os.environ.get("XCLOUD_LLM_CONCURRENCY", "4")))
+# Slots background requests may hold at once; the rest stay free for chats
+# and agents.
+BACKGROUND_SLOTS = max(1, int(os.environ.get(
+    "XCLOUD_LLM_BACKGROUND_SLOTS", str(max(1, LLM_CONCURRENCY - 1))
+)))
+# Recent queue waits kept per priority for the wait-time metrics.
+WAIT_SAMPLES = 500
+
+
+class _Waiter:
+    """A request queued for a slot, woken from whichever thread frees one."""
+
+    def __init__(self, priority: str, user, loop=None):
+        self.priority = priority
+        self.user = user
+        self.queued_at = time.monotonic()
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self) -> bool:
+        """Hand the waiter its slot; False if its event loop is gone."""
+        if self.loop is None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:  # loop closed
+            return False
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RequestScheduler:
+    """
+    Admission control for Ollama. At most `concurrency` requests run at
+    once and the rest wait in one queue per priority class. A freed slot
+    goes to the highest priority class with a waiter (background only while
+    it holds fewer than `background_slots`), and within a class to the
+    waiting user with the fewest requests running, ties in round-robin
+    order, so one user's burst cannot starve another.
+    Requests are not preempted: a running summary finishes its turn, but
+    the next free slot goes to a waiting chat.
+    """
+
+    def __init__(self, concurrency: int, background_slots: int):
+        self.concurrency = concurrency
+        self.background_slots = min(background_slots, concurrency)
+        self._lock = threading.Lock()
+        # priority -> user -> waiters, users in round-robin order
+        self._queues = {p: OrderedDict() for p in PRIORITIES}
+        self._running = dict.fromkeys(PRIORITIES, 0)
+        self._running_by_user = Counter()
+        self._admitted = dict.fromkeys(PRIORITIES, 0)
+        self._peak_queued = dict.fromkeys(PRIORITIES, 0)
+        self._waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITIES}
+        self._max_wait = dict.fromkeys(PRIORITIES, 0.0)
+        self._unqueued = 0
+
+    def _queued_locked(self, priority: str) -> int:
+        return sum(len(w) for w in self._queues[priority].values())
+
+    def _next_locked(self):
+        for priority in PRIORITIES:
+            if (
+                priority == BACKGROUND
+                and self._running[BACKGROUND] >= self.background_slots
+            ):
+                continue
+            queue = self._queues[priority]
+            if queue:
+                user = min(queue, key=self._running_by_user.__getitem__)
+                waiters = queue[user]
+                waiter = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(user)
+                else:
+                    del queue[user]
+                return waiter
+        return None
+
+    def _admit_locked(self, priority: str, user, queued_at: float) -> None:
+        wait = time.monotonic() - queued_at
+        self._running[priority] += 1
+        self._running_by_user[user] += 1
+        self._admitted[priority] += 1
+        self._waits[priority].append(wait)
+        self._max_wait[priority] = max(self._max_wait[priority], wait)
+
+    def _dispatch_locked(self) -> None:
+        while sum(self._running.values()) < self.concurrency:
+            waiter = self._next_locked()
+            if waiter is None:
+                return
+            if waiter.wake():
+                waiter.granted = True
+                self._admit_locked(
+                    waiter.priority, waiter.user, waiter.queued_at
+                )
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        if waiter.priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {waiter.priority}")
+        with self._lock:
+            queue = self._queues[waiter.priority]
+            queue.setdefault(waiter.user, deque()).append(waiter)
+            self._peak_queued[waiter.priority] = max(
+                self._peak_queued[waiter.priority],
+                self._queued_locked(waiter.priority),
+            )
+            self._dispatch_locked()
+
+    def _release(self, priority: str, user) -> None:
+        with self._lock:
+            self._running[priority] -= 1
+            self._running_by_user[user] -= 1
+            if not self._running_by_user[user]:
+                del self._running_by_user[user]
+            self._dispatch_locked()
+
+    def _withdraw(self, waiter: _Waiter) -> None:
+        """Take a cancelled waiter out of its queue, or give back its slot."""
+        with self._lock:
+            if not waiter.granted:
+                waiters = self._queues[waiter.priority].get(waiter.user)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._queues[waiter.priority][waiter.user]
+                return
+        self._release(waiter.priority, waiter.user)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = INTERACTIVE, user=None):
+        """Run the body of an `async with` in a slot, queueing for it first."""
+        waiter = _Waiter(priority, user, asyncio.get_running_loop())
+        self._enqueue(waiter)
+        try:
+            if not waiter.granted:
+                await waiter.future
+        except BaseException:
+            self._withdraw(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(priority, user)
+
+    @contextmanager
+    def slot_sync(self, priority: str = INTERACTIVE, user=None):
+        """Run the body of a `with` in a slot, blocking until one is free."""
+        try:
+            asyncio.get_running_loop()
+            on_loop = True
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            # Blocking the event loop would stall the streams that free
+            # slots, so a sync call made on it runs without queueing.
+            if priority not in PRIORITIES:
+                raise ValueError(f"Unknown priority: {priority}")
+            with self._lock:
+                self._unqueued += 1
+                self._admit_locked(priority, user, time.monotonic())
+        else:
+            waiter = _Waiter(priority, user)
+            self._enqueue(waiter)
+            waiter.event.wait()
+        try:
+            yield
+        finally:
+            self._release(priority, user)
+
+    def stats(self) -> dict:
+        """Running and queued requests, and queue waits per priority."""
+        with self._lock:
+            priorities = {}
+            by_user = {}
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                priorities[priority] = {
+                    "running": self._running[priority],
+                    "queued": self._queued_locked(priority),
+                    "peak_queued": self._peak_queued[priority],
+                    "admitted": self._admitted[priority],
+                    "wait_ms": {
+                        "avg": round(sum(waits) / len(waits) * 1000, 2)
+                        if waits else 0.0,
+                        "p95": round(
+                            waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+                            * 1000, 2,
+                        ) if waits else 0.0,
+                        "max": round(self._max_wait[priority] * 1000, 2),
+                    },
+                }
+                for user, waiters in self._queues[priority].items():
+                    key = str(user) if user is not None else "system"
+                    by_user[key] = by_user.get(key, 0) + len(waiters)
+            return {
+                "concurrency": self.concurrency,
+                "background_slots": self.background_slots,
+                "running": sum(self._running.values()),
+                "queued": sum(p["queued"] for p in priorities.values()),
+                "unqueued": self._unqueued,
+                "priorities": priorities,
+                "queued_by_user": by_user,
+            }
+
+
+# Every chat and embedding request to Ollama runs in a slot of this.
+scheduler = RequestScheduler(LLM_CONCURRENCY, BACKGROUND_SLOTS)
+
+
+async def chat_stream(priority: str, user=None, **kwargs):
+    """
+    ollama_client.chat_stream, run in a scheduler slot of `priority` for
+    `user` (held until the stream ends).
+    """
+    async with scheduler.slot(priority, user):
+        async for part in ollama_client.chat_stream(**kwargs):
+            yield part
+
+
 @dataclass
 class LLMSession:
     model: str = ""
     extra_context: str = ""
     conversation_history: list = field(default_factory=list)
+    user_id: str | None = None  # whose turn this is, for scheduler fairness
 
     def __post_init__(self):
         if not self.model:
@@ -245,14 +569,18 @@ class LLMSession:
 
         assistant_reply = ""
         thinking_content = ""
+        model_residency.mark_interactive(self.model)
+        keep_alive = model_residency.keep_alive(self.model)
 
         if think:
             # Use thinking mode - request extended thinking via Ollama
-            async for part in await AsyncClient().chat(
+            async for part in chat_stream(
+                INTERACTIVE,
+                self.user_id,
                 model=self.model,
                 messages=messages,
-                stream=True,
                 think=True,
+                keep_alive=keep_alive,
             ):
                 msg = part.get("message", {})
 
@@ -273,10 +601,12 @@ class LLMSession:
                     yield json.dumps({"type": "content", "content": chunk}) + "\n"
         else:
             # Standard streaming (no thinking)
-            async for part in await AsyncClient().chat(
+            async for part in chat_stream(
+                INTERACTIVE,
+                self.user_id,
                 model=self.model,
                 messages=messages,
-                stream=True,
+                keep_alive=keep_alive,
             ):
                 chunk = part["message"]["content"]
                 assistant_reply += chunk
@@ -305,19 +635,26 @@ Format the summary with clear sections."""
 
 
 async def summarize_text(text: str) -> str:
-    """Send transcript text to the LLM and return a plain-text summary."""
+    """
+    Send transcript text to the LLM and return a plain-text summary. This
+    is background work: it is scheduled behind chats and agents, and runs
+    on a model that is already loaded when the default one is not (see
+    model_residency.background_model).
+    """
     model = get_default_model() or ""
     if not model:
         return "No LLM model available for summarization."
+    model = model_residency.background_model(model)
     messages = [
         {"role": "system", "content": SUMMARIZE_SYSTEM_PROMPT},
         {"role": "user", "content": f"Summarize this meeting transcript:\n\n{text}"},
     ]
     result = ""
-    async for part in await AsyncClient().chat(
+    async for part in chat_stream(
+        BACKGROUND,
         model=model,
         messages=messages,
-        stream=True,
+        keep_alive=model_residency.keep_alive(model, background=True),
     ):
         chunk = part["message"]["content"]
         result += chunk
@@ -0,0 +1,186 @@
+"""
+Ollama model warm-up, keep-alive and residency tracking.
+
+Ollama unloads a model after its keep_alive (5 minutes by default) and
+loads it again on the next request, so the first chat after idle or after
+startup pays the full load time; a background job that asks for another
+model can also push the chat model out of memory. This module:
+
+- preloads the default chat model and the embedding model at startup
+  (run(), started from the app lifespan) with their keep_alive;
+- picks the keep_alive sent with every request: XCLOUD_CHAT_KEEP_ALIVE
+  for the interactive model (the one chats last used),
+  XCLOUD_EMBED_KEEP_ALIVE for the embedding model, and
+  XCLOUD_BACKGROUND_KEEP_ALIVE for a model only a background job loaded,
+  so it is unloaded again right after;
+- tracks which models are resident (Ollama's /api/ps, refreshed every
+  REFRESH_SECONDS) so background_model() can route background work (e.g.
+  meeting summaries) to a model that is already loaded instead of loading
+  one next to — or in place of — the interactive model.
+
+Keep-alive values are Ollama durations ("30m", "24h"), seconds, or a
+negative number to keep a model loaded indefinitely.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from services import ollama_client
+
+
+def _duration(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+CHAT_KEEP_ALIVE = _duration(os.environ.get("XCLOUD_CHAT_KEEP_ALIVE", "24h"))
+EMBED_KEEP_ALIVE = _duration(os.environ.get("XCLOUD_EMBED_KEEP_ALIVE", "24h"))
+BACKGROUND_KEEP_ALIVE = _duration(
+    os.environ.get("XCLOUD_BACKGROUND_KEEP_ALIVE", "0")
+)
+# Off with XCLOUD_MODEL_WARMUP=0.
+WARMUP = os.environ.get("XCLOUD_MODEL_WARMUP", "1") != "0"
+REFRESH_SECONDS = float(os.environ.get("XCLOUD_RESIDENCY_REFRESH", "30"))
+
+_lock = threading.Lock()
+_interactive = None  # model the latest chat / agent request used
+_resident = {}  # model -> {"expires_at", "size", "size_vram"}
+_refreshed_at = 0.0
+_warmed = {}  # model -> warm-up time in s, or the error
+
+
+def mark_interactive(model: str) -> None:
+    """Record the model an interactive (chat / agent) request is using."""
+    global _interactive
+    if model:
+        with _lock:
+            _interactive = model
+            # Loaded by the request; the next refresh fills in the details.
+            _resident.setdefault(
+                model, {"expires_at": None, "size": None, "size_vram": None}
+            )
+
+
+def keep_alive(model: str, background: bool = False):
+    """The keep_alive to send with a request for `model`."""
+    if model == ollama_client.EMBED_MODEL:
+        return EMBED_KEEP_ALIVE
+    with _lock:
+        interactive = model == _interactive or _interactive is None
+    if not background or interactive or model in resident():
+        return CHAT_KEEP_ALIVE
+    return BACKGROUND_KEEP_ALIVE
+
+
+def background_model(preferred: str) -> str:
+    """
+    The model a background job should use instead of `preferred`: itself
+    if it is resident (or nothing is known to be loaded), else the
+    interactive model when that one is resident, so the job does not load
+    a second model that could evict it.
+    """
+    models = resident()
+    with _lock:
+        interactive = _interactive
+    if not models or preferred in models:
+        return preferred
+    if interactive in models:
+        return interactive
+    return preferred
+
+
+def refresh() -> dict:
+    """Re-read the loaded models from Ollama; returns resident()."""
+    global _refreshed_at
+    try:
+        response = ollama_client.list_running()
+    except Exception:
+        # Ollama is unreachable: keep the last view until the next refresh.
+        with _lock:
+            _refreshed_at = time.monotonic()
+            return dict(_resident)
+    models = {
+        m.model: {
+            "expires_at": str(m.expires_at) if m.expires_at else None,
+            "size": m.size,
+            "size_vram": m.size_vram,
+        }
+        for m in response.models
+    }
+    with _lock:
+        _resident.clear()
+        _resident.update(models)
+        _refreshed_at = time.monotonic()
+        return dict(_resident)
+
+
+def resident() -> dict:
+    """
+    Models loaded in Ollama as of the last refresh (run() refreshes every
+    REFRESH_SECONDS off the event loop; only the first call reads them
+    here).
+    """
+    with _lock:
+        if _refreshed_at:
+            return dict(_resident)
+    return refresh()
+
+
+def warm_up() -> dict:
+    """
+    Load the default chat model and the embedding model with their
+    keep_alive (blocking); returns {model: seconds taken or error}.
+    """
+    from services.llm_service import get_default_model
+
+    chat_model = get_default_model()
+    if chat_model:
+        mark_interactive(chat_model)
+    loads = [(ollama_client.EMBED_MODEL, EMBED_KEEP_ALIVE, True)]
+    if chat_model:
+        loads.insert(0, (chat_model, CHAT_KEEP_ALIVE, False))
+    for model, model_keep_alive, embedding in loads:
+        started = time.perf_counter()
+        try:
+            ollama_client.load(model, model_keep_alive, embedding)
+            result = round(time.perf_counter() - started, 2)
+        except Exception as e:
+            result = f"error: {e}"
+        with _lock:
+            _warmed[model] = result
+    refresh()
+    with _lock:
+        return dict(_warmed)
+
+
+async def run() -> None:
+    """
+    Lifespan task: warm the models up, then keep the residency view fresh
+    until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    if WARMUP:
+        await loop.run_in_executor(None, warm_up)
+    while True:
+        await loop.run_in_executor(None, refresh)
+        await asyncio.sleep(REFRESH_SECONDS)
+
+
+def status() -> dict:
+    """The interactive model, the resident models and the keep-alives."""
+    models = resident()
+    with _lock:
+        return {
+            "interactive": _interactive,
+            "resident": models,
+            "warmed_up": dict(_warmed),
+            "keep_alive": {
+                "chat": CHAT_KEEP_ALIVE,
+                "embedding": EMBED_KEEP_ALIVE,
+                "background": BACKGROUND_KEEP_ALIVE,
+            },
+        }
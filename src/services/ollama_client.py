@@ -0,0 +1,185 @@
+"""
+Process-wide Ollama clients with a persistent keep-alive connection pool.
+
+Creating an `ollama.AsyncClient()` per call opens fresh HTTP connections
+to Ollama for every chat turn and agent iteration (and never closes the
+old ones). Instead every caller goes through the clients here: one sync
+client shared by all threads and one async client per event loop (the
+server's loop, plus the short-lived loops of the recording watcher), all
+with the same base URL, timeouts and pool limits:
+
+    XCLOUD_OLLAMA_URL               base URL (default: $OLLAMA_HOST, else
+                                    http://localhost:11434)
+    XCLOUD_OLLAMA_CONNECT_TIMEOUT   seconds to connect (5)
+    XCLOUD_OLLAMA_READ_TIMEOUT      seconds between response chunks; model
+                                    loads count, so keep it generous (600)
+    XCLOUD_OLLAMA_MAX_CONNECTIONS   open connections per client (16)
+    XCLOUD_OLLAMA_KEEPALIVE         idle connections kept per client (8)
+    XCLOUD_OLLAMA_KEEPALIVE_SECONDS how long an idle connection is kept (120)
+
+pool_stats() reports requests in flight and served and the pooled
+connections. Which chat and embedding requests may run, and in what
+order, is decided above this by llm_service.scheduler.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+
+import httpx
+from ollama import AsyncClient, Client
+
+BASE_URL = os.environ.get(
+    "XCLOUD_OLLAMA_URL",
+    os.environ.get("OLLAMA_HOST") or "http://localhost:11434",
+)
+if "://" not in BASE_URL:
+    BASE_URL = f"http://{BASE_URL}"
+CONNECT_TIMEOUT = float(os.environ.get("XCLOUD_OLLAMA_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("XCLOUD_OLLAMA_READ_TIMEOUT", "600"))
+MAX_CONNECTIONS = int(os.environ.get("XCLOUD_OLLAMA_MAX_CONNECTIONS", "16"))
+MAX_KEEPALIVE = int(os.environ.get("XCLOUD_OLLAMA_KEEPALIVE", "8"))
+KEEPALIVE_SECONDS = float(
+    os.environ.get("XCLOUD_OLLAMA_KEEPALIVE_SECONDS", "120")
+)
+# Model the RAG embeddings are computed with.
+EMBED_MODEL = os.environ.get("XCLOUD_EMBED_MODEL", "nomic-embed-text:latest")
+
+_lock = threading.Lock()
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncClient
+_stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "errors": 0}
+
+
+def _options() -> dict:
+    return {
+        "host": BASE_URL,
+        "timeout": httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_SECONDS,
+        ),
+    }
+
+
+def client() -> Client:
+    """The shared sync client (thread-safe)."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = Client(**_options())
+        return _client
+
+
+def async_client() -> AsyncClient:
+    """The async client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        found = _async_clients.get(loop)
+        if found is None:
+            found = _async_clients[loop] = AsyncClient(**_options())
+        return found
+
+
+@contextmanager
+def _track():
+    """Count one request (for its whole duration) in the pool stats."""
+    with _lock:
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        _stats["peak_in_flight"] = max(
+            _stats["peak_in_flight"], _stats["in_flight"]
+        )
+    try:
+        yield
+    except BaseException:
+        with _lock:
+            _stats["errors"] += 1
+        raise
+    finally:
+        with _lock:
+            _stats["in_flight"] -= 1
+
+
+async def chat_stream(**kwargs):
+    """
+    Stream a chat from the loop's pooled async client: yields the response
+    parts of `AsyncClient.chat(stream=True, **kwargs)`.
+    """
+    with _track():
+        async for part in await async_client().chat(stream=True, **kwargs):
+            yield part
+
+
+def list_models():
+    """The models installed in Ollama (`ollama.list()` response)."""
+    with _track():
+        return client().list()
+
+
+def list_running():
+    """The models currently loaded in Ollama (`ollama.ps()` response)."""
+    with _track():
+        return client().ps()
+
+
+def load(model: str, keep_alive, embedding: bool = False) -> None:
+    """Load a model into memory for `keep_alive` without generating."""
+    with _track():
+        if embedding:
+            client().embed(model=model, input="", keep_alive=keep_alive)
+        else:
+            client().generate(model=model, prompt="", keep_alive=keep_alive)
+
+
+def pull(model: str):
+    """Download a model into Ollama."""
+    with _track():
+        return client().pull(model)
+
+
+def _pool_connections(api_client) -> dict | None:
+    """Open and idle connections of a client's pool, if httpx exposes it."""
+    pool = getattr(
+        getattr(getattr(api_client, "_client", None), "_transport", None),
+        "_pool", None,
+    )
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return None
+    idle = sum(1 for c in connections if c.is_idle())
+    return {"open": len(connections), "idle": idle}
+
+
+def pool_stats() -> dict:
+    """Requests served / in flight and the clients' pooled connections."""
+    with _lock:
+        stats = dict(_stats)
+        clients = ([_client] if _client is not None else []) + list(
+            _async_clients.values()
+        )
+    pools = [p for p in map(_pool_connections, clients) if p is not None]
+    return {
+        "base_url": BASE_URL,
+        **stats,
+        "clients": len(clients),
+        "connections_open": sum(p["open"] for p in pools),
+        "connections_idle": sum(p["idle"] for p in pools),
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive": MAX_KEEPALIVE,
+    }
+
+
+async def aclose() -> None:
+    """Close the running loop's async client and the sync client."""
+    global _client
+    with _lock:
+        found = _async_clients.pop(asyncio.get_running_loop(), None)
+        sync, _client = _client, None
+    if found is not None:
+        await found._client.aclose()
+    if sync is not None:
+        sync._client.close()
@@ -0,0 +1,132 @@
+"""
+Collection aliases for zero-downtime (blue/green) rebuilds.
+
+The collection name the API and the UI use is an alias for a physical
+collection: a Chroma collection plus the BM25, flat-index and manifest
+sidecars stored under the same name. A full rebuild writes a new generation
+("<name>__gen<n>") next to the live one — the collection's shadow — while
+queries keep being served from the live generation; swap() then repoints
+the alias in one step and the previous generation is garbage-collected
+once in-flight queries are done with it. Collections indexed before
+aliases existed are their own physical collection until their first
+rebuild.
+
+Aliases and shadows persist in .rag_state/aliases.json.
+"""
+
+import json
+import os
+import re
+import threading
+
+from services.dir_config import get_rag_state_dir
+
+_GENERATION_RE = re.compile(r"^(.+)__gen\d+$")
+
+_state = None  # {"aliases": {}, "shadows": {}, "next_generation": n}
+_lock = threading.Lock()
+
+
+def _state_path() -> str:
+    return os.path.join(get_rag_state_dir(), "aliases.json")
+
+
+def _load_locked() -> dict:
+    global _state
+    if _state is None:
+        try:
+            with open(_state_path(), "r") as f:
+                _state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            _state = {}
+        _state.setdefault("aliases", {})
+        _state.setdefault("shadows", {})
+        _state.setdefault("next_generation", 1)
+    return _state
+
+
+def _save_locked() -> None:
+    os.makedirs(get_rag_state_dir(), exist_ok=True)
+    target = _state_path()
+    tmp = target + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_state, f, indent=1)
+    os.replace(tmp, target)
+
+
+def resolve(collection_name: str) -> str:
+    """The live physical collection behind a collection name."""
+    with _lock:
+        return _load_locked()["aliases"].get(collection_name, collection_name)
+
+
+def shadow(collection_name: str) -> str | None:
+    """The generation a rebuild of the collection is writing, if any."""
+    with _lock:
+        return _load_locked()["shadows"].get(collection_name)
+
+
+def new_generation(collection_name: str) -> str:
+    """Register and return the name of a new shadow generation."""
+    with _lock:
+        state = _load_locked()
+        physical = f"{collection_name}__gen{state['next_generation']}"
+        state["next_generation"] += 1
+        state["shadows"][collection_name] = physical
+        _save_locked()
+        return physical
+
+
+def clear_shadow(collection_name: str) -> None:
+    with _lock:
+        if _load_locked()["shadows"].pop(collection_name, None) is not None:
+            _save_locked()
+
+
+def swap(collection_name: str, physical: str) -> str:
+    """
+    Make `physical` the live generation of the collection (clearing it as
+    the shadow) and return the physical collection it replaced.
+    """
+    with _lock:
+        state = _load_locked()
+        previous = state["aliases"].get(collection_name, collection_name)
+        state["aliases"][collection_name] = physical
+        if state["shadows"].get(collection_name) == physical:
+            del state["shadows"][collection_name]
+        _save_locked()
+        return previous
+
+
+def remove(collection_name: str) -> list:
+    """
+    Forget a collection's alias and shadow; returns every physical
+    collection that belonged to it.
+    """
+    with _lock:
+        state = _load_locked()
+        physical = [
+            state["aliases"].pop(collection_name, collection_name)
+        ]
+        if collection_name in state["shadows"]:
+            physical.append(state["shadows"].pop(collection_name))
+        _save_locked()
+        return physical
+
+
+def aliases() -> dict:
+    """{collection name: live physical collection} for aliased collections."""
+    with _lock:
+        return dict(_load_locked()["aliases"])
+
+
+def shadows() -> dict:
+    """{collection name: shadow generation} of unfinished rebuilds."""
+    with _lock:
+        return dict(_load_locked()["shadows"])
+
+
+def generation_of(physical: str) -> str | None:
+    """The collection name a generation belongs to, or None."""
+    match = _GENERATION_RE.match(physical)
+    return match.group(1) if match else None
@@ -0,0 +1,250 @@
+"""
+Local BM25 inverted index kept alongside each Chroma collection.
+
+Vector search tends to miss exact identifiers — ticket numbers, error codes,
+people's names — so every indexed chunk is also tokenized into a per-collection
+SQLite inverted index. It is updated incrementally as chunks are added or
+deleted, and get_context_for_llm fuses its ranking with the vector ranking
+via reciprocal-rank fusion.
+"""
+
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+
+from services.dir_config import get_rag_state_dir
+
+# Standard Okapi BM25 parameters.
+K1 = 1.2
+B = 0.75
+# Reciprocal-rank fusion constant (Cormack et al.).
+RRF_K = 60
+
+# Words like "ERR-1234", "v2.3.1" or "#456" are kept whole *and* split, so
+# both the full identifier and its parts match.
+_TOKEN_RE = re.compile(r"\w+(?:[-.#/:]\w+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        parts = re.split(r"[-.#/:]", word)
+        if len(parts) > 1:
+            tokens.append(word)
+        tokens.extend(p for p in parts if p and p not in _STOPWORDS)
+    return tokens
+
+
+def _index_path(collection_name: str) -> str:
+    return os.path.join(get_rag_state_dir(), "bm25", f"{collection_name}.sqlite")
+
+
+class BM25Index:
+    """A per-collection inverted index; safe to share between threads."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._closed = False
+        self._open_locked()
+
+    def _open_locked(self):
+        """Open the database unless already open (see release)."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed index.")
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                node_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                node_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, node_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_node
+                ON postings(node_id);
+            """
+        )
+        self._conn.commit()
+
+    def add(self, items) -> None:
+        """Index (node_id, text) pairs, replacing any existing entries."""
+        items = list(items)
+        with self._lock:
+            self._open_locked()
+            self._delete_locked([node_id for node_id, _text in items])
+            docs = []
+            postings = []
+            for node_id, text in items:
+                counts = Counter(tokenize(text))
+                docs.append((node_id, sum(counts.values())))
+                postings.extend(
+                    (term, node_id, tf) for term, tf in counts.items()
+                )
+            self._conn.executemany(
+                "INSERT INTO docs (node_id, length) VALUES (?, ?)", docs
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, node_id, tf) VALUES (?, ?, ?)",
+                postings,
+            )
+            self._conn.commit()
+
+    def delete(self, node_ids) -> None:
+        with self._lock:
+            self._open_locked()
+            self._delete_locked(list(node_ids))
+            self._conn.commit()
+
+    def _delete_locked(self, node_ids: list) -> None:
+        for start in range(0, len(node_ids), 500):
+            chunk = node_ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            self._conn.execute(
+                f"DELETE FROM postings WHERE node_id IN ({marks})", chunk
+            )
+            self._conn.execute(
+                f"DELETE FROM docs WHERE node_id IN ({marks})", chunk
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            self._open_locked()
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def node_ids(self) -> list:
+        with self._lock:
+            self._open_locked()
+            return [r[0] for r in self._conn.execute("SELECT node_id FROM docs")]
+
+    def search(self, query: str, top_k: int) -> list:
+        """Return up to top_k (node_id, bm25 score), best first."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            self._open_locked()
+            n_docs, total_len = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+            ).fetchone()
+            if not n_docs:
+                return []
+            avgdl = total_len / n_docs or 1.0
+            scores = defaultdict(float)
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.node_id, p.tf, d.length FROM postings p"
+                    " JOIN docs d ON d.node_id = p.node_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                df = len(rows)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for node_id, tf, length in rows:
+                    scores[node_id] += idf * tf * (K1 + 1) / (
+                        tf + K1 * (1 - B + B * length / avgdl)
+                    )
+        return heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+
+    def release(self) -> None:
+        """Close the connection of an idle index; the next call reopens it."""
+        with self._lock:
+            self._release_locked()
+
+    def _release_locked(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._release_locked()
+            self._closed = True
+
+_indexes: dict[str, BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def exists(collection_name: str) -> bool:
+    return os.path.exists(_index_path(collection_name))
+
+
+def index_bytes(collection_name: str) -> int:
+    """On-disk size of a collection's BM25 index (postings and docs)."""
+    base = _index_path(collection_name)
+    total = 0
+    for suffix in ("", "-wal"):
+        try:
+            total += os.path.getsize(base + suffix)
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def open_index(collection_name: str) -> BM25Index:
+    """Return the (cached) BM25 index for a collection, creating it."""
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = BM25Index(_index_path(collection_name))
+            _indexes[collection_name] = index
+        return index
+
+
+def release_index(collection_name: str) -> None:
+    """Close a collection's open BM25 index, if any, until it is used again."""
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+    if index is not None:
+        index.release()
+
+
+def drop_index(collection_name: str) -> None:
+    """Delete a collection's BM25 index from memory and disk."""
+    with _indexes_lock:
+        index = _indexes.pop(collection_name, None)
+    if index is not None:
+        index.close()
+    base = _index_path(collection_name)
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(base + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def node_text(node) -> str:
+    """Text indexed for a node: its content plus the source file name."""
+    meta = node.metadata or {}
+    return f"{meta.get('file_name', '')}\n{node.get_content()}"
+
+
+def reciprocal_rank_fusion(rankings, k: int = RRF_K) -> list:
+    """
+    Fuse several best-first lists of ids into one (id, score) list, scoring
+    each id by sum(1 / (k + rank)) over the lists it appears in.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, 1):
+            scores[item_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,96 @@
+"""
+In-process caches for RAG queries.
+
+Two LRU caches sit in front of retrieval: query text -> query embedding (so a
+repeated question is not re-embedded through Ollama) and
+(collection, query, top_k) -> retrieved nodes. Retrieval entries are keyed by
+a per-collection generation number that is bumped whenever the collection is
+re-indexed, deleted or reloaded, so stale results can never be served —
+even if a retrieval that started before the bump finishes after it.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+QUERY_CACHE_SIZE = int(os.environ.get("XCLOUD_RAG_QUERY_CACHE_SIZE", "512"))
+
+
+class LRUCache:
+    """A small thread-safe LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate) -> None:
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+query_embeddings = LRUCache(QUERY_CACHE_SIZE)
+retrievals = LRUCache(QUERY_CACHE_SIZE)
+
+_generations: dict[str, int] = {}
+_gen_lock = threading.Lock()
+
+
+def retrieval_key(collection_name: str, question: str, top_k: int,
+                  *options) -> tuple:
+    """
+    Cache key for a retrieval against the collection's current generation.
+    `options` are any retrieval settings that change the result.
+    """
+    with _gen_lock:
+        generation = _generations.get(collection_name, 0)
+    return (collection_name, generation, question, top_k, *options)
+
+
+def invalidate_collection(collection_name: str) -> None:
+    """Drop cached retrievals for a collection whose contents changed."""
+    with _gen_lock:
+        _generations[collection_name] = _generations.get(collection_name, 0) + 1
+    retrievals.discard_where(lambda k: k[0] == collection_name)
+
+
+def stats() -> dict:
+    return {
+        "query_embeddings": query_embeddings.stats(),
+        "retrievals": retrievals.stats(),
+    }
@@ -0,0 +1,182 @@
+"""
+Near-duplicate chunk elimination for RAG indexing.
+
+Shared folders hold many copies and versions of the same documents; every
+copy's chunks would be embedded separately and then crowd the top-k with
+the same text. ChunkDeduper sits between the splitter and the embedder:
+a chunk whose normalized text was seen before (exact) or whose MinHash
+signature puts it above THRESHOLD estimated Jaccard similarity to an
+earlier chunk (near, found through LSH banding) is not embedded; the file
+refers to the earlier chunk instead, and that chunk's metadata lists every
+file it stands for (see set_sources / source_paths) so citations still
+name all of them.
+
+Dedup is scoped to one indexing run.
+"""
+
+import hashlib
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+# Off with XCLOUD_RAG_DEDUP=0.
+ENABLED = os.environ.get("XCLOUD_RAG_DEDUP", "1") != "0"
+# Estimated Jaccard similarity (of word shingles) above which two chunks
+# count as near-duplicates.
+THRESHOLD = float(os.environ.get("XCLOUD_RAG_DEDUP_THRESHOLD", "0.9"))
+# MinHash permutations, split into BANDS LSH bands; with 16 bands of 4 rows
+# a pair at Jaccard 0.9 shares a band with probability > 0.9999.
+NUM_PERM = 64
+BANDS = 16
+# Words per shingle.
+SHINGLE = 5
+
+# Chunk metadata key listing the other files a deduplicated chunk is in.
+SOURCES_KEY = "duplicate_sources"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _words(text: str) -> list:
+    return _WORD_RE.findall(text.lower())
+
+
+class ChunkDeduper:
+    """Finds exact and near-duplicate chunks among the chunks it was shown."""
+
+    def __init__(self, threshold: float = THRESHOLD, num_perm: int = NUM_PERM,
+                 bands: int = BANDS, seed: int = 0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: h(x) = (a * x + b mod 2^64) >> 32, a odd.
+        self._a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | 1
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self.bands = bands
+        self._exact = {}  # digest of normalized text -> node id
+        self._buckets = [{} for _ in range(bands)]  # band key -> [slot]
+        self._signatures = []
+        self._ids = []
+        self.chunks = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def _signature(self, words: list) -> np.ndarray:
+        shingles = {
+            " ".join(words[i:i + SHINGLE])
+            for i in range(max(1, len(words) - SHINGLE + 1))
+        }
+        x = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles),
+            dtype=np.uint64, count=len(shingles),
+        )
+        with np.errstate(over="ignore"):
+            hashed = (self._a[:, None] * x[None, :] + self._b[:, None]) \
+                >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def canonical(self, node_id: str, text: str) -> str | None:
+        """
+        Return the id of an earlier chunk that `text` duplicates, or remember
+        this chunk under `node_id` and return None.
+        """
+        self.chunks += 1
+        words = _words(text)
+        digest = hashlib.sha1(" ".join(words).encode("utf-8")).digest()
+        earlier = self._exact.get(digest)
+        if earlier is not None:
+            self.exact_duplicates += 1
+            return earlier
+        if len(words) < SHINGLE:
+            # Too short for shingles to say anything beyond exact matches.
+            self._exact[digest] = node_id
+            return None
+
+        signature = self._signature(words)
+        keys = [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+        candidates = {
+            slot
+            for band, key in enumerate(keys)
+            for slot in self._buckets[band].get(key, ())
+        }
+        best, best_similarity = None, self.threshold
+        for slot in candidates:
+            similarity = float(np.mean(self._signatures[slot] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = slot, similarity
+        if best is not None:
+            self.near_duplicates += 1
+            return self._ids[best]
+
+        slot = len(self._ids)
+        self._ids.append(node_id)
+        self._signatures.append(signature)
+        self._exact[digest] = node_id
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(slot)
+        return None
+
+    def stats(self) -> dict:
+        duplicates = self.exact_duplicates + self.near_duplicates
+        return {
+            "dedup_chunks": self.chunks,
+            "dedup_exact": self.exact_duplicates,
+            "dedup_near": self.near_duplicates,
+            "dedup_ratio": round(duplicates / self.chunks, 4)
+            if self.chunks else 0.0,
+        }
+
+
+# --- source references in chunk metadata ---
+
+def source_paths(meta: dict) -> list:
+    """Every file a stored chunk stands for, its own file_path first."""
+    paths = [meta["file_path"]] if meta.get("file_path") else []
+    try:
+        paths += json.loads(meta.get(SOURCES_KEY) or "[]")
+    except (TypeError, ValueError):
+        pass
+    return list(dict.fromkeys(paths))
+
+
+def set_sources(meta: dict, sources: list) -> dict:
+    """
+    Chroma metadata of a stored chunk with its sources replaced: the first
+    becomes file_path / file_name, the rest are listed under SOURCES_KEY.
+    The serialized node ("_node_content") is updated the same way, with the
+    list kept out of the text used for embedding and for the LLM.
+    """
+    meta = dict(meta)
+    fields = {
+        "file_path": sources[0],
+        "file_name": os.path.basename(sources[0]),
+        SOURCES_KEY: json.dumps(sources[1:]) if len(sources) > 1 else None,
+    }
+    for key, value in fields.items():
+        if value is None:
+            meta.pop(key, None)
+        else:
+            meta[key] = value
+    if meta.get("_node_content"):
+        node = json.loads(meta["_node_content"])
+        node_meta = node.setdefault("metadata", {})
+        for key, value in fields.items():
+            if value is None:
+                node_meta.pop(key, None)
+            else:
+                node_meta[key] = value
+        for excluded in ("excluded_embed_metadata_keys",
+                         "excluded_llm_metadata_keys"):
+            keys = node.setdefault(excluded, [])
+            if SOURCES_KEY not in keys:
+                keys.append(SOURCES_KEY)
+        meta["_node_content"] = json.dumps(node)
+    return meta
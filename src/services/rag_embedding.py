@@ -0,0 +1,274 @@
+"""
+Pipelined embedding stage for RAG indexing.
+
+Keeps several embedding requests to Ollama in flight at once while a separate
+writer thread upserts finished batches into the vector store, so neither side
+waits on the other. The batch size adapts to the observed embedding latency:
+it grows while requests come back quickly and shrinks when they slow down.
+
+Chunks whose text was embedded before (by the same model) are served from a
+persistent on-disk cache instead of Ollama — see EmbeddingCache.
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from itertools import islice
+
+from services import llm_service, rag_lru
+
+# Embedding requests kept in flight against Ollama.
+EMBED_CONCURRENCY = int(os.environ.get("XCLOUD_RAG_EMBED_CONCURRENCY", "4"))
+# Adaptive batch size bounds and the per-request latency it aims for.
+INITIAL_BATCH = 16
+MIN_BATCH = 4
+MAX_BATCH = 256
+TARGET_BATCH_SECONDS = 2.0
+# How often (seconds) to poll `check` while waiting.
+POLL_INTERVAL = 0.2
+
+# On-disk embedding cache budget; 0 disables the cache.
+EMBED_CACHE_MB = int(os.environ.get("XCLOUD_RAG_EMBED_CACHE_MB", "1024"))
+
+_STOP = object()
+
+
+class EmbeddingCache(rag_lru.LRUStore):
+    """
+    Persistent embedding cache keyed by (model name, SHA-256 of chunk text).
+    Vectors are stored as float32 blobs in an rag_lru.LRUStore bounded to
+    `max_bytes`.
+    """
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def get_many(self, keys: list) -> dict:
+        """Return {key: embedding} for the keys present in the cache."""
+        return {
+            key: array("f", blob).tolist()
+            for key, blob in super().get_many(keys).items()
+        }
+
+    def put_many(self, items: dict) -> None:
+        """Store {key: embedding} and evict LRU entries if over budget."""
+        super().put_many(
+            {key: array("f", vector).tobytes() for key, vector in items.items()}
+        )
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Return the process-wide embedding cache, or None if disabled."""
+    global _cache
+    if EMBED_CACHE_MB <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            from services.dir_config import get_rag_state_dir
+
+            _cache = EmbeddingCache(
+                os.path.join(get_rag_state_dir(), "embedding_cache.sqlite"),
+                EMBED_CACHE_MB * 1024 * 1024,
+            )
+    return _cache
+
+
+class PipelinedEmbedder:
+    """
+    Embed nodes with `embed_model` and add them to `vector_store`.
+
+    Nodes are embedded exactly as VectorStoreIndex.insert_nodes would
+    (MetadataMode.EMBED content) and written with vector_store.add, so the
+    stored vectors are interchangeable with the non-pipelined path. With a
+    `cache`, only texts it does not already hold are sent to the model.
+    """
+
+    def __init__(self, embed_model, vector_store,
+                 concurrency: int = EMBED_CONCURRENCY,
+                 batch_size: int = INITIAL_BATCH,
+                 cache: EmbeddingCache | None = None):
+        self.embed_model = embed_model
+        self.vector_store = vector_store
+        self.cache = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.batches = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+        self._per_node = None  # EMA of embedding seconds per node
+        self._writer_error = None
+
+    # --- stages -----------------------------------------------------------
+    def _embed_texts(self, texts):
+        """
+        Embed texts in a background slot of llm_service.scheduler; returns
+        (embeddings, seconds spent queued for the slot).
+        """
+        queued = time.perf_counter()
+        with llm_service.scheduler.slot_sync(llm_service.BACKGROUND):
+            waited = time.perf_counter() - queued
+            return self.embed_model.get_text_embedding_batch(texts), waited
+
+    def _embed(self, batch):
+        """
+        Embed a batch in place; returns (seconds, nodes sent to model). The
+        seconds leave out time queued behind other Ollama requests, so the
+        batch size adapts to the embedding latency alone.
+        """
+        from llama_index.core.schema import MetadataMode
+
+        started = time.perf_counter()
+        texts = [n.get_content(metadata_mode=MetadataMode.EMBED) for n in batch]
+        if self.cache is None:
+            embeddings, waited = self._embed_texts(texts)
+            for node, embedding in zip(batch, embeddings):
+                node.embedding = embedding
+            return time.perf_counter() - started - waited, len(batch)
+
+        model_name = self.embed_model.model_name
+        keys = [EmbeddingCache.key(model_name, t) for t in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, k in enumerate(keys) if k not in cached]
+        self.cache_hits += len(batch) - len(missing)
+        self.cache_misses += len(missing)
+        waited = 0.0
+        if missing:
+            embeddings, waited = self._embed_texts(
+                [texts[i] for i in missing]
+            )
+            fresh = {}
+            for i, embedding in zip(missing, embeddings):
+                cached[keys[i]] = embedding
+                fresh[keys[i]] = embedding
+            self.cache.put_many(fresh)
+        for node, key in zip(batch, keys):
+            node.embedding = cached[key]
+        return time.perf_counter() - started - waited, len(missing)
+
+    def _write_loop(self, write_q, state, on_progress, on_batch):
+        try:
+            while True:
+                batch = write_q.get()
+                if batch is _STOP:
+                    return
+                started = time.perf_counter()
+                self.vector_store.add(batch)
+                self.write_seconds += time.perf_counter() - started
+                state["done"] += len(batch)
+                if on_batch:
+                    on_batch(batch)
+                if on_progress:
+                    on_progress(state["done"], state["total"])
+        except BaseException as e:  # noqa: BLE001 — surfaced by run()
+            self._writer_error = e
+            # Keep draining so the producer never blocks on a full queue.
+            while write_q.get() is not _STOP:
+                pass
+
+    def _tune(self, seconds: float, size: int):
+        per_node = seconds / max(1, size)
+        self._per_node = per_node if self._per_node is None \
+            else 0.7 * self._per_node + 0.3 * per_node
+        target = int(TARGET_BATCH_SECONDS / max(self._per_node, 1e-6))
+        self.batch_size = max(MIN_BATCH, min(MAX_BATCH, target))
+
+    # --- driver -----------------------------------------------------------
+    def _raise_writer_error(self):
+        if self._writer_error is not None:
+            raise self._writer_error
+
+    def _wait(self, future, check):
+        while True:
+            check()
+            self._raise_writer_error()
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except FutureTimeout:
+                continue
+
+    def _put(self, write_q, batch, check):
+        while True:
+            check()
+            self._raise_writer_error()
+            try:
+                write_q.put(batch, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def run(self, nodes, check, total: int | None = None,
+            on_progress=None, on_batch=None) -> int:
+        """
+        Embed and store every node from the iterable `nodes`.
+
+        `check()` is polled between batches and while waiting; if it raises,
+        no new batches are started, batches already handed to the writer are
+        still committed (and reported via on_batch), and the exception
+        propagates. on_progress(done, total) and on_batch(batch) are called
+        from the writer thread after each committed batch. Returns the number
+        of nodes stored.
+        """
+        if total is None:
+            total = len(nodes) if hasattr(nodes, "__len__") else 0
+        state = {"done": 0, "total": total}
+        write_q = queue.Queue(maxsize=self.concurrency)
+        writer = threading.Thread(
+            target=self._write_loop,
+            args=(write_q, state, on_progress, on_batch),
+            daemon=True,
+        )
+        source = iter(nodes)
+        in_flight = deque()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        writer.start()
+        try:
+            exhausted = False
+            while True:
+                check()
+                while not exhausted and len(in_flight) < self.concurrency:
+                    batch = list(islice(source, self.batch_size))
+                    if not batch:
+                        exhausted = True
+                        break
+                    in_flight.append((batch, pool.submit(self._embed, batch)))
+                if not in_flight:
+                    break
+                batch, future = in_flight.popleft()
+                seconds, embedded = self._wait(future, check)
+                self.embed_seconds += seconds
+                self.batches += 1
+                if embedded:
+                    self._tune(seconds, embedded)
+                self._put(write_q, batch, check)
+        finally:
+            for _batch, future in in_flight:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+            write_q.put(_STOP)
+            writer.join()
+        self._raise_writer_error()
+        return state["done"]
+
+    def stats(self) -> dict:
+        return {
+            "embed_batches": self.batches,
+            "embed_batch_size": self.batch_size,
+            "embed_seconds": round(self.embed_seconds, 3),
+            "write_seconds": round(self.write_seconds, 3),
+            "embed_cache_hits": self.cache_hits,
+            "embed_cache_misses": self.cache_misses,
+        }
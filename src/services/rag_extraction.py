@@ -0,0 +1,279 @@
+"""
+Parallel text extraction stage for RAG indexing.
+
+pypdf extraction is CPU-bound, so PDFs are fanned out to a process pool while
+plain-text files are read inline. Results are handed back in input order
+through a bounded window of in-flight files, which keeps memory flat on huge
+folders and lets the caller keep polling for cancellation while it waits.
+Very large PDFs are split into page ranges extracted in parallel.
+
+Extracted PDF text is kept per page in a compressed on-disk cache keyed by
+the file's path, size and mtime (see TextCache), so re-indexing or
+previewing an unchanged PDF skips pypdf without re-reading the file.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait as wait_futures
+
+from pdf_worker import extract_page_range
+from services import rag_lru
+
+# Worker processes for PDF extraction; <= 1 extracts serially in-process.
+EXTRACT_WORKERS = int(os.environ.get("XCLOUD_RAG_EXTRACT_WORKERS", "0")) \
+    or (os.cpu_count() or 1)
+# In-flight files per worker before the reader waits for the consumer.
+QUEUE_DEPTH_PER_WORKER = 4
+# How often (seconds) to poll `check` while waiting on a worker.
+POLL_INTERVAL = 0.2
+# PDFs at least this large (MB) are extracted as parallel page ranges of
+# PDF_SPLIT_PAGES pages each.
+PDF_SPLIT_MB = float(os.environ.get("XCLOUD_RAG_PDF_SPLIT_MB", "8"))
+PDF_SPLIT_PAGES = int(os.environ.get("XCLOUD_RAG_PDF_SPLIT_PAGES", "64"))
+
+# On-disk extracted-text cache budget (compressed bytes); 0 disables it.
+TEXT_CACHE_MB = int(os.environ.get("XCLOUD_RAG_TEXT_CACHE_MB", "512"))
+# Bump when extraction changes so stale cached text is not reused.
+EXTRACTOR_VERSION = 1
+
+
+class TextCache(rag_lru.LRUStore):
+    """
+    Extracted PDF text keyed by the file's path, size and modification
+    time, so a hit costs one stat() instead of hashing the file. Pages are
+    stored as a zlib-compressed JSON list in an rag_lru.LRUStore bounded to
+    `max_bytes`; only the parent process reads and writes it.
+    """
+
+    @staticmethod
+    def key(file_path: str) -> str:
+        st = os.stat(file_path)
+        path = os.path.realpath(file_path)
+        return f"v{EXTRACTOR_VERSION}:{st.st_size}:{st.st_mtime_ns}:{path}"
+
+    def get(self, key: str) -> list | None:
+        """The cached page texts for a key, or None."""
+        data = super().get(key)
+        return json.loads(zlib.decompress(data)) if data is not None else None
+
+    def put(self, key: str, pages: list) -> None:
+        """Store page texts and evict LRU entries if over budget."""
+        super().put(key, zlib.compress(json.dumps(pages).encode("utf-8")))
+
+
+_cache: TextCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> TextCache | None:
+    """Return the process-wide extracted-text cache, or None if disabled."""
+    global _cache
+    if TEXT_CACHE_MB <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            from services.dir_config import get_rag_state_dir
+
+            _cache = TextCache(
+                os.path.join(get_rag_state_dir(), "text_cache.sqlite"),
+                TEXT_CACHE_MB * 1024 * 1024,
+            )
+    return _cache
+
+
+def _page_ranges(file_path: str) -> list:
+    """[(start, stop)] to extract a PDF in: one range unless it is large."""
+    if os.path.getsize(file_path) < PDF_SPLIT_MB * 1024 * 1024:
+        return [(0, None)]
+    import pypdf
+
+    try:
+        n = len(pypdf.PdfReader(file_path).pages)
+    except Exception:
+        return [(0, None)]
+    step = max(1, PDF_SPLIT_PAGES)
+    return [(start, min(start + step, n)) for start in range(0, n, step)] \
+        or [(0, None)]
+
+
+def _cached_pages(file_path: str):
+    """(cache key, cached pages or None); the key is None without a cache."""
+    cache = get_text_cache()
+    if cache is None:
+        return None, None
+    key = cache.key(file_path)
+    return key, cache.get(key)
+
+
+def _store_pages(key: str | None, pages: list) -> None:
+    cache = get_text_cache()
+    if key is not None and cache is not None:
+        cache.put(key, pages)
+
+
+def _join_pages(pages: list) -> str:
+    return "\n".join(pages).strip()
+
+
+def _pdf_result(pages: list | None) -> tuple[str, str] | None:
+    text = _join_pages(pages) if pages is not None else ""
+    return (text, "application/pdf") if text else None
+
+
+def cached_pdf_pages(file_path: str) -> list | None:
+    """Text of every page of a PDF if it is in the cache, else None."""
+    return _cached_pages(file_path)[1]
+
+
+def extract_pdf_pages(file_path: str, workers: int | None = None) -> list:
+    """
+    Text of every page of a PDF, from the cache when the file's content was
+    extracted before. A large PDF is split into page ranges extracted by up
+    to `workers` processes (default: EXTRACT_WORKERS).
+    """
+    key, pages = _cached_pages(file_path)
+    if pages is not None:
+        return pages
+    workers = EXTRACT_WORKERS if workers is None else workers
+    ranges = _page_ranges(file_path)
+    if workers <= 1 or len(ranges) == 1:
+        pages = extract_page_range(file_path)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)),
+                                 mp_context=_pool_context()) as executor:
+            pages = [
+                page
+                for part in executor.map(
+                    extract_page_range, [file_path] * len(ranges),
+                    *zip(*ranges),
+                )
+                for page in part
+            ]
+    _store_pages(key, pages)
+    return pages
+
+
+def extract_pdf_text(file_path: str) -> str:
+    """Extract text from a PDF using pypdf (page by page, cached)."""
+    return _join_pages(extract_pdf_pages(file_path, workers=1))
+
+
+def extract_text(file_path: str) -> tuple[str, str] | None:
+    """
+    Return (text, mime type) for a supported file, or None if it cannot be
+    read or has no extractable text (e.g. an image-only PDF).
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if ext == ".pdf":
+            text = extract_pdf_text(file_path)
+            file_type = "application/pdf"
+        else:
+            with open(file_path, "r", encoding="utf-8",
+                      errors="ignore") as f:
+                text = f.read().strip()
+            file_type = "text/markdown" if ext == ".md" else "text/plain"
+    except Exception:
+        return None
+    return (text, file_type) if text else None
+
+
+def _pool_context():
+    # Never fork: the server is multithreaded (event loop, job and watcher
+    # threads, SQLite and HTTP pools) and a forked child can deadlock on a
+    # lock another thread held. Workers only import pdf_worker (not the
+    # `services` package), so starting them fresh stays cheap; the fork
+    # server preloads pypdf once for all of them.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pdf_worker"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class _PendingPdf:
+    """A PDF being extracted in the pool, as one or more page ranges."""
+
+    def __init__(self, key: str | None, futures: list):
+        self.key = key
+        self.futures = futures
+
+    def result(self, check=None) -> tuple[str, str] | None:
+        pages = []
+        for future in self.futures:
+            while not future.done():
+                if check:
+                    check()
+                wait_futures([future], timeout=POLL_INTERVAL)
+            try:
+                pages.extend(future.result())
+            except Exception:
+                return None
+        _store_pages(self.key, pages)
+        return _pdf_result(pages)
+
+
+def _submit_pdf(executor, file_path: str):
+    """Serve a PDF from the cache, or queue its extraction in the pool."""
+    try:
+        key, pages = _cached_pages(file_path)
+        if pages is not None:
+            return _pdf_result(pages)
+        ranges = _page_ranges(file_path)
+    except Exception:
+        return None
+    return _PendingPdf(key, [
+        executor.submit(extract_page_range, file_path, start, stop)
+        for start, stop in ranges
+    ])
+
+
+def iter_extracted(paths, check=None, workers: int | None = None):
+    """
+    Yield (path, extracted) for every path, in order, where extracted is the
+    result of extract_text (None when the file has no text).
+
+    With more than one worker, PDFs are extracted in a process pool while at
+    most workers * QUEUE_DEPTH_PER_WORKER files are in flight; a large PDF
+    is spread over several workers by page range. Cached PDFs never reach
+    the pool. `check` is called while waiting so a cancelled job stops
+    without draining the pool; pending work is dropped when the generator
+    is closed.
+    """
+    workers = EXTRACT_WORKERS if workers is None else workers
+    if workers <= 1:
+        for p in paths:
+            if check:
+                check()
+            yield p, extract_text(p)
+        return
+
+    limit = workers * QUEUE_DEPTH_PER_WORKER
+    window = deque()
+    executor = ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=_pool_context())
+    try:
+        source = iter(paths)
+        exhausted = False
+        while True:
+            while not exhausted and len(window) < limit:
+                p = next(source, None)
+                if p is None:
+                    exhausted = True
+                elif p.lower().endswith(".pdf"):
+                    window.append((p, _submit_pdf(executor, p)))
+                else:
+                    window.append((p, extract_text(p)))
+            if not window:
+                return
+            p, item = window.popleft()
+            if isinstance(item, _PendingPdf):
+                item = item.result(check)
+            yield p, item
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,409 @@
+"""
+Flat (brute-force) vector backend for RAG collections.
+
+An alternative to querying Chroma's HNSW index: a collection's embeddings
+are L2-normalized and appended to a contiguous float32 matrix on disk that
+is memory-mapped for search, next to an int8-quantized copy (one scale per
+row). A query scans the int8 matrix in blocks for candidates and re-scores
+only those candidates exactly against the float rows, so a search touches
+a quarter of the bytes HNSW keeps resident and has no graph to maintain.
+
+Chroma still stores the chunk text and metadata of a flat collection (with
+a 1-d placeholder embedding, so it builds no real HNSW graph); everything
+that lists or fetches chunks keeps working unchanged.
+
+Rows are append-only; deletes are tombstones in the SQLite row table and
+the matrices are compacted once more than half of the rows are dead.
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+
+from services.dir_config import get_rag_state_dir
+
+# Scan the int8 copy for candidates and re-score them in float32. With this
+# off, the float matrix is scanned directly (exact, but 4x the bytes).
+QUANTIZE = os.environ.get("XCLOUD_RAG_FLAT_QUANTIZE", "1") != "0"
+# Candidates re-scored exactly per requested result.
+RESCORE_FACTOR = 8
+MIN_CANDIDATES = 64
+# Rows scored per block, bounding the temporary float32 copy of a block.
+SCAN_BLOCK = 16384
+# Approximate Python memory per row for the id list and row map.
+ROW_OVERHEAD = 160
+
+BACKENDS = ("chroma", "flat")
+
+
+def _index_dir(collection_name: str) -> str:
+    return os.path.join(get_rag_state_dir(), "flat", collection_name)
+
+
+def _quantize(vectors: np.ndarray):
+    """Symmetric per-row int8 quantization: vectors ~= q * scale[:, None]."""
+    scale = np.abs(vectors).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.rint(vectors / scale[:, None]).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+class FlatIndex:
+    """A per-collection flat vector index; safe to share between threads."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._conn = None
+        self._closed = False
+        self._maps = None  # (n, float32 map, int8 map, scales map)
+        self._open_locked()
+
+    def _open_locked(self):
+        """Open and load the row table unless it is open (see release)."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed index.")
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(
+            os.path.join(self.directory, "rows.sqlite"),
+            check_same_thread=False,
+        )
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                node_id TEXT NOT NULL,
+                alive INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_rows_node ON rows(node_id);
+            """
+        )
+        self._conn.commit()
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'dim'"
+        ).fetchone()
+        self.dim = row[0] if row else None
+        self._load_rows()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load_rows(self):
+        rows = self._conn.execute(
+            "SELECT row, node_id, alive FROM rows ORDER BY row"
+        ).fetchall()
+        self._ids = [node_id for _row, node_id, _alive in rows]
+        self._alive = np.array([bool(a) for _r, _n, a in rows], dtype=bool)
+        self._row_of = {
+            node_id: row for row, node_id, alive in rows if alive
+        }
+        # Drop vector bytes of rows that were appended but never recorded
+        # (a crash between the two writes).
+        if self.dim is not None:
+            n = len(self._ids)
+            for name, width in (("vectors.f32", 4 * self.dim),
+                                ("vectors.i8", self.dim),
+                                ("scales.f32", 4)):
+                with open(self._path(name), "ab") as f:
+                    if f.tell() > n * width:
+                        f.truncate(n * width)
+
+    def _append_locked(self, vectors: np.ndarray):
+        q, scale = _quantize(vectors)
+        for name, data in (("vectors.f32", vectors), ("vectors.i8", q),
+                           ("scales.f32", scale)):
+            with open(self._path(name), "ab") as f:
+                f.write(np.ascontiguousarray(data).tobytes())
+
+    def add(self, node_ids: list, embeddings) -> None:
+        """Add (or replace) vectors for node ids."""
+        if not node_ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        with self._lock:
+            self._open_locked()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('dim', ?)",
+                    (self.dim,),
+                )
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match "
+                    f"the collection's {self.dim}."
+                )
+            self._tombstone_locked(node_ids)
+            self._append_locked(vectors)
+            start = len(self._ids)
+            self._conn.executemany(
+                "INSERT INTO rows (row, node_id) VALUES (?, ?)",
+                [(start + i, node_id) for i, node_id in enumerate(node_ids)],
+            )
+            self._conn.commit()
+            self._ids.extend(node_ids)
+            self._alive = np.concatenate(
+                [self._alive, np.ones(len(node_ids), dtype=bool)]
+            )
+            for i, node_id in enumerate(node_ids):
+                self._row_of[node_id] = start + i
+
+    def delete(self, node_ids) -> None:
+        with self._lock:
+            self._open_locked()
+            self._tombstone_locked(list(node_ids))
+            self._conn.commit()
+            dead = len(self._ids) - len(self._row_of)
+            if dead > max(1000, len(self._row_of)):
+                self._compact_locked()
+
+    def _tombstone_locked(self, node_ids: list) -> None:
+        rows = [self._row_of.pop(i) for i in node_ids if i in self._row_of]
+        if not rows:
+            return
+        self._alive[rows] = False
+        self._conn.executemany(
+            "UPDATE rows SET alive = 0 WHERE row = ?", [(r,) for r in rows]
+        )
+
+    def _compact_locked(self) -> None:
+        """Rewrite the matrices without dead rows."""
+        keep = np.flatnonzero(self._alive)
+        n = len(self._ids)
+        for name, dtype, width in (("vectors.f32", np.float32, self.dim),
+                                   ("vectors.i8", np.int8, self.dim),
+                                   ("scales.f32", np.float32, 1)):
+            data = np.fromfile(self._path(name), dtype=dtype)
+            data = data[:n * width].reshape(n, width)[keep]
+            tmp = self._path(name + ".tmp")
+            data.tofile(tmp)
+            os.replace(tmp, self._path(name))
+        ids = [self._ids[r] for r in keep]
+        self._conn.execute("DELETE FROM rows")
+        self._conn.executemany(
+            "INSERT INTO rows (row, node_id) VALUES (?, ?)",
+            list(enumerate(ids)),
+        )
+        self._conn.commit()
+        self._maps = None
+        self._load_rows()
+
+    def count(self) -> int:
+        with self._lock:
+            self._open_locked()
+            return len(self._row_of)
+
+    def node_ids(self) -> list:
+        with self._lock:
+            self._open_locked()
+            return list(self._row_of)
+
+    def _maps_locked(self):
+        n = len(self._ids)
+        if self._maps is None or self._maps[0] != n:
+            if n == 0 or self.dim is None:
+                return None
+            self._maps = (
+                n,
+                np.memmap(self._path("vectors.f32"), dtype=np.float32,
+                          mode="r", shape=(n, self.dim)),
+                np.memmap(self._path("vectors.i8"), dtype=np.int8,
+                          mode="r", shape=(n, self.dim)),
+                np.memmap(self._path("scales.f32"), dtype=np.float32,
+                          mode="r", shape=(n,)),
+            )
+        return self._maps
+
+    def search(self, query, top_k: int, quantized: bool | None = None):
+        """Return up to top_k (node_id, cosine similarity), best first."""
+        if quantized is None:
+            quantized = QUANTIZE
+        with self._lock:
+            self._open_locked()
+            maps = self._maps_locked()
+            if maps is None:
+                return []
+            n, floats, ints, scales = maps
+            alive = self._alive[:n].copy()
+            ids = self._ids
+        n_alive = int(alive.sum())
+        if n_alive == 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+
+        if quantized:
+            n_candidates = min(
+                n_alive, max(top_k * RESCORE_FACTOR, MIN_CANDIDATES)
+            )
+            approx = self._scan(ints, q, alive, scales)
+            candidates = np.sort(_top(approx, n_candidates))
+            scores = floats[candidates] @ q
+        else:
+            scores = self._scan(floats, q, alive)
+            candidates = np.arange(n)
+        best = _top(scores, min(top_k, n_alive))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [
+            (ids[candidates[i]], float(scores[i]))
+            for i in best
+            if np.isfinite(scores[i])
+        ]
+
+    def vectors(self, node_ids) -> dict:
+        """Return {node_id: normalized float32 vector} for live node ids."""
+        with self._lock:
+            self._open_locked()
+            maps = self._maps_locked()
+            if maps is None:
+                return {}
+            rows = {i: self._row_of[i] for i in node_ids if i in self._row_of}
+        floats = maps[1]
+        return {node_id: np.array(floats[row]) for node_id, row in rows.items()}
+
+    @staticmethod
+    def _scan(matrix, q, alive, scales=None):
+        """Score every row against q in blocks; dead rows get -inf."""
+        n = matrix.shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, SCAN_BLOCK):
+            block = np.asarray(matrix[start:start + SCAN_BLOCK],
+                               dtype=np.float32)
+            scores[start:start + len(block)] = block @ q
+        if scales is not None:
+            scores *= scales
+        scores[~alive] = -np.inf
+        return scores
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._open_locked()
+            n = len(self._ids)
+            dim = self.dim or 0
+            return {
+                "rows": n,
+                "alive": len(self._row_of),
+                "dim": dim,
+                "float_bytes": n * dim * 4,
+                "int8_bytes": n * (dim + 4),
+                "quantized": QUANTIZE,
+            }
+
+    def memory_bytes(self) -> int:
+        """
+        Estimated memory of a loaded index: the matrix a search scans once
+        it is paged in, plus the in-memory row tables.
+        """
+        stats = self.stats()
+        scanned = stats["int8_bytes"] if QUANTIZE else stats["float_bytes"]
+        return scanned + stats["rows"] * ROW_OVERHEAD
+
+    def release(self) -> None:
+        """
+        Free the row table, memory maps and SQLite connection of an index
+        that is no longer queried; the next call on it reopens them.
+        """
+        with self._lock:
+            self._release_locked()
+
+    def _release_locked(self) -> None:
+        if self._conn is None:
+            return
+        self._maps = None
+        self._conn.close()
+        self._conn = None
+        self._ids, self._alive, self._row_of = [], None, {}
+
+    def close(self) -> None:
+        with self._lock:
+            self._release_locked()
+            self._closed = True
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, unordered."""
+    if k >= len(scores):
+        return np.arange(len(scores))
+    return np.argpartition(-scores, k - 1)[:k]
+
+
+_indexes: dict[str, FlatIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def exists(collection_name: str) -> bool:
+    return os.path.isdir(_index_dir(collection_name))
+
+
+def open_index(collection_name: str) -> FlatIndex:
+    """Return the (cached) flat index for a collection, creating it."""
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = FlatIndex(_index_dir(collection_name))
+            _indexes[collection_name] = index
+        return index
+
+
+def release_index(collection_name: str) -> None:
+    """Free the memory held by a collection's open flat index, if any."""
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+    if index is not None:
+        index.release()
+
+
+def drop_index(collection_name: str) -> None:
+    """Delete a collection's flat index from memory and disk."""
+    with _indexes_lock:
+        index = _indexes.pop(collection_name, None)
+    if index is not None:
+        index.close()
+    shutil.rmtree(_index_dir(collection_name), ignore_errors=True)
+
+
+class FlatVectorStore:
+    """
+    Minimal vector store for PipelinedEmbedder: embeddings go to the flat
+    index, text and metadata to the Chroma collection (same layout as
+    ChromaVectorStore writes, so chunks are fetched the same way).
+    """
+
+    def __init__(self, chroma_collection, flat_index: FlatIndex):
+        self.chroma_collection = chroma_collection
+        self.flat_index = flat_index
+
+    def add(self, nodes) -> list:
+        from llama_index.core.schema import MetadataMode
+        from llama_index.core.vector_stores.utils import node_to_metadata_dict
+
+        if not nodes:
+            return []
+        ids = [node.node_id for node in nodes]
+        self.flat_index.add(ids, [node.get_embedding() for node in nodes])
+        self.chroma_collection.upsert(
+            ids=ids,
+            embeddings=[[0.0]] * len(nodes),
+            documents=[
+                node.get_content(metadata_mode=MetadataMode.NONE)
+                for node in nodes
+            ],
+            metadatas=[
+                node_to_metadata_dict(node, remove_text=True,
+                                      flat_metadata=True)
+                for node in nodes
+            ],
+        )
+        return ids
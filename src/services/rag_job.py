@@ -1,40 +1,75 @@
 """
 Background RAG indexing job manager.
 
-Runs a single indexing job at a time in a worker thread so the FastAPI event
-loop is never blocked, and supports real cancellation: the worker polls a
-threading.Event between document nodes and stops + rolls back when set.
+Jobs are queued and run by up to MAX_CONCURRENT_JOBS worker threads so the
+FastAPI event loop is never blocked and a second request waits instead of
+failing. Higher-priority jobs start first; at most one job per collection
+runs at a time (a per-collection lock), so other collections' jobs can run
+while it waits. Every job has its own id and supports real cancellation:
+the worker polls a threading.Event between document nodes and stops when
+set. By default a cancelled job is paused — its checkpoint is kept and
+resume_index_job continues it later — or, with rollback, aborted and rolled
+back; cancelling a paused run with rollback discards its checkpoint. A
+queued job is cancelled without ever starting.
 """
 
+import heapq
+import itertools
+import os
 import threading
 import time
 import uuid
 
 from services import rag_service
 
+# Indexing jobs allowed to run at the same time.
+MAX_CONCURRENT_JOBS = int(os.environ.get("XCLOUD_RAG_INDEX_WORKERS", "2"))
+# Queued jobs accepted before new requests are rejected.
+MAX_QUEUED_JOBS = 100
+# Finished jobs kept for the status API.
+FINISHED_HISTORY = 50
+
 
 class _IndexJob:
-    def __init__(self, folder_path: str, collection_name: str):
+    def __init__(self, folder_path: str, collection_name: str,
+                 incremental: bool = False, priority: int = 0,
+                 streaming: bool = False, paths: list | None = None,
+                 backend: str | None = None, resume: bool = False):
         self.id = uuid.uuid4().hex
         self.folder_path = folder_path
         self.collection_name = collection_name
-        self.state = "running"   # running | success | cancelled | error
-        self.phase = "starting"  # starting | reading | embedding
-        self.done = 0
+        self.incremental = incremental
+        self.streaming = streaming
+        self.paths = paths  # limit an incremental run to these files
+        self.backend = backend
+        self.resume = resume  # continue from the collection's checkpoint
+        self.rollback = False  # on cancel: abort instead of pausing
+        self.priority = priority
+        # queued | running | success | paused | cancelled | error
+        self.state = "queued"
+        self.phase = "queued"    # queued | starting | reading | embedding | streaming
+        self.done = 0   # nodes embedded (source bytes stored when streaming)
         self.total = 0
+        self.stats = {}  # files added/changed/removed/unchanged
         self.error = None
         self.result = None
-        self.started_at = time.time()
+        self.queued_at = time.time()
+        self.started_at = None
         self.finished_at = None
         self._cancel = threading.Event()
         self._thread = None
 
     # --- worker ---------------------------------------------------------
-    def start(self):
-        self._thread = threading.Thread(target=self._run, daemon=True)
+    def start(self, on_finished):
+        self.state = "running"
+        self.phase = "starting"
+        self.started_at = time.time()
+        self._thread = threading.Thread(
+            target=self._run, args=(on_finished,), daemon=True
+        )
         self._thread.start()
 
-    def _run(self):
+    def _run(self, on_finished):
         def is_cancelled():
             return self._cancel.is_set()
 
@@ -45,71 +80,263 @@ class _IndexJob:
         def on_phase(phase):
             self.phase = phase
 
+        def on_stats(stats):
+            self.stats.update(stats)
+
+        def is_aborted():
+            return self.rollback
+
         try:
-            result = rag_service.create_index_from_folder_cancellable(
-                self.folder_path,
-                self.collection_name,
-                is_cancelled=is_cancelled,
-                on_progress=on_progress,
-                on_phase=on_phase,
-            )
+            if self.resume:
+                result = rag_service.resume_index_cancellable(
+                    self.collection_name,
+                    is_cancelled=is_cancelled,
+                    on_progress=on_progress,
+                    on_phase=on_phase,
+                    on_stats=on_stats,
+                    is_aborted=is_aborted,
+                )
+            else:
+                result = rag_service.create_index_from_folder_cancellable(
+                    self.folder_path,
+                    self.collection_name,
+                    is_cancelled=is_cancelled,
+                    on_progress=on_progress,
+                    on_phase=on_phase,
+                    incremental=self.incremental,
+                    on_stats=on_stats,
+                    streaming=self.streaming,
+                    paths=self.paths,
+                    backend=self.backend,
+                    is_aborted=is_aborted,
+                )
             self.result = result
             self.state = "success"
         except rag_service.IndexingCancelled:
-            self.state = "cancelled"
+            self.state = "cancelled" if self.rollback else "paused"
         except Exception as e:  # noqa: BLE001
             self.state = "error"
             self.error = str(e)
         finally:
             self.finished_at = time.time()
+            on_finished(self)
 
-    def cancel(self):
+    def cancel(self, rollback: bool = False):
+        self.rollback = rollback
         self._cancel.set()
 
     def to_dict(self):
+        now = time.time()
+        started = self.started_at or self.finished_at
         return {
             "job_id": self.id,
             "state": self.state,
             "phase": self.phase,
+            "priority": self.priority,
             "folder_path": self.folder_path,
             "collection_name": self.collection_name,
+            "incremental": self.incremental,
+            "streaming": self.streaming,
+            "paths": len(self.paths) if self.paths is not None else None,
+            "backend": self.backend,
+            "resume": self.resume,
             "done": self.done,
             "total": self.total,
+            "stats": self.stats,
             "error": self.error,
             "result": self.result,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wait_seconds": round((started or now) - self.queued_at, 3),
+            "run_seconds": round(
+                (self.finished_at or now) - self.started_at, 3
+            ) if self.started_at else None,
         }
 
 
-_current_job: _IndexJob | None = None
+_jobs: dict[str, _IndexJob] = {}     # every known job, by id
+_queue: list = []                    # heap of (-priority, seq, job)
+_running: dict[str, _IndexJob] = {}  # collection name -> running job
+_discarding: set[str] = set()        # collections whose checkpoint is dropped
+_finished: list[_IndexJob] = []      # oldest first, bounded
+_latest: _IndexJob | None = None
+_seq = itertools.count()
 _lock = threading.Lock()
 
 
-def start_index_job(folder_path: str, collection_name: str = "default") -> dict:
-    """Start a new indexing job. Rejects if one is already running."""
-    global _current_job
+def _dispatch_locked():
+    """Start queued jobs while workers are free, skipping busy collections."""
+    skipped = []
+    while _queue and len(_running) < MAX_CONCURRENT_JOBS:
+        entry = heapq.heappop(_queue)
+        job = entry[2]
+        if job.state != "queued":
+            continue  # cancelled while queued
+        if (job.collection_name in _running
+                or job.collection_name in _discarding):
+            skipped.append(entry)
+            continue
+        _running[job.collection_name] = job
+        job.start(_on_finished)
+    for entry in skipped:
+        heapq.heappush(_queue, entry)
+
+
+def _on_finished(job: _IndexJob):
+    with _lock:
+        if _running.get(job.collection_name) is job:
+            del _running[job.collection_name]
+        _retire_locked(job)
+        _dispatch_locked()
+
+
+def _retire_locked(job: _IndexJob):
+    _finished.append(job)
+    while len(_finished) > FINISHED_HISTORY:
+        old = _finished.pop(0)
+        if old is not _latest:
+            _jobs.pop(old.id, None)
+
+
+def start_index_job(folder_path: str, collection_name: str = "default",
+                    incremental: bool = False, priority: int = 0,
+                    streaming: bool = False,
+                    paths: list | None = None,
+                    backend: str | None = None) -> dict:
+    """
+    Queue a new indexing job and start it as soon as a worker and its
+    collection are free. Higher priority runs first. Rejects only when the
+    queue is full. `paths` limits an incremental run to those files;
+    `backend` picks the vector backend (see rag_service).
+    """
+    global _latest
     with _lock:
-        if _current_job is not None and _current_job.state == "running":
-            raise RuntimeError("An indexing job is already running.")
-        job = _IndexJob(folder_path, collection_name)
-        _current_job = job
-    job.start()
-    return job.to_dict()
+        queued = sum(1 for _p, _s, j in _queue if j.state == "queued")
+        if queued >= MAX_QUEUED_JOBS:
+            raise RuntimeError("Too many indexing jobs are queued.")
+        job = _IndexJob(folder_path, collection_name, incremental, priority,
+                        streaming, paths, backend)
+        _jobs[job.id] = job
+        _latest = job
+        heapq.heappush(_queue, (-priority, next(_seq), job))
+        _dispatch_locked()
+        return job.to_dict()
 
 
-def cancel_index_job() -> dict:
-    """Signal the current job to cancel. Returns its status."""
+def resume_index_job(collection_name: str, priority: int = 0) -> dict:
+    """
+    Queue a job that continues a collection's paused or interrupted run
+    from its checkpoint. Raises KeyError if there is nothing to resume.
+    """
+    global _latest
+    checkpoint = rag_service.get_checkpoint(collection_name)
+    if checkpoint is None:
+        raise KeyError(f"No checkpoint to resume for {collection_name}")
     with _lock:
-        job = _current_job
+        queued = sum(1 for _p, _s, j in _queue if j.state == "queued")
+        if queued >= MAX_QUEUED_JOBS:
+            raise RuntimeError("Too many indexing jobs are queued.")
+        job = _IndexJob(checkpoint["folder_path"], collection_name,
+                        incremental=True, priority=priority,
+                        streaming=checkpoint.get("streaming", False),
+                        paths=checkpoint.get("paths"),
+                        backend=checkpoint.get("backend"), resume=True)
+        _jobs[job.id] = job
+        _latest = job
+        heapq.heappush(_queue, (-priority, next(_seq), job))
+        _dispatch_locked()
+        return job.to_dict()
+
+
+def cancel_index_job(job_id: str | None = None,
+                     rollback: bool = False,
+                     collection_name: str | None = None) -> dict:
+    """
+    Signal a job to cancel (default: the one running or queued for
+    `collection_name`, else the most recently submitted one). A running job
+    pauses at its last checkpoint, or with `rollback` is aborted and rolled
+    back. Queued jobs are cancelled immediately. With `rollback`, a paused
+    or failed run — the job's, or `collection_name`'s when no job is
+    running for it — is discarded instead (see
+    rag_service.discard_checkpoint). Returns the job's status.
+    """
+    with _lock:
+        if job_id:
+            job = _jobs.get(job_id)
+            if job is None:
+                raise KeyError(f"Indexing job '{job_id}' not found")
+        elif collection_name:
+            job = _running.get(collection_name) or next(
+                (j for _p, _s, j in _queue
+                 if j.collection_name == collection_name
+                 and j.state == "queued"),
+                None,
+            )
+        else:
+            job = _latest
+        if job is not None and job.state == "queued":
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            _retire_locked(job)
+            return job.to_dict()
+        if job is not None and job.state == "running":
+            job.cancel(rollback)
+            return job.to_dict()
+        discard = rollback and (
+            job.state in ("paused", "error") if job is not None
+            else collection_name is not None
+        )
+        if not discard:
+            return job.to_dict() if job is not None else {"state": "idle"}
+        target = job.collection_name if job else collection_name
+        if target in _running or target in _discarding:
+            raise RuntimeError(f"An indexing job is running for {target}.")
+        _discarding.add(target)
+    try:
+        discarded = rag_service.discard_checkpoint(target)
+    finally:
+        with _lock:
+            _discarding.discard(target)
+            _dispatch_locked()
     if job is None:
-        return {"state": "idle"}
-    job.cancel()
-    return job.to_dict()
+        return {"state": "cancelled", **discarded}
+    if job.state == "paused":
+        job.state = "cancelled"
+    return {**job.to_dict(), **discarded}
+
+
+def get_job_status(job_id: str) -> dict:
+    """Return the status of one job by id."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Indexing job '{job_id}' not found")
+        return job.to_dict()
+
+
+def list_jobs() -> dict:
+    """Queued (in start order), running and finished jobs."""
+    with _lock:
+        queued = [
+            job.to_dict()
+            for _p, _s, job in sorted(_queue, key=lambda e: e[:2])
+            if job.state == "queued"
+        ]
+        return {
+            "queued": queued,
+            "running": [job.to_dict() for job in _running.values()],
+            "finished": [job.to_dict() for job in reversed(_finished)],
+        }
 
 
 def get_index_status() -> dict:
-    """Return the status of the current/last job, or idle."""
+    """
+    Return the status of the most recently submitted job (or idle), plus
+    the list of queued, running and finished jobs.
+    """
     with _lock:
-        job = _current_job
-    if job is None:
-        return {"state": "idle"}
-    return job.to_dict()
+        job = _latest
+    status = job.to_dict() if job is not None else {"state": "idle"}
+    status["jobs"] = list_jobs()
+    return status
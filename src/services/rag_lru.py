@@ -0,0 +1,134 @@
+"""
+Size-bounded, least-recently-used blob store in SQLite.
+
+The storage behind the persistent RAG caches (rag_embedding.EmbeddingCache,
+rag_extraction.TextCache): values are opaque blobs under string keys. Every
+hit refreshes the entry's last-used time, and once the stored blobs exceed
+`max_bytes` the least recently used entries are evicted down to 90% of the
+budget. Safe to share between threads (one connection behind a lock), not
+across processes.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Keys per IN (...) query, below SQLite's bound-parameter limit.
+_CHUNK = 500
+
+
+class LRUStore:
+    def __init__(self, db_path: str, max_bytes: int):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_last_used"
+            " ON entries(last_used)"
+        )
+        self._conn.commit()
+        self._bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries"
+        ).fetchone()[0]
+
+    def get_many(self, keys: list) -> dict:
+        """Return {key: blob} for the keys present in the store."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _CHUNK):
+                chunk = keys[start:start + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({marks})",
+                    chunk,
+                ).fetchall())
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?",
+                    [(now, k) for k in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> bytes | None:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: dict) -> None:
+        """Store {key: blob} and evict LRU entries if over budget."""
+        now = time.time()
+        rows = [
+            (k, v, now) for k, v in items.items() if len(v) <= self.max_bytes
+        ]
+        if not rows:
+            return
+        with self._lock:
+            keys = [k for k, _v, _t in rows]
+            for start in range(0, len(keys), _CHUNK):
+                chunk = keys[start:start + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                self._bytes -= self._conn.execute(
+                    "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries"
+                    f" WHERE key IN ({marks})",
+                    chunk,
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, last_used)"
+                " VALUES (?, ?, ?)",
+                rows,
+            )
+            self._bytes += sum(len(v) for _k, v, _t in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def put(self, key: str, value: bytes) -> None:
+        self.put_many({key: value})
+
+    def _evict(self):
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(value) FROM entries"
+                " ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                return
+            freed = 0
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                freed += size
+                if self._bytes - freed <= target:
+                    break
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self._bytes -= freed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM entries"
+            ).fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,379 @@
+"""
+Per-collection file manifest for incremental RAG indexing.
+
+Records, for every source file of a collection, its size, mtime and content
+hash together with the Chroma node ids its chunks were stored under. A
+re-index compares the folder against this manifest and only re-embeds the
+files that were added or changed, and deletes the vectors of removed ones.
+
+Every save also refreshes a small SQLite catalog (per-collection totals and
+one row per file) so the collection listing endpoints answer without
+loading manifests or scanning Chroma metadata.
+
+A running indexing job checkpoints often, so instead of rewriting the whole
+manifest each time it appends the records that changed to a journal next
+to it (append_journal); load_manifest replays the journal and the next full
+save folds it in.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from services.dir_config import get_rag_state_dir
+
+
+def _manifest_dir() -> str:
+    return os.path.join(get_rag_state_dir(), "manifests")
+
+
+def _manifest_path(collection_name: str) -> str:
+    return os.path.join(_manifest_dir(), f"{collection_name}.json")
+
+
+def _journal_path(collection_name: str) -> str:
+    return os.path.join(_manifest_dir(), f"{collection_name}.journal")
+
+
+def _remove_journal(collection_name: str) -> None:
+    try:
+        os.remove(_journal_path(collection_name))
+    except FileNotFoundError:
+        pass
+
+
+def new_manifest(collection_name: str, folder_path: str) -> dict:
+    """Return an empty manifest for a collection indexed from folder_path."""
+    return {
+        "collection": collection_name,
+        "source_folder": os.path.abspath(folder_path),
+        "created_at": time.time(),
+        "updated_at": time.time(),
+        "files": {},
+    }
+
+
+def load_manifest(collection_name: str) -> dict | None:
+    """
+    Load a collection's manifest with its journal applied, or None if it
+    has none (or is corrupt).
+    """
+    try:
+        with open(_manifest_path(collection_name), "r") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    try:
+        with open(_journal_path(collection_name), "r") as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn last line of a crashed write
+                files = manifest.setdefault("files", {})
+                for file_path, entry in change["files"].items():
+                    if entry is None:
+                        files.pop(file_path, None)
+                    else:
+                        files[file_path] = entry
+                manifest["checkpoint"] = change.get("checkpoint")
+                manifest["updated_at"] = change["updated_at"]
+    except FileNotFoundError:
+        pass
+    if manifest.get("checkpoint") is None:
+        manifest.pop("checkpoint", None)
+    return manifest
+
+
+def save_manifest(collection_name: str, manifest: dict) -> None:
+    """Atomically write a collection's manifest (dropping its journal)."""
+    os.makedirs(_manifest_dir(), exist_ok=True)
+    manifest["updated_at"] = time.time()
+    target = _manifest_path(collection_name)
+    tmp = target + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, target)
+    _remove_journal(collection_name)
+    _write_catalog(collection_name, manifest)
+
+
+def append_journal(collection_name: str, manifest: dict, changes: dict,
+                   chunks: int) -> None:
+    """
+    Record changed file records ({file_path: record, or None if removed})
+    of a saved manifest in its journal, with the manifest's current
+    checkpoint marker, and update only those rows of the catalog; `chunks`
+    is the collection's distinct chunk count. The cost is proportional to
+    the changes, not to the manifest.
+    """
+    manifest["updated_at"] = time.time()
+    line = json.dumps({
+        "files": changes,
+        "checkpoint": manifest.get("checkpoint"),
+        "updated_at": manifest["updated_at"],
+    })
+    with open(_journal_path(collection_name), "a") as f:
+        f.write(line + "\n")
+    _update_catalog(collection_name, manifest, changes, chunks)
+
+
+def delete_manifest(collection_name: str) -> None:
+    """Remove a collection's manifest (and its catalog rows), if any."""
+    try:
+        os.remove(_manifest_path(collection_name))
+    except FileNotFoundError:
+        pass
+    _remove_journal(collection_name)
+    with _catalog_lock:
+        conn = _catalog()
+        conn.execute("DELETE FROM files WHERE collection = ?",
+                     (collection_name,))
+        conn.execute("DELETE FROM collections WHERE name = ?",
+                     (collection_name,))
+        conn.commit()
+
+
+def source_folder(manifest: dict) -> str:
+    """
+    The folder a manifest was built from, spelled the way its file paths
+    are (absolute or relative), so paths under it match the manifest keys.
+    """
+    folder = manifest["source_folder"]
+    files = manifest.get("files", {})
+    if files and not any(os.path.isabs(p) for p in files):
+        folder = os.path.relpath(folder)
+    return folder
+
+
+def file_stat(file_path: str) -> tuple[int, float]:
+    """Return (size, mtime) — the cheap change check done before hashing."""
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime
+
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of a file's bytes, read in 1 MiB blocks."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_entry(file_path: str, node_ids: list, file_hash: str | None = None,
+               stat: tuple[int, float] | None = None,
+               file_type: str | None = None) -> dict:
+    """Build the manifest record for one source file."""
+    size, mtime = stat or file_stat(file_path)
+    return {
+        "size": size,
+        "mtime": mtime,
+        "sha256": file_hash or hash_file(file_path),
+        "node_ids": list(node_ids),
+        "file_type": file_type,
+        "indexed_at": time.time(),
+    }
+
+
+# --- stats catalog ---
+
+_catalog_conn = None
+_catalog_lock = threading.Lock()
+
+
+def _catalog() -> sqlite3.Connection:
+    """The shared catalog connection; callers hold _catalog_lock."""
+    global _catalog_conn
+    if _catalog_conn is None:
+        os.makedirs(_manifest_dir(), exist_ok=True)
+        conn = sqlite3.connect(
+            os.path.join(_manifest_dir(), "catalog.sqlite"),
+            check_same_thread=False,
+        )
+        conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS collections (
+                name TEXT PRIMARY KEY,
+                source_folder TEXT,
+                files INTEGER NOT NULL,
+                chunks INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                created_at REAL,
+                updated_at REAL,
+                checkpoint TEXT
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                collection TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                file_type TEXT,
+                chunks INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                indexed_at REAL,
+                PRIMARY KEY (collection, file_path)
+            ) WITHOUT ROWID;
+            """
+        )
+        columns = {
+            row[1] for row in conn.execute("PRAGMA table_info(collections)")
+        }
+        if "checkpoint" not in columns:
+            conn.execute("ALTER TABLE collections ADD COLUMN checkpoint TEXT")
+        conn.commit()
+        _catalog_conn = conn
+    return _catalog_conn
+
+
+def _write_catalog(collection_name: str, manifest: dict) -> None:
+    rows = [
+        (
+            collection_name, file_path, os.path.basename(file_path),
+            entry.get("file_type"), len(entry.get("node_ids", [])),
+            entry.get("size", 0), entry.get("indexed_at"),
+        )
+        for file_path, entry in manifest.get("files", {}).items()
+    ]
+    indexed = [row for row in rows if row[4]]
+    # Deduplicated chunks are listed by every file they stand for but
+    # stored once.
+    chunks = len({
+        node_id
+        for entry in manifest.get("files", {}).values()
+        for node_id in entry.get("node_ids", [])
+    })
+    with _catalog_lock:
+        conn = _catalog()
+        conn.execute("DELETE FROM files WHERE collection = ?",
+                     (collection_name,))
+        conn.executemany(
+            "INSERT INTO files (collection, file_path, file_name, file_type,"
+            " chunks, bytes, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO collections (name, source_folder, files,"
+            " chunks, bytes, created_at, updated_at, checkpoint)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                collection_name,
+                source_folder(manifest) if manifest.get("source_folder")
+                else None,
+                len(indexed),
+                chunks,
+                sum(row[5] for row in indexed),
+                manifest.get("created_at"),
+                manifest.get("updated_at"),
+                (manifest.get("checkpoint") or {}).get("state"),
+            ),
+        )
+        conn.commit()
+
+
+def _update_catalog(collection_name: str, manifest: dict, changes: dict,
+                    chunks: int) -> None:
+    with _catalog_lock:
+        conn = _catalog()
+        conn.executemany(
+            "DELETE FROM files WHERE collection = ? AND file_path = ?",
+            [
+                (collection_name, file_path)
+                for file_path, entry in changes.items() if entry is None
+            ],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO files (collection, file_path, file_name,"
+            " file_type, chunks, bytes, indexed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    collection_name, file_path, os.path.basename(file_path),
+                    entry.get("file_type"), len(entry.get("node_ids", [])),
+                    entry.get("size", 0), entry.get("indexed_at"),
+                )
+                for file_path, entry in changes.items() if entry is not None
+            ],
+        )
+        files, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM files"
+            " WHERE collection = ? AND chunks > 0",
+            (collection_name,),
+        ).fetchone()
+        conn.execute(
+            "UPDATE collections SET files = ?, chunks = ?, bytes = ?,"
+            " updated_at = ?, checkpoint = ? WHERE name = ?",
+            (
+                files, chunks, size, manifest.get("updated_at"),
+                (manifest.get("checkpoint") or {}).get("state"),
+                collection_name,
+            ),
+        )
+        conn.commit()
+
+
+_STATS_COLUMNS = (
+    "name", "source_folder", "files", "chunks", "bytes", "created_at",
+    "updated_at", "checkpoint",
+)
+
+
+def collection_stats(collection_name: str) -> dict | None:
+    """
+    Totals of one collection: files, chunks, bytes, source folder,
+    timestamps and the state of an unfinished indexing run ("checkpoint").
+    Manifests written before the catalog existed are added to it on first
+    use. None if the collection has no manifest.
+    """
+    with _catalog_lock:
+        row = _catalog().execute(
+            f"SELECT {', '.join(_STATS_COLUMNS)} FROM collections"
+            " WHERE name = ?",
+            (collection_name,),
+        ).fetchone()
+    if row is not None:
+        return dict(zip(_STATS_COLUMNS, row))
+    manifest = load_manifest(collection_name)
+    if manifest is None:
+        return None
+    _write_catalog(collection_name, manifest)
+    return collection_stats(collection_name)
+
+
+def all_collection_stats() -> dict:
+    """{collection name: stats} for every collection in the catalog."""
+    with _catalog_lock:
+        rows = _catalog().execute(
+            f"SELECT {', '.join(_STATS_COLUMNS)} FROM collections"
+        ).fetchall()
+    return {row[0]: dict(zip(_STATS_COLUMNS, row)) for row in rows}
+
+
+def list_files(collection_name: str) -> list | None:
+    """
+    The indexed files (those with chunks) of a collection, sorted by name,
+    or None if the collection has no manifest.
+    """
+    if collection_stats(collection_name) is None:
+        return None
+    with _catalog_lock:
+        rows = _catalog().execute(
+            "SELECT file_name, file_path, file_type, chunks, bytes, indexed_at"
+            " FROM files WHERE collection = ? AND chunks > 0"
+            " ORDER BY lower(file_name)",
+            (collection_name,),
+        ).fetchall()
+    return [
+        {
+            "file_name": file_name,
+            "file_path": file_path,
+            "file_type": file_type,
+            "chunks": chunks,
+            "bytes": size,
+            "indexed_at": indexed_at,
+        }
+        for file_name, file_path, file_type, chunks, size, indexed_at in rows
+    ]
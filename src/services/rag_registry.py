@@ -0,0 +1,102 @@
+"""
+Registry of loaded RAG indexes, keyed by collection name.
+
+Replaces the single process-wide "current index": any number of collections
+can be queried concurrently, each loaded lazily on first use and kept in a
+LRU bounded by the estimated memory of the loaded indexes (and, as a
+backstop, their number), so rarely used collections are dropped. The
+registry owns what it evicts: `on_evict(name, index)` is called for each
+evicted collection so its open files and caches can be released.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+# Estimated memory of the loaded indexes (see IndexRegistry's `sizer`).
+INDEX_CACHE_MB = int(os.environ.get("XCLOUD_RAG_INDEX_CACHE_MB", "1024"))
+# Loaded indexes kept in memory at once, whatever their size.
+MAX_LOADED = int(os.environ.get("XCLOUD_RAG_MAX_LOADED_COLLECTIONS", "32"))
+
+
+class IndexRegistry:
+    """
+    LRU of loaded indexes. `loader(name)` builds the index for a collection
+    and raises ValueError if it does not exist; `sizer(name, index)`
+    estimates the bytes it holds in memory, and `on_evict(name, index)`
+    releases an index dropped from the LRU. The most recently used index
+    is kept even if it alone exceeds max_bytes.
+    """
+
+    def __init__(self, loader, max_bytes: int = INDEX_CACHE_MB * 1024 * 1024,
+                 max_loaded: int = MAX_LOADED, sizer=None, on_evict=None):
+        self._loader = loader
+        self._sizer = sizer
+        self._on_evict = on_evict
+        self.max_bytes = max_bytes
+        self.max_loaded = max(1, max_loaded)
+        self._indexes = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, name: str):
+        """Return the index for `name`, loading it if needed."""
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is not None:
+                self._indexes.move_to_end(name)
+                return index
+        index = self._loader(name)
+        self.put(name, index)
+        self.loads += 1
+        return index
+
+    def put(self, name: str, index) -> None:
+        """Register (or replace) the index for `name`."""
+        size = self._sizer(name, index) if self._sizer else 0
+        evicted = []
+        with self._lock:
+            self._indexes[name] = index
+            self._indexes.move_to_end(name)
+            self._sizes[name] = size
+            while len(self._indexes) > 1 and (
+                len(self._indexes) > self.max_loaded
+                or sum(self._sizes.values()) > self.max_bytes
+            ):
+                old_name, old_index = self._indexes.popitem(last=False)
+                self._sizes.pop(old_name, None)
+                evicted.append((old_name, old_index))
+                self.evictions += 1
+        self._release(evicted)
+
+    def evict(self, name: str) -> None:
+        with self._lock:
+            index = self._indexes.pop(name, None)
+            self._sizes.pop(name, None)
+        if index is not None:
+            self._release([(name, index)])
+
+    def _release(self, evicted: list) -> None:
+        if self._on_evict is None:
+            return
+        for name, index in evicted:
+            self._on_evict(name, index)
+
+    def loaded(self) -> list:
+        """Loaded collection names, most recently used last."""
+        with self._lock:
+            return list(self._indexes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = sum(self._sizes.values())
+        return {
+            "loaded": self.loaded(),
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_loaded": self.max_loaded,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
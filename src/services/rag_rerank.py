@@ -0,0 +1,72 @@
+"""
+Maximal-marginal-relevance re-ranking of retrieved RAG chunks.
+
+Plain top-k retrieval often returns several near-identical chunks of the
+same file, which fill the prompt with repeated text. Retrieval can instead
+over-fetch OVERFETCH * k candidates and let mmr() pick k of them that are
+relevant to the query but not to each other. Relevance is the retriever's
+own score when it has one (the fused vector + BM25 score of hybrid
+search), so re-ranking keeps the lexical signal; embeddings are only used
+to measure how redundant candidates are with each other.
+"""
+
+import os
+
+import numpy as np
+
+# Candidates fetched per requested chunk before re-ranking.
+OVERFETCH = int(os.environ.get("XCLOUD_RAG_MMR_OVERFETCH", "4"))
+# 1.0 ranks by relevance only, 0.0 by diversity only.
+MMR_LAMBDA = float(os.environ.get("XCLOUD_RAG_MMR_LAMBDA", "0.7"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _rescale(scores: np.ndarray) -> np.ndarray:
+    """Min-max scale scores to [0, 1] (all 1.0 if they are equal)."""
+    low, high = float(scores.min()), float(scores.max())
+    if high - low <= 0:
+        return np.ones_like(scores)
+    return (scores - low) / (high - low)
+
+
+def mmr(query, candidates, k: int, lambda_mult: float = MMR_LAMBDA,
+        relevance=None) -> list:
+    """
+    Greedy MMR over candidate embeddings: repeatedly pick the candidate
+    maximizing lambda * relevance - (1 - lambda) * max sim(picked).
+    `relevance` holds the candidates' retrieval scores (e.g. fused RRF
+    scores), scaled to [0, 1] here; without it, it is their cosine
+    similarity to the query embedding. Returns the picked candidate
+    indices in pick order.
+    """
+    matrix = _normalize(np.asarray(candidates, dtype=np.float32))
+    n = len(matrix)
+    if n == 0 or k <= 0:
+        return []
+    if relevance is not None:
+        relevance = _rescale(np.asarray(relevance, dtype=np.float32))
+    else:
+        q = _normalize(np.asarray(query, dtype=np.float32))
+        relevance = matrix @ q
+    similarity = matrix @ matrix.T
+
+    picked = []
+    # Highest similarity of each candidate to anything picked so far.
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(min(k, n)):
+        if picked:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
@@ -3,88 +3,555 @@ from llama_index.core import SimpleDirectoryReader
 from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from chromadb import PersistentClient
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import closing
 from os import path
 
+from services import (
+    llm_service,
+    model_residency,
+    ollama_client,
+    rag_aliases,
+    rag_bm25,
+    rag_cache,
+    rag_dedup,
+    rag_embedding,
+    rag_extraction,
+    rag_flat,
+    rag_manifest,
+    rag_registry,
+    rag_rerank,
+)
+
 # Initialize embedding model (using your local Ollama)
 embed_model = OllamaEmbedding(
-    model_name="nomic-embed-text:latest",
-    base_url="http://localhost:11434",
+    model_name=ollama_client.EMBED_MODEL,
+    base_url=ollama_client.BASE_URL,
+    keep_alive=model_residency.EMBED_KEEP_ALIVE,
 )
 
 # Initialize ChromaDB client
 chroma_client = PersistentClient(path="./.chroma_db")
 
-current_index = None
+# Collection used when a request does not name one (set by /rag/load and by
+# the last completed index job).
 current_collection_name = None
 
 
+def _open_index(collection_name: str):
+    """
+    Open an existing physical collection for querying: its
+    rag_flat.FlatIndex for flat-backend collections, otherwise a
+    VectorStoreIndex over Chroma.
+    """
+    try:
+        chroma_collection = chroma_client.get_collection(name=collection_name)
+    except Exception as e:
+        raise ValueError(
+            f"Failed to load collection '{collection_name}': {str(e)}"
+        )
+    if rag_flat.exists(collection_name):
+        return rag_flat.open_index(collection_name)
+    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+    return VectorStoreIndex.from_vector_store(
+        vector_store=vector_store,
+        embed_model=embed_model,
+    )
+
+
+def _release_index(collection_name: str, index) -> None:
+    """
+    Free what an evicted physical collection holds open: the flat index's
+    row table and memory maps, and the BM25 index's connection. They are
+    reopened when the collection is queried or indexed again.
+    """
+    rag_flat.release_index(collection_name)
+    rag_bm25.release_index(collection_name)
+
+
+def _index_bytes(collection_name: str, index) -> int:
+    """
+    Estimated memory of a loaded physical collection, for the registry's
+    byte budget: its vectors (count x dim float32 for Chroma's HNSW, the
+    scanned matrix and row tables for a flat index) plus its BM25 postings.
+    """
+    size = rag_bm25.index_bytes(collection_name)
+    if isinstance(index, rag_flat.FlatIndex):
+        return size + index.memory_bytes()
+    try:
+        collection = chroma_client.get_collection(name=collection_name)
+        sample = collection.get(limit=1, include=["embeddings"])
+        embeddings = sample.get("embeddings")
+        if embeddings is None or not len(embeddings):
+            return size
+        return size + collection.count() * len(embeddings[0]) * 4
+    except Exception:
+        return size
+
+
+# Loaded indexes, keyed by physical collection (see rag_aliases).
+indexes = rag_registry.IndexRegistry(
+    _open_index, sizer=_index_bytes, on_evict=_release_index
+)
+
+# Seconds a replaced generation is kept after a swap, so queries that
+# resolved it just before the swap can finish.
+GC_GRACE_SECONDS = float(os.environ.get("XCLOUD_RAG_GC_GRACE_SECONDS", "30"))
 
 
 class IndexingCancelled(Exception):
     """Raised when an indexing job is cancelled mid-run."""
 
 
-def _extract_pdf_text(file_path: str) -> str:
-    """Extract text from a PDF using pypdf (page by page)."""
-    import pypdf
-
-    reader = pypdf.PdfReader(file_path)
-    parts = []
-    for page in reader.pages:
-        try:
-            parts.append(page.extract_text() or "")
-        except Exception:
-            continue
-    return "\n".join(parts).strip()
+SUPPORTED_EXTENSIONS = {".txt", ".md", ".pdf"}
 
 
-def _read_documents(folder_path: str, check=None):
+def iter_source_files(folder_path: str, check=None):
     """
-    Yield llama-index Document objects from a folder, extracting real text:
-      - .txt / .md  -> read as UTF-8
-      - .pdf        -> pypdf text extraction (NOT raw bytes)
-
-    Files that yield no extractable text (e.g. scanned/image-only PDFs) are
-    skipped. Each yielded Document carries file_name/file_path/file_type
-    metadata so the UI can list source files.
+    Yield the path of every supported file under folder_path, in order,
+    calling `check` (if given) before each one.
     """
     import os
-    from llama_index.core import Document
-
-    supported = {".txt", ".md", ".pdf"}
 
     for root, _dirs, files in os.walk(folder_path):
         for name in sorted(files):
             if check:
                 check()
             ext = os.path.splitext(name)[1].lower()
-            if ext not in supported:
+            if ext not in SUPPORTED_EXTENSIONS:
                 continue
+            yield os.path.join(root, name)
 
-            full = os.path.join(root, name)
-            try:
-                if ext == ".pdf":
-                    text = _extract_pdf_text(full)
-                    file_type = "application/pdf"
-                else:
-                    with open(full, "r", encoding="utf-8",
-                              errors="ignore") as f:
-                        text = f.read().strip()
-                    file_type = "text/markdown" if ext == ".md" else "text/plain"
-            except Exception:
-                continue
 
-            if not text:
-                # No extractable text (e.g. image-only PDF) — skip.
-                continue
+def _make_document(full: str, extracted):
+    """
+    Wrap extract_text output for one file in a llama-index Document, or
+    return None if the file had no extractable text.
+    """
+    import os
+    from llama_index.core import Document
+
+    if extracted is None:
+        # No extractable text (e.g. image-only PDF) — skip.
+        return None
+    text, file_type = extracted
+    return Document(
+        text=text,
+        metadata={
+            "file_name": os.path.basename(full),
+            "file_path": full,
+            "file_type": file_type,
+        },
+    )
+
+
+def _physical_exists(physical: str) -> bool:
+    return physical in {c.name for c in chroma_client.list_collections()}
+
+
+def _collection_exists(collection_name: str) -> bool:
+    return _physical_exists(rag_aliases.resolve(collection_name))
+
+
+def _backend_of(physical: str) -> str:
+    return "flat" if rag_flat.exists(physical) else "chroma"
+
+
+def get_backend(collection_name: str) -> str:
+    """The vector backend a collection was built with ("chroma" or "flat")."""
+    return _backend_of(rag_aliases.resolve(collection_name))
+
+
+def get_manifest(collection_name: str) -> dict | None:
+    """The file manifest of a collection's live generation."""
+    return rag_manifest.load_manifest(rag_aliases.resolve(collection_name))
+
+
+def _drop_physical(physical: str) -> None:
+    """Delete a physical collection and all of its sidecars."""
+    try:
+        chroma_client.delete_collection(name=physical)
+    except Exception:
+        pass
+    rag_manifest.delete_manifest(physical)
+    rag_bm25.drop_index(physical)
+    rag_flat.drop_index(physical)
+    rag_cache.invalidate_collection(physical)
+    indexes.evict(physical)
+
+
+# Replaced generations waiting out GC_GRACE_SECONDS.
+_retiring = set()
+
+
+def _drop_retired(physical: str) -> None:
+    try:
+        _drop_physical(physical)
+    finally:
+        _retiring.discard(physical)
+
+
+def _retire_generation(physical: str) -> None:
+    """Garbage-collect a replaced generation after GC_GRACE_SECONDS."""
+    if GC_GRACE_SECONDS <= 0:
+        _drop_physical(physical)
+        return
+    _retiring.add(physical)
+    timer = threading.Timer(GC_GRACE_SECONDS, _drop_retired, (physical,))
+    timer.daemon = True
+    timer.start()
+
+
+def _swap_generation(collection_name: str, physical: str, index) -> None:
+    """
+    Make a finished shadow generation live. Its index is registered first,
+    so the first query after the swap does not pay for loading it.
+    """
+    indexes.put(physical, index)
+    previous = rag_aliases.swap(collection_name, physical)
+    if previous != physical:
+        _retire_generation(previous)
+
+
+def collect_garbage() -> list:
+    """
+    Drop physical collections left behind by a restart: generations that
+    are neither live nor a shadow, and pre-alias collections that were
+    since rebuilt under an alias. Returns their names.
+
+    Safe while jobs run: a job registers its shadow generation before
+    creating it, so reading the aliases after listing the collections
+    keeps every generation that is listed and in use.
+    """
+    listed = chroma_client.list_collections()
+    aliases = rag_aliases.aliases()
+    keep = set(aliases.values()) | set(rag_aliases.shadows().values())
+    keep |= _retiring
+    dropped = []
+    for col in listed:
+        if col.name in keep:
+            continue
+        if rag_aliases.generation_of(col.name) or col.name in aliases:
+            _drop_physical(col.name)
+            dropped.append(col.name)
+    return dropped
 
-            yield Document(
-                text=text,
-                metadata={
-                    "file_name": name,
-                    "file_path": full,
-                    "file_type": file_type,
-                },
+
+def _vector_store(chroma_collection):
+    """The store PipelinedEmbedder writes a collection's nodes to."""
+    if rag_flat.exists(chroma_collection.name):
+        return rag_flat.FlatVectorStore(
+            chroma_collection, rag_flat.open_index(chroma_collection.name)
+        )
+    return ChromaVectorStore(chroma_collection=chroma_collection)
+
+
+def _delete_node_ids(chroma_collection, ids: list) -> None:
+    """
+    Delete vectors (and their BM25 postings and flat-index rows) by node id,
+    in chunks to stay under SQLite limits.
+    """
+    CHUNK = 500
+    for start in range(0, len(ids), CHUNK):
+        chroma_collection.delete(ids=ids[start:start + CHUNK])
+    rag_bm25.open_index(chroma_collection.name).delete(ids)
+    if rag_flat.exists(chroma_collection.name):
+        rag_flat.open_index(chroma_collection.name).delete(ids)
+
+
+def _backfill_bm25(chroma_collection, check) -> None:
+    """Build a missing BM25 index from the chunks already in Chroma."""
+    lexical = rag_bm25.open_index(chroma_collection.name)
+    PAGE = 1000
+    offset = 0
+    while True:
+        check()
+        page = chroma_collection.get(
+            include=["documents", "metadatas"], limit=PAGE, offset=offset
+        )
+        ids = page.get("ids") or []
+        if not ids:
+            return
+        lexical.add(
+            (node_id, f"{(md or {}).get('file_name', '')}\n{doc or ''}")
+            for node_id, doc, md in zip(
+                ids, page.get("documents") or [], page.get("metadatas") or []
+            )
+        )
+        offset += len(ids)
+
+
+def _embed_and_store(vector_store, nodes, check, on_progress=None,
+                     on_batch=None, on_stats=None, lexical=None):
+    """
+    Embed nodes and write them to the vector store through the pipelined
+    embedder (several Ollama requests in flight, Chroma upserts on a writer
+    thread, adaptive batch size, on-disk embedding cache), cancel-checking
+    between batches so the job still stops quickly. Each committed batch is
+    also added to the `lexical` BM25 index, then passed to on_batch(batch).
+    Returns (nodes_done, embedding stats).
+    """
+    embedder = rag_embedding.PipelinedEmbedder(
+        embed_model, vector_store, cache=rag_embedding.get_embedding_cache()
+    )
+
+    def committed(batch):
+        if lexical is not None:
+            lexical.add((n.node_id, rag_bm25.node_text(n)) for n in batch)
+        if on_batch:
+            on_batch(batch)
+
+    def progress(done, total):
+        if on_progress:
+            on_progress(done, total)
+        if on_stats:
+            on_stats(embedder.stats())
+
+    nodes_done = embedder.run(
+        nodes, check, on_progress=progress, on_batch=committed
+    )
+    return nodes_done, embedder.stats()
+
+
+class _StreamProgress:
+    """
+    Progress for streaming runs, where the node total is not known up front:
+    reports (bytes, total bytes) of source files whose nodes have all been
+    stored, against the pre-scanned size of the files to index.
+    """
+
+    def __init__(self, on_progress, total_bytes: int):
+        self._on_progress = on_progress
+        self._remaining = {}  # file_path -> [nodes left, size]
+        self._lock = threading.Lock()
+        self.total_bytes = total_bytes
+        self.bytes_done = 0
+        self._report()
+
+    def _report(self):
+        if self._on_progress:
+            self._on_progress(self.bytes_done, self.total_bytes)
+
+    def expect(self, file_path: str, n_nodes: int, size: int):
+        """Register a split file before its nodes are handed on."""
+        with self._lock:
+            if n_nodes:
+                self._remaining[file_path] = [n_nodes, size]
+                return
+            self.bytes_done += size
+            self._report()
+
+    def committed(self, batch):
+        with self._lock:
+            for node in batch:
+                file_path = node.metadata.get("file_path")
+                item = self._remaining.get(file_path)
+                if item is None:
+                    continue
+                item[0] -= 1
+                if item[0] == 0:
+                    self.bytes_done += item[1]
+                    del self._remaining[file_path]
+            self._report()
+
+
+# Minimum seconds between checkpoint saves of a running job's manifest;
+# 0 saves after every committed batch (each save appends the files committed
+# since the last one to the manifest's journal).
+CHECKPOINT_SECONDS = float(
+    os.environ.get("XCLOUD_RAG_CHECKPOINT_SECONDS", "1")
+)
+
+
+class _Checkpoint:
+    """
+    Keeps a running job resumable. The manifest carries a "checkpoint"
+    marker (folder, options, state) while the job is unfinished. It is
+    saved in full with the files committed so far — `files()` — when the
+    job starts, pauses, fails or finishes; in between, the records reported
+    through `changed()` are appended to its journal at most every
+    CHECKPOINT_SECONDS from the writer thread, so a checkpoint costs the
+    files committed since the last one, not the whole corpus. Mutations of
+    the job's file records happen under `lock`.
+    """
+
+    def __init__(self, collection_name: str, manifest: dict, files):
+        self.collection_name = collection_name
+        self.manifest = manifest
+        self.lock = threading.RLock()
+        self._files = files
+        self._last_save = 0.0
+        self._changes = {}  # file_path -> record committed since last save
+        self._saved = {}  # file_path -> node ids, as saved
+        self._refs = Counter()  # node_id -> saved records referring to it
+
+    def changed(self, file_path: str, entry: dict) -> None:
+        """Record a committed file record (caller holds `lock`)."""
+        self._changes[file_path] = entry
+
+    def _forget(self, file_path: str) -> None:
+        for node_id in self._saved.pop(file_path, ()):
+            self._refs[node_id] -= 1
+            if not self._refs[node_id]:
+                del self._refs[node_id]
+
+    def _remember(self, file_path: str, entry: dict) -> None:
+        self._saved[file_path] = entry["node_ids"]
+        self._refs.update(entry["node_ids"])
+
+    def start(self, folder_path: str, mode: str, backend: str,
+              streaming: bool, paths=None) -> None:
+        self.manifest["checkpoint"] = {
+            "folder_path": folder_path,
+            "mode": mode,
+            "backend": backend,
+            "streaming": streaming,
+            "paths": sorted(paths) if paths is not None else None,
+            "state": "running",
+            "started_at": time.time(),
+        }
+        self.save()
+
+    def save(self, state: str | None = None) -> None:
+        with self.lock:
+            marker = self.manifest.get("checkpoint")
+            if state and marker is not None:
+                marker["state"] = state
+            files = self._files()
+            self.manifest["files"] = files
+            rag_manifest.save_manifest(self.collection_name, self.manifest)
+            self._changes = {}
+            self._saved, self._refs = {}, Counter()
+            for file_path, entry in files.items():
+                self._remember(file_path, entry)
+            self._last_save = time.monotonic()
+
+    def maybe_save(self) -> None:
+        if time.monotonic() - self._last_save < CHECKPOINT_SECONDS:
+            return
+        with self.lock:
+            if not self._changes:
+                return
+            changes, self._changes = self._changes, {}
+            for file_path, entry in changes.items():
+                self._forget(file_path)
+                self._remember(file_path, entry)
+            rag_manifest.append_journal(
+                self.collection_name, self.manifest, changes, len(self._refs)
+            )
+            self._last_save = time.monotonic()
+
+    def finish(self) -> None:
+        """Save the final manifest; the job is no longer resumable."""
+        with self.lock:
+            self.manifest.pop("checkpoint", None)
+            self.save()
+
+
+class _FileCommits:
+    """
+    Tracks which files of a run have all of their nodes stored. With chunk
+    dedup a file's record also lists nodes stored for another file of the
+    run, so completion is counted per node id rather than per file.
+    """
+
+    def __init__(self):
+        self.stored = set()  # node ids stored by this run
+        self._waiting = {}  # node_id -> [file_path waiting for it]
+        self._pending = {}  # file_path -> [record, node ids left]
+
+    def expect(self, file_path: str, entry: dict) -> bool:
+        """
+        Register a file's record before its nodes are handed on; True if
+        they are all stored already (none, or only duplicates).
+        """
+        missing = [i for i in entry["node_ids"] if i not in self.stored]
+        if not missing:
+            return True
+        self._pending[file_path] = [entry, len(missing)]
+        for node_id in missing:
+            self._waiting.setdefault(node_id, []).append(file_path)
+        return False
+
+    def stored_batch(self, batch) -> list:
+        """(file_path, record) of the files a stored batch completed."""
+        done = []
+        for node in batch:
+            self.stored.add(node.node_id)
+            for file_path in self._waiting.pop(node.node_id, ()):
+                item = self._pending[file_path]
+                item[1] -= 1
+                if item[1] == 0:
+                    done.append((file_path, self._pending.pop(file_path)[0]))
+        return done
+
+    def unreferenced(self, files: dict) -> list:
+        """
+        Node ids stored by this run that no record in `files` refers to:
+        the nodes of files that were only partly stored.
+        """
+        referenced = {
+            node_id for entry in files.values() for node_id in entry["node_ids"]
+        }
+        return sorted(self.stored - referenced)
+
+
+def _dedup_nodes(nodes: list, deduper, shared: set):
+    """
+    (nodes to embed, node ids of the file's record) for one file's nodes.
+    A chunk the deduper has seen before is not embedded again: the record
+    refers to the earlier chunk instead, which is added to `shared`.
+    """
+    if deduper is None:
+        return nodes, [n.node_id for n in nodes]
+    unique, node_ids = [], []
+    for node in nodes:
+        earlier = deduper.canonical(node.node_id, node.get_content())
+        if earlier is None:
+            unique.append(node)
+            node_ids.append(node.node_id)
+        else:
+            shared.add(earlier)
+            node_ids.append(earlier)
+    return unique, list(dict.fromkeys(node_ids))
+
+
+def _sync_sources(chroma_collection, files: dict, node_ids) -> None:
+    """
+    Rewrite the source list (see rag_dedup.set_sources) of stored nodes
+    from the records in `files` that refer to them, so a deduplicated chunk
+    cites every file it stands for and moves to another of them when its
+    own file is gone.
+    """
+    referrers = {node_id: [] for node_id in node_ids}
+    if not referrers:
+        return
+    for file_path, entry in files.items():
+        for node_id in entry["node_ids"]:
+            if node_id in referrers:
+                referrers[node_id].append(file_path)
+    ids = [node_id for node_id, paths in referrers.items() if paths]
+    CHUNK = 500
+    for start in range(0, len(ids), CHUNK):
+        page = chroma_collection.get(
+            ids=ids[start:start + CHUNK], include=["metadatas"]
+        )
+        update_ids, update_metadatas = [], []
+        for node_id, meta in zip(page["ids"], page["metadatas"]):
+            meta = meta or {}
+            wanted = referrers[node_id]
+            current = rag_dedup.source_paths(meta)
+            sources = [p for p in current if p in wanted]
+            sources += [p for p in wanted if p not in sources]
+            if sources != current:
+                update_ids.append(node_id)
+                update_metadatas.append(rag_dedup.set_sources(meta, sources))
+        if update_ids:
+            chroma_collection.update(
+                ids=update_ids, metadatas=update_metadatas
             )
 
 
@@ -94,6 +561,13 @@ def create_index_from_folder_cancellable(
     is_cancelled=None,
     on_progress=None,
     on_phase=None,
+    incremental: bool = False,
+    on_stats=None,
+    extract_workers: int | None = None,
+    streaming: bool = False,
+    paths: list | None = None,
+    backend: str | None = None,
+    is_aborted=None,
 ):
     """
     Cancellable variant of create_index_from_folder.
@@ -101,15 +575,60 @@ def create_index_from_folder_cancellable(
     Parses and embeds documents one at a time, checking `is_cancelled()`
     frequently (before reading, before parsing each file, and before each
     node embedding) so a running job can be stopped quickly at any phase.
-    On cancel, the partially-built collection is deleted and
-    IndexingCancelled is raised.
+
+    Chunks that repeat (or nearly repeat, see rag_dedup) an earlier chunk
+    of the run are not embedded: the file's record refers to the earlier
+    chunk, whose metadata lists every file it stands for. The result
+    reports the dedup counts and ratio.
+
+    Work is checkpointed: files are recorded in the manifest as soon as all
+    of their nodes are stored, and the manifest is saved periodically with
+    a "checkpoint" marker until the run finishes. A cancel *pauses*: the
+    nodes of partly stored files are rolled back, the checkpoint is saved
+    and IndexingCancelled is raised; resume_index_cancellable continues
+    from there (as does a restart after a crash or failure). If
+    `is_aborted()` is true when cancelling, the run is rolled back instead:
+    a full build deletes its partial generation, an incremental one keeps
+    the files finished so far and drops its checkpoint.
+
+    A full build never touches the live collection: it is written to a new
+    generation (see rag_aliases) that replaces the live one in a single
+    swap once it is complete, so queries are served from the previous
+    generation throughout. The replaced generation is deleted after
+    GC_GRACE_SECONDS.
+
+    With incremental=True and an existing collection + manifest, only added
+    or changed files are re-embedded and removed files' vectors are deleted
+    (see _update_index_incremental); otherwise the collection is rebuilt.
+    Either way the per-file manifest is (re)written for the next run.
+    Incremental runs can be limited to `paths` (e.g. files a watcher saw
+    change) instead of re-scanning the whole folder.
+
+    By default every node is split before embedding starts, so progress is
+    exact. With streaming=True, splitting feeds the embedder through a
+    bounded pipeline instead: memory stays flat on multi-GB folders and
+    embedding starts with the first file, and progress is reported in bytes
+    of source files fully stored against a cheap pre-scan of file sizes.
 
     Args:
         is_cancelled: callable -> bool, polled often.
-        on_progress: callable(done: int, total: int) for embedded nodes.
-        on_phase: callable(phase: str) — "reading" | "embedding".
+        on_progress: callable(done: int, total: int) for embedded nodes (or
+            source bytes when streaming).
+        on_phase: callable(phase: str) — "reading" | "embedding" |
+            "streaming".
+        incremental: only re-embed what changed since the last index.
+        on_stats: callable(stats: dict) with file counts as they are known.
+        extract_workers: processes for PDF text extraction; defaults to
+            rag_extraction.EXTRACT_WORKERS.
+        streaming: split and embed as one bounded pipeline.
+        paths: with incremental, only consider these files (created,
+            modified or deleted); the rest of the manifest is kept as is.
+        backend: "chroma" (HNSW) or "flat" (rag_flat); defaults to the
+            collection's current backend. Switching forces a full rebuild.
+        is_aborted: callable -> bool; on cancel, roll back instead of
+            pausing.
     """
-    global current_index, current_collection_name
+    global current_collection_name
 
     from llama_index.core.node_parser import SentenceSplitter
 
@@ -120,121 +639,810 @@ def create_index_from_folder_cancellable(
         if cancelled():
             raise IndexingCancelled()
 
+    def aborted() -> bool:
+        return bool(is_aborted and is_aborted())
+
     if not path.exists(folder_path):
         raise ValueError(f"Folder path does not exist: {folder_path}")
+    current_backend = get_backend(collection_name)
+    backend = backend or current_backend
+    if backend not in rag_flat.BACKENDS:
+        raise ValueError(f"Unknown vector backend: {backend}")
+
+    if (incremental and backend == current_backend
+            and _collection_exists(collection_name)):
+        manifest = get_manifest(collection_name)
+        if manifest is not None:
+            return _update_index_incremental(
+                folder_path, collection_name, manifest, check,
+                on_progress, on_phase, on_stats, extract_workers, streaming,
+                paths, aborted,
+            )
 
     check()
     if on_phase:
         on_phase("reading")
 
     splitter = SentenceSplitter()
-
-    # Phase 1 — read each supported file with a proper extractor (pypdf for
-    # PDFs, UTF-8 for text), one at a time so cancellation can interrupt a
-    # huge folder, then split into nodes to know the real total up front.
-    all_nodes = []
+    manifest = rag_manifest.new_manifest(collection_name, folder_path)
+    files = list(iter_source_files(folder_path, check))
+    committed = {}  # file_path -> manifest record, all nodes stored
+    commits = _FileCommits()
+    deduper = rag_dedup.ChunkDeduper() if rag_dedup.ENABLED else None
+    shared = set()  # stored node ids duplicates were folded into
+    # The rebuild is written to a new generation while the live one keeps
+    # serving queries; an unfinished earlier rebuild is superseded.
+    stale = rag_aliases.shadow(collection_name)
+    if stale:
+        _drop_physical(stale)
+    physical = rag_aliases.new_generation(collection_name)
+    checkpoint = _Checkpoint(physical, manifest, lambda: dict(committed))
     docs_indexed = 0
-    for doc in _read_documents(folder_path, check):
-        check()
-        all_nodes.extend(splitter.get_nodes_from_documents([doc]))
-        docs_indexed += 1
+    progress = None
+
+    def split_files():
+        # Read each supported file with a proper extractor (pypdf for PDFs
+        # in a process pool, UTF-8 for text), streamed back in order and
+        # cancel-checked so a huge folder can be interrupted, then split.
+        nonlocal docs_indexed
+        with closing(rag_extraction.iter_extracted(
+            files, check, extract_workers
+        )) as extracted:
+            for full, result in extracted:
+                check()
+                doc = _make_document(full, result)
+                nodes = splitter.get_nodes_from_documents([doc]) if doc else []
+                nodes, node_ids = _dedup_nodes(nodes, deduper, shared)
+                entry = rag_manifest.file_entry(
+                    full, node_ids,
+                    file_type=doc.metadata["file_type"] if doc else None,
+                )
+                if doc is not None:
+                    docs_indexed += 1
+                if progress is not None:
+                    progress.expect(full, len(nodes), entry["size"])
+                with checkpoint.lock:
+                    if commits.expect(full, entry):
+                        committed[full] = entry
+                        checkpoint.changed(full, entry)
+                yield from nodes
+
+    no_text = ValueError(
+        f"No readable text found in {folder_path}. "
+        "Supported: .txt, .md, and text-based .pdf files."
+    )
+    stats = {
+        "files_added": len(files),
+        "files_changed": 0,
+        "files_removed": 0,
+        "files_unchanged": 0,
+    }
 
-    if docs_indexed == 0:
-        raise ValueError(
-            f"No readable text found in {folder_path}. "
-            "Supported: .txt, .md, and text-based .pdf files."
+    if streaming:
+        # Phase 1 — only a cheap pre-scan; nodes are produced lazily.
+        if not files:
+            raise no_text
+        total_bytes = sum(rag_manifest.file_stat(f)[0] for f in files)
+        stats.update({"bytes_total": total_bytes, "progress_unit": "bytes"})
+        all_nodes = split_files()
+    else:
+        # Phase 1 — split everything to know the real node total up front.
+        all_nodes = list(split_files())
+        if docs_indexed == 0:
+            raise no_text
+        if on_progress:
+            on_progress(0, len(all_nodes))
+    if on_stats:
+        on_stats(stats)
+
+    # Build the (empty) index/collection of the new generation.
+    _drop_physical(physical)
+    chroma_collection = chroma_client.create_collection(name=physical)
+    if backend == "flat":
+        index = rag_flat.open_index(physical)
+        vector_store = rag_flat.FlatVectorStore(chroma_collection, index)
+    else:
+        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        storage_context = StorageContext.from_defaults(
+            vector_store=vector_store
         )
+        index = VectorStoreIndex(
+            nodes=[],
+            storage_context=storage_context,
+            embed_model=embed_model,
+        )
+    checkpoint.start(folder_path, "full", backend, streaming)
 
-    total = len(all_nodes)
-    if on_progress:
-        on_progress(0, total)
-
-    # Build the (empty) index/collection.
+    if on_phase:
+        on_phase("streaming" if streaming else "embedding")
+    if streaming:
+        progress = _StreamProgress(on_progress, total_bytes)
+
+    def on_batch(batch):
+        with checkpoint.lock:
+            for file_path, entry in commits.stored_batch(batch):
+                committed[file_path] = entry
+                checkpoint.changed(file_path, entry)
+        if progress is not None:
+            progress.committed(batch)
+        checkpoint.maybe_save()
+
+    def drop_partial():
+        _drop_physical(physical)
+        rag_aliases.clear_shadow(collection_name)
+
+    # Phase 2 — embed in pipelined, adaptively sized batches.
     try:
-        chroma_client.delete_collection(name=collection_name)
+        nodes_done, embed_stats = _embed_and_store(
+            vector_store, all_nodes, check,
+            None if streaming else on_progress, on_batch,
+            on_stats, lexical=rag_bm25.open_index(physical),
+        )
+        if docs_indexed == 0:
+            raise no_text
+    except IndexingCancelled:
+        if aborted():
+            drop_partial()
+        else:
+            _delete_node_ids(chroma_collection, commits.unreferenced(committed))
+            _sync_sources(chroma_collection, committed, shared)
+            checkpoint.save("paused")
+        raise
+    except ValueError:
+        drop_partial()
+        raise
     except Exception:
-        pass
+        # e.g. Ollama went away: keep what is stored so it can be resumed.
+        _delete_node_ids(chroma_collection, commits.unreferenced(committed))
+        _sync_sources(chroma_collection, committed, shared)
+        checkpoint.save("failed")
+        raise
 
-    chroma_collection = chroma_client.create_collection(name=collection_name)
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    index = VectorStoreIndex(
-        nodes=[],
-        storage_context=storage_context,
-        embed_model=embed_model,
-    )
+    _sync_sources(chroma_collection, committed, shared)
+    checkpoint.finish()
 
+    _swap_generation(collection_name, physical, index)
+    current_collection_name = collection_name
+
+    return {
+        "status": "success",
+        "mode": "full",
+        "streaming": streaming,
+        "backend": backend,
+        "documents_indexed": docs_indexed,
+        "nodes_indexed": nodes_done,
+        "collection": collection_name,
+        **stats,
+        **(deduper.stats() if deduper else {}),
+        **embed_stats,
+    }
+
+
+def _update_index_incremental(
+    folder_path: str,
+    collection_name: str,
+    manifest: dict,
+    check,
+    on_progress=None,
+    on_phase=None,
+    on_stats=None,
+    extract_workers: int | None = None,
+    streaming: bool = False,
+    paths: list | None = None,
+    aborted=None,
+    target: str | None = None,
+):
+    """
+    Bring an existing collection in line with folder_path using its manifest.
+
+    A file whose size and mtime match the manifest is left alone without
+    being read; otherwise its content hash decides whether it really changed.
+    Removed files have their vectors deleted up front. A changed file's old
+    vectors are only deleted once all of its new nodes are stored, so a
+    cancel leaves every file either fully old or fully new: nodes of files
+    that were only partly inserted are rolled back, everything finished so
+    far is kept and recorded in the manifest before IndexingCancelled is
+    raised, along with a checkpoint to resume from unless `aborted()`.
+    `streaming` works as in create_index_from_folder_cancellable.
+
+    With `paths`, only those files are diffed (a missing one counts as
+    removed) and every other manifest record is carried over untouched.
+
+    New chunks are deduplicated among themselves as in a full build. A
+    stored chunk is only deleted once no record refers to it any more.
+
+    Updates the live generation in place, or the physical collection
+    `target` (a shadow generation when resuming a rebuild).
+    """
+    global current_collection_name
+
+    from llama_index.core.node_parser import SentenceSplitter
+
+    check()
     if on_phase:
-        on_phase("embedding")
+        on_phase("reading")
+
+    physical = target or rag_aliases.resolve(collection_name)
+    chroma_collection = chroma_client.get_collection(name=physical)
+    vector_store = _vector_store(chroma_collection)
+    index = _open_index(physical)
+
+    splitter = SentenceSplitter()
+    old_files = manifest.get("files", {})
+    if paths is None:
+        candidates = iter_source_files(folder_path, check)
+        new_files = {}
+    else:
+        paths = set(paths)
+        candidates = sorted(
+            p for p in paths
+            if path.isfile(p)
+            and path.splitext(p)[1].lower() in SUPPORTED_EXTENSIONS
+        )
+        new_files = {p: e for p, e in old_files.items() if p not in paths}
+    stats = {
+        "files_added": 0,
+        "files_changed": 0,
+        "files_removed": 0,
+        "files_unchanged": 0,
+    }
+
+    # Phase 1 — diff the folder against the manifest, then extract and split
+    # only the files that need (re-)embedding.
+    to_read = {}  # file_path -> (sha256, (size, mtime))
+    for full in candidates:
+        check()
+        old = old_files.get(full)
+        stat = rag_manifest.file_stat(full)
+        if old and (old["size"], old["mtime"]) == stat:
+            new_files[full] = old
+            stats["files_unchanged"] += 1
+            continue
+
+        file_hash = rag_manifest.hash_file(full)
+        if old and old["sha256"] == file_hash:
+            new_files[full] = {**old, "size": stat[0], "mtime": stat[1]}
+            stats["files_unchanged"] += 1
+            continue
 
-    # Phase 2 — embed in batches (faster than one-by-one), cancel-checking
-    # between batches so the job still stops quickly.
-    BATCH = 16
-    nodes_done = 0
+        stats["files_changed" if old else "files_added"] += 1
+        to_read[full] = (file_hash, stat)
+
+    # Records referring to each stored node (more than one for a chunk
+    # deduplicated across files).
+    refs = Counter(
+        node_id for entry in old_files.values() for node_id in entry["node_ids"]
+    )
+    touched = set()  # shared nodes that lost a referring record
+
+    def release(entry):
+        gone = []
+        for node_id in entry["node_ids"]:
+            refs[node_id] -= 1
+            if refs[node_id] > 0:
+                touched.add(node_id)
+            else:
+                del refs[node_id]
+                gone.append(node_id)
+        _delete_node_ids(chroma_collection, gone)
+
+    def commit(file_path, entry):
+        # Swap the file's record, dropping the nodes only it referred to.
+        old = old_files.get(file_path)
+        if old:
+            release(old)
+        refs.update(entry["node_ids"])
+        new_files[file_path] = entry
+        checkpoint.changed(file_path, entry)
+
+    removed = [p for p in old_files if p not in new_files and p not in to_read]
+    for p in removed:
+        release(old_files[p])
+    stats["files_removed"] = len(removed)
+
+    commits = _FileCommits()
+    deduper = rag_dedup.ChunkDeduper() if rag_dedup.ENABLED else None
+    shared = set()  # stored node ids duplicates were folded into
+    docs_indexed = 0
+    progress = None
+
+    def snapshot():
+        # Files not (fully) re-embedded yet keep their previous record.
+        files = dict(new_files)
+        for file_path in to_read:
+            if file_path not in files and file_path in old_files:
+                files[file_path] = old_files[file_path]
+        return files
+
+    checkpoint = _Checkpoint(physical, manifest, snapshot)
+    if paths is None:
+        manifest["source_folder"] = path.abspath(folder_path)
+    if to_read:
+        checkpoint.start(
+            folder_path, "incremental", _backend_of(physical),
+            streaming, paths,
+        )
+
+    def split_changed():
+        nonlocal docs_indexed
+        with closing(rag_extraction.iter_extracted(
+            list(to_read), check, extract_workers
+        )) as extracted:
+            for full, result in extracted:
+                check()
+                file_hash, stat = to_read[full]
+                doc = _make_document(full, result)
+                nodes = splitter.get_nodes_from_documents([doc]) if doc else []
+                nodes, node_ids = _dedup_nodes(nodes, deduper, shared)
+                entry = rag_manifest.file_entry(
+                    full, node_ids, file_hash=file_hash, stat=stat,
+                    file_type=doc.metadata["file_type"] if doc else None,
+                )
+                if doc is not None:
+                    docs_indexed += 1
+                if progress is not None:
+                    progress.expect(full, len(nodes), stat[0])
+                with checkpoint.lock:
+                    if commits.expect(full, entry):
+                        # Nothing (new) to embed: swap the record now.
+                        commit(full, entry)
+                yield from nodes
+
+    if streaming:
+        total_bytes = sum(stat[0] for _hash, stat in to_read.values())
+        stats.update({"bytes_total": total_bytes, "progress_unit": "bytes"})
+        pending_nodes = split_changed()
+    else:
+        pending_nodes = list(split_changed())
+        if on_progress:
+            on_progress(0, len(pending_nodes))
+    if on_stats:
+        on_stats(stats)
+
+    if on_phase:
+        on_phase("streaming" if streaming else "embedding")
+    if streaming:
+        progress = _StreamProgress(on_progress, total_bytes)
+
+    def on_batch(batch):
+        with checkpoint.lock:
+            for file_path, entry in commits.stored_batch(batch):
+                commit(file_path, entry)
+        if progress is not None:
+            progress.committed(batch)
+        checkpoint.maybe_save()
+
+    # Collections indexed before BM25 existed get their lexical index now.
+    if not rag_bm25.exists(physical):
+        _backfill_bm25(chroma_collection, check)
+
+    # Phase 2 — embed the pending nodes, committing files as they complete.
     try:
-        for start in range(0, total, BATCH):
-            check()
-            batch = all_nodes[start:start + BATCH]
-            index.insert_nodes(batch)  # embeds + writes to Chroma
-            nodes_done += len(batch)
-            if on_progress:
-                on_progress(nodes_done, total)
+        nodes_done, embed_stats = _embed_and_store(
+            vector_store, pending_nodes, check,
+            None if streaming else on_progress, on_batch,
+            on_stats, lexical=rag_bm25.open_index(physical),
+        )
     except IndexingCancelled:
-        try:
-            chroma_client.delete_collection(name=collection_name)
-        except Exception:
-            pass
+        files = snapshot()
+        _delete_node_ids(chroma_collection, commits.unreferenced(files))
+        _sync_sources(chroma_collection, files, shared | touched)
+        if aborted and aborted():
+            checkpoint.finish()
+        else:
+            checkpoint.save("paused")
+        raise
+    except Exception:
+        files = snapshot()
+        _delete_node_ids(chroma_collection, commits.unreferenced(files))
+        _sync_sources(chroma_collection, files, shared | touched)
+        checkpoint.save("failed")
         raise
+    finally:
+        rag_cache.invalidate_collection(physical)
+
+    _sync_sources(chroma_collection, new_files, shared | touched)
+    checkpoint.finish()
 
-    current_index = index
+    indexes.put(physical, index)
     current_collection_name = collection_name
 
     return {
         "status": "success",
+        "mode": "incremental",
+        "streaming": streaming,
+        "backend": _backend_of(physical),
         "documents_indexed": docs_indexed,
         "nodes_indexed": nodes_done,
         "collection": collection_name,
+        **stats,
+        **(deduper.stats() if deduper else {}),
+        **embed_stats,
     }
 
 
-def load_existing_index(collection_name: str = "default"):
+def _checkpointed(collection_name: str):
     """
-    Load an existing index from ChromaDB.
+    (physical collection, manifest) of the collection's unfinished run — a
+    rebuild's shadow generation first, else the live generation — or None.
     """
-    global current_index, current_collection_name
+    for physical in (rag_aliases.shadow(collection_name),
+                     rag_aliases.resolve(collection_name)):
+        manifest = rag_manifest.load_manifest(physical) if physical else None
+        if manifest and manifest.get("checkpoint"):
+            return physical, manifest
+    return None
+
+
+def get_checkpoint(collection_name: str) -> dict | None:
+    """The checkpoint of an unfinished indexing run, if any."""
+    found = _checkpointed(collection_name)
+    return found[1]["checkpoint"] if found else None
 
+
+def _drop_orphans(chroma_collection, manifest: dict) -> int:
+    """
+    Delete stored nodes no manifest record refers to: batches written after
+    the last checkpoint save of a run that died without pausing.
+    """
+    known = {
+        node_id
+        for entry in manifest.get("files", {}).values()
+        for node_id in entry["node_ids"]
+    }
+    stored = set()
+    PAGE = 5000
+    offset = 0
+    while True:
+        ids = chroma_collection.get(include=[], limit=PAGE, offset=offset)["ids"]
+        if not ids:
+            break
+        stored.update(ids)
+        offset += len(ids)
+    stored.update(rag_bm25.open_index(chroma_collection.name).node_ids())
+    if rag_flat.exists(chroma_collection.name):
+        stored.update(rag_flat.open_index(chroma_collection.name).node_ids())
+    orphans = sorted(stored - known)
+    if orphans:
+        _delete_node_ids(chroma_collection, orphans)
+    return len(orphans)
+
+
+def resume_index_cancellable(
+    collection_name: str,
+    is_cancelled=None,
+    on_progress=None,
+    on_phase=None,
+    on_stats=None,
+    is_aborted=None,
+    extract_workers: int | None = None,
+):
+    """
+    Continue a paused, failed or interrupted indexing run from its
+    checkpoint: nodes stored after the last checkpoint are dropped, then the
+    collection is brought up to date incrementally with the run's folder and
+    options, so files already recorded are not embedded again. A resumed
+    rebuild keeps writing its shadow generation and swaps it in when done;
+    aborting it drops the shadow.
+
+    Raises KeyError if the collection has no checkpoint and ValueError if
+    the run's folder is gone.
+    """
+    found = _checkpointed(collection_name)
+    if found is None:
+        raise KeyError(f"No checkpoint to resume for {collection_name}")
+    physical, manifest = found
+    marker = manifest["checkpoint"]
+    rebuild = physical == rag_aliases.shadow(collection_name)
+    if not path.exists(marker["folder_path"]):
+        raise ValueError(f"Folder not found: {marker['folder_path']}")
     try:
-        chroma_collection = chroma_client.get_collection(name=collection_name)
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        chroma_collection = chroma_client.get_collection(name=physical)
+    except Exception:
+        rag_manifest.delete_manifest(physical)
+        if rebuild:
+            rag_aliases.clear_shadow(collection_name)
+        raise KeyError(f"Collection {collection_name} no longer exists")
 
-        current_index = VectorStoreIndex.from_vector_store(
-            vector_store=vector_store,
-            embed_model=embed_model,
+    def check():
+        if is_cancelled and is_cancelled():
+            raise IndexingCancelled()
+
+    def aborted() -> bool:
+        return bool(is_aborted and is_aborted())
+
+    orphans = _drop_orphans(chroma_collection, manifest)
+    try:
+        result = _update_index_incremental(
+            marker["folder_path"], collection_name, manifest, check,
+            on_progress, on_phase, on_stats, extract_workers,
+            marker.get("streaming", False), marker.get("paths"),
+            aborted, target=physical,
         )
+    except IndexingCancelled:
+        if rebuild and aborted():
+            _drop_physical(physical)
+            rag_aliases.clear_shadow(collection_name)
+        raise
+    if rebuild:
+        _swap_generation(collection_name, physical, indexes.get(physical))
+    return {**result, "resumed": marker["mode"], "orphans_removed": orphans}
 
-        current_collection_name = collection_name
-        return {"status": "success", "collection": collection_name}
-    except Exception as e:
-        raise ValueError(f"Failed to load collection '{collection_name}': {str(e)}")
+
+def discard_checkpoint(collection_name: str) -> dict:
+    """
+    Abort a paused, failed or interrupted run without resuming it. A
+    rebuild's shadow generation is dropped (the live generation is left
+    alone); an incremental run keeps the files it finished, loses any nodes
+    stored after its last checkpoint and drops its checkpoint. Must not be
+    called while a job runs on the collection. Raises KeyError if there is
+    no checkpoint.
+    """
+    found = _checkpointed(collection_name)
+    if found is None:
+        raise KeyError(f"No checkpoint to discard for {collection_name}")
+    physical, manifest = found
+    mode = manifest["checkpoint"].get("mode")
+    if physical == rag_aliases.shadow(collection_name):
+        _drop_physical(physical)
+        rag_aliases.clear_shadow(collection_name)
+        return {"collection": collection_name, "discarded": mode,
+                "orphans_removed": 0}
+    orphans = 0
+    try:
+        chroma_collection = chroma_client.get_collection(name=physical)
+    except Exception:
+        chroma_collection = None
+    if chroma_collection is not None:
+        orphans = _drop_orphans(chroma_collection, manifest)
+        rag_cache.invalidate_collection(physical)
+    manifest.pop("checkpoint", None)
+    rag_manifest.save_manifest(physical, manifest)
+    return {"collection": collection_name, "discarded": mode,
+            "orphans_removed": orphans}
 
 
-def get_context_for_llm(question: str, top_k: int = 3):
+def load_existing_index(collection_name: str = "default"):
     """
-    Get relevant context to inject into LLM prompt.
-    Returns tuple: (context_text, sources_list)
+    (Re)load an existing index from ChromaDB and make it the default
+    collection for requests that do not name one.
     """
-    if current_index is None:
-        return "", []
+    global current_collection_name
 
-    retriever = current_index.as_retriever(similarity_top_k=top_k)
-    nodes = retriever.retrieve(question)
+    physical = rag_aliases.resolve(collection_name)
+    indexes.put(physical, _open_index(physical))
+    current_collection_name = collection_name
+    rag_cache.invalidate_collection(physical)
+    return {"status": "success", "collection": collection_name}
 
-    # Combine all relevant text
-    context_parts = []
-    sources = []
 
+def get_index(collection_name: str | None = None):
+    """
+    Return the index for a collection (default: the current one), loading
+    it lazily. Returns None if no collection is selected or it is missing.
+    """
+    name = collection_name or current_collection_name
+    if not name:
+        return None
+    try:
+        return indexes.get(rag_aliases.resolve(name))
+    except ValueError:
+        return None
+
+
+def has_index(collection_name: str | None = None) -> bool:
+    """Whether a collection (default: the current one) can be queried."""
+    return get_index(collection_name) is not None
+
+
+def _embed_query(question: str, priority: str = llm_service.INTERACTIVE,
+                 user=None):
+    """
+    Embed a query through Ollama (in a scheduler slot of `priority` for
+    `user`), reusing a cached embedding if any.
+    """
+    key = (embed_model.model_name, question)
+    embedding = rag_cache.query_embeddings.get(key)
+    if embedding is None:
+        with llm_service.scheduler.slot_sync(priority, user):
+            embedding = embed_model.get_query_embedding(question)
+        rag_cache.query_embeddings.put(key, embedding)
+    return embedding
+
+
+def _fetch_nodes(collection_name: str, node_ids: list) -> dict:
+    """Load stored chunks by id from Chroma as {node_id: node}."""
+    from llama_index.core.schema import TextNode
+    from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+    if not node_ids:
+        return {}
+    data = chroma_client.get_collection(name=collection_name).get(
+        ids=node_ids, include=["documents", "metadatas"]
+    )
+    found = {}
+    for node_id, text, meta in zip(
+        data.get("ids") or [], data.get("documents") or [],
+        data.get("metadatas") or [],
+    ):
+        try:
+            node = metadata_dict_to_node(meta or {})
+            node.set_content(text or "")
+        except Exception:
+            node = TextNode(text=text or "", id_=node_id, metadata=meta or {})
+        found[node_id] = node
+    return found
+
+
+def _vector_search(index, collection_name: str, question: str, embedding,
+                   top_k: int):
+    """Nearest chunks by embedding, from Chroma or the flat backend."""
+    from llama_index.core import QueryBundle
+    from llama_index.core.schema import NodeWithScore
+
+    if isinstance(index, rag_flat.FlatIndex):
+        hits = index.search(embedding, top_k)
+        nodes = _fetch_nodes(collection_name, [i for i, _score in hits])
+        return [
+            NodeWithScore(node=nodes[node_id], score=score)
+            for node_id, score in hits
+            if node_id in nodes
+        ]
+    retriever = index.as_retriever(similarity_top_k=top_k)
+    return retriever.retrieve(
+        QueryBundle(query_str=question, embedding=embedding)
+    )
+
+
+def _fetch_embeddings(index, collection_name: str, node_ids: list) -> dict:
+    """Stored embeddings of chunks as {node_id: vector}."""
+    if isinstance(index, rag_flat.FlatIndex):
+        return index.vectors(node_ids)
+    if not node_ids:
+        return {}
+    data = chroma_client.get_collection(name=collection_name).get(
+        ids=node_ids, include=["embeddings"]
+    )
+    embeddings = data.get("embeddings")
+    if embeddings is None:
+        return {}
+    return dict(zip(data.get("ids") or [], embeddings))
+
+
+class _Timer:
+    """Collects per-stage wall times (ms) of one retrieval."""
+
+    def __init__(self):
+        self.timings = {}
+        self.started = self._last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self._last) * 1000, 2)
+        self._last = now
+
+
+def _retrieve(index, collection_name: str, question: str, top_k: int,
+              hybrid: bool = True, mmr: bool = False, timer=None,
+              priority: str = llm_service.INTERACTIVE, user=None):
+    """
+    Retrieve top_k nodes for a question. With hybrid=True (and a BM25 index
+    for the collection), the vector and BM25 rankings — 2 * top_k candidates
+    each — are merged with reciprocal-rank fusion and the fused score is
+    reported as the node score. With mmr=True, rag_rerank.OVERFETCH * top_k
+    candidates are retrieved that way and re-ranked with maximal marginal
+    relevance to pick top_k diverse chunks: the retrieval (fused) score is
+    the relevance term, stored embeddings measure redundancy.
+    Stage times are recorded on `timer` (a _Timer) if given; the query is
+    embedded at `priority` for `user` (see llm_service.scheduler).
+    """
+    from llama_index.core.schema import NodeWithScore
+
+    timer = timer or _Timer()
+    want_k = top_k * max(1, rag_rerank.OVERFETCH) if mmr else top_k
+    hybrid = hybrid and rag_bm25.exists(collection_name)
+    fetch_k = want_k * 2 if hybrid else want_k
+    embedding = _embed_query(question, priority, user)
+    timer.lap("embed")
+    vector_hits = _vector_search(
+        index, collection_name, question, embedding, fetch_k
+    )
+    timer.lap("vector")
+    if hybrid:
+        lexical_hits = rag_bm25.open_index(collection_name).search(
+            question, fetch_k
+        )
+        timer.lap("bm25")
+        by_id = {hit.node.node_id: hit.node for hit in vector_hits}
+        fused = rag_bm25.reciprocal_rank_fusion([
+            [hit.node.node_id for hit in vector_hits],
+            [node_id for node_id, _score in lexical_hits],
+        ])[:want_k]
+        by_id.update(_fetch_nodes(
+            collection_name,
+            [node_id for node_id, _score in fused if node_id not in by_id],
+        ))
+        hits = [
+            NodeWithScore(node=by_id[node_id], score=score)
+            for node_id, score in fused
+            if node_id in by_id
+        ]
+        timer.lap("fusion")
+    else:
+        hits = vector_hits[:want_k]
+    if not mmr or len(hits) <= top_k:
+        return hits[:top_k]
+
+    embeddings = _fetch_embeddings(
+        index, collection_name, [hit.node.node_id for hit in hits]
+    )
+    hits = [hit for hit in hits if hit.node.node_id in embeddings]
+    # Hybrid hits are ranked by their fused score, which carries the BM25
+    # signal the query embedding alone would lose.
+    picked = rag_rerank.mmr(
+        embedding, [embeddings[hit.node.node_id] for hit in hits], top_k,
+        relevance=[hit.score for hit in hits] if hybrid else None,
+    )
+    timer.lap("mmr")
+    return [hits[i] for i in picked]
+
+
+def retrieve_context(
+    question: str,
+    top_k: int = 3,
+    hybrid: bool = True,
+    collection_name: str | None = None,
+    mmr: bool = False,
+    timings: dict | None = None,
+    priority: str = llm_service.INTERACTIVE,
+    user=None,
+) -> list:
+    """
+    Retrieve the chunks relevant to `question` from `collection_name`
+    (default: the current collection) as source dicts, best first, each
+    with the chunk's full text under "content". The collection's live
+    generation is resolved once, so a query racing a rebuild's swap stays
+    on one generation.
+
+    With hybrid=True, vector search is fused with the collection's BM25
+    index so exact identifiers and names are found too. With mmr=True the
+    top_k chunks are picked for diversity from an over-fetched candidate set
+    (see _retrieve). Query embeddings and retrieved nodes are served from
+    rag_cache when the same question was asked of the same collection
+    generation before. If a `timings` dict is passed, it is filled with the
+    per-stage retrieval times in ms. The query embedding is scheduled at
+    `priority` for `user` (see llm_service.scheduler).
+    """
+    collection_name = collection_name or current_collection_name
+    if not collection_name:
+        return []
+    physical = rag_aliases.resolve(collection_name)
+    try:
+        index = indexes.get(physical)
+    except ValueError:
+        return []
+
+    timer = _Timer()
+    cache_key = rag_cache.retrieval_key(
+        physical, question, top_k, hybrid, mmr
+    )
+    nodes = rag_cache.retrievals.get(cache_key)
+    cache_hit = nodes is not None
+    if nodes is None:
+        nodes = _retrieve(
+            index, physical, question, top_k, hybrid, mmr, timer,
+            priority, user,
+        )
+        rag_cache.retrievals.put(cache_key, nodes)
+    if timings is not None:
+        timings.update(timer.timings)
+        timings["total"] = round(
+            (time.perf_counter() - timer.started) * 1000, 2
+        )
+        timings["cache_hit"] = cache_hit
+
+    sources = []
     for i, node in enumerate(nodes, 1):
-        context_parts.append(f"[Source {i}]\n{node.node.text}\n")
         meta = node.node.metadata or {}
         sources.append({
             "id": i,
@@ -244,56 +1452,184 @@ def get_context_for_llm(question: str, top_k: int = 3):
                 if meta.get("file_path") else "Document"
             ),
             "file_path": meta.get("file_path"),
+            # Other files a deduplicated chunk was found in.
+            "also_in": rag_dedup.source_paths(meta)[1:],
             "text": node.node.text[:200] + "...",
+            "content": node.node.text,
             "score": node.score,
             "metadata": meta,  # Contains file path, etc.
         })
+    return sources
+
+
+def context_chunks(sources: list) -> list:
+    """
+    retrieve_context sources as context_packer chunks, taking their full
+    text out of the source dicts; chunks of one file share a "source" so
+    the splitter's overlap between them is only packed once.
+    """
+    return [
+        {
+            "label": f"[Source {s['id']}]",
+            "text": s.pop("content"),
+            "score": s["score"],
+            "source": s["file_path"],
+        }
+        for s in sources
+    ]
+
 
+def get_context_for_llm(
+    question: str,
+    top_k: int = 3,
+    hybrid: bool = True,
+    collection_name: str | None = None,
+    mmr: bool = False,
+    timings: dict | None = None,
+):
+    """
+    Get relevant context to inject into LLM prompt, unbudgeted (see
+    retrieve_context for the arguments and context_packer for packing it
+    into a token budget).
+    Returns tuple: (context_text, sources_list)
+    """
+    sources = retrieve_context(
+        question, top_k, hybrid, collection_name, mmr, timings
+    )
+    context_parts = [
+        f"[Source {s['id']}]\n{s.pop('content')}\n" for s in sources
+    ]
     return "\n".join(context_parts), sources
 
 
 def list_collections():
     """
-    List all available collections in ChromaDB.
+    List all available collections in ChromaDB with their totals, read from
+    the manifest catalog. Only collections without a manifest (indexed
+    before manifests existed) are counted in Chroma.
+
+    Collections are listed by name with their live generation; rebuilds in
+    progress and replaced generations are not listed. A collection whose
+    first build has not finished yet is listed with an empty count.
     """
-    collections = chroma_client.list_collections()
-    return [{"name": col.name, "count": col.count()} for col in collections]
+    catalog = rag_manifest.all_collection_stats()
+    aliases = rag_aliases.aliases()
+    shadows = rag_aliases.shadows()
+    live = {physical: name for name, physical in aliases.items()}
+    chroma_names = [c.name for c in chroma_client.list_collections()]
+    result = []
+    for physical in chroma_names:
+        if physical in live:
+            name = live[physical]
+        elif physical in aliases or rag_aliases.generation_of(physical):
+            continue
+        else:
+            name = physical
+        stats = catalog.get(physical)
+        if stats is None:
+            stats = rag_manifest.collection_stats(physical)
+        if stats is None:
+            entry = {
+                "name": name,
+                "count": chroma_client.get_collection(name=physical).count(),
+            }
+        else:
+            entry = {
+                "name": name,
+                "count": stats["chunks"],
+                "files": stats["files"],
+                "bytes": stats["bytes"],
+                "source_folder": stats["source_folder"],
+                "created_at": stats["created_at"],
+                "updated_at": stats["updated_at"],
+                "checkpoint": stats["checkpoint"],
+            }
+        entry["backend"] = _backend_of(physical)
+        entry["generation"] = physical
+        shadow = shadows.get(name)
+        if shadow is not None:
+            entry["rebuild"] = _shadow_state(catalog, shadow)
+        result.append(entry)
+    listed = {entry["name"] for entry in result}
+    for name, shadow in shadows.items():
+        if name not in listed and shadow in chroma_names:
+            result.append({
+                "name": name,
+                "count": 0,
+                "backend": _backend_of(shadow),
+                "generation": None,
+                "rebuild": _shadow_state(catalog, shadow),
+            })
+    return result
+
+
+def _shadow_state(catalog: dict, shadow: str) -> dict:
+    stats = catalog.get(shadow) or {}
+    return {
+        "generation": shadow,
+        "count": stats.get("chunks", 0),
+        "files": stats.get("files", 0),
+        "checkpoint": stats.get("checkpoint"),
+    }
 
 
-def get_current_collection_info():
+def get_current_collection_info(collection_name: str | None = None):
     """
-    Get info about the currently loaded collection.
+    Get info about a collection (default: the current one) and about which
+    collections are loaded in memory.
     """
-    if current_index is None:
-        return {"status": "No collection loaded"}
+    name = collection_name or current_collection_name
+    if not has_index(name):
+        return {"status": "No collection loaded", "registry": indexes.stats()}
+
+    info = {
+        "collection_name": name,
+        "status": "loaded",
+        "backend": get_backend(name),
+        "cache": rag_cache.stats(),
+        "registry": indexes.stats(),
+    }
+    if info["backend"] == "flat":
+        info["flat"] = rag_flat.open_index(rag_aliases.resolve(name)).stats()
+    return info
+
 
+def get_cache_stats():
+    """
+    Hit rates of the query-embedding and retrieval caches, and of the
+    extracted PDF text cache used when indexing.
+    """
+    text_cache = rag_extraction.get_text_cache()
     return {
-        "collection_name": current_collection_name,
-        "status": "loaded"
+        **rag_cache.stats(),
+        "extracted_text": text_cache.stats() if text_cache else None,
     }
 
 
 def delete_collection(collection_name: str):
     """
-    Delete a collection from ChromaDB. If it is the active one, clear the
-    in-memory active index too.
+    Delete a collection (every generation of it, including an unfinished
+    rebuild) from ChromaDB and drop its loaded index. If it is the current
+    collection, clear that too.
     """
-    global current_index, current_collection_name
+    global current_collection_name
 
     try:
         existing = {c.name for c in chroma_client.list_collections()}
-        if collection_name not in existing:
+        shadow = rag_aliases.shadow(collection_name)
+        if (rag_aliases.resolve(collection_name) not in existing
+                and shadow not in existing):
             raise ValueError(f"Collection '{collection_name}' not found")
-        chroma_client.delete_collection(name=collection_name)
     except ValueError:
         raise
     except Exception as e:
         raise ValueError(
             f"Failed to delete collection '{collection_name}': {str(e)}"
         )
+    for physical in rag_aliases.remove(collection_name):
+        _drop_physical(physical)
 
     if current_collection_name == collection_name:
-        current_index = None
         current_collection_name = None
 
     return {"status": "deleted", "collection": collection_name}
@@ -301,14 +1637,19 @@ def delete_collection(collection_name: str):
 
 def get_collection_files(collection_name: str):
     """
-    Return the distinct source files indexed in a collection, read from the
-    stored chunk metadata (file_name / file_path).
+    Return the distinct source files indexed in a collection, from the
+    manifest catalog (with chunk counts and sizes), or for collections
+    without a manifest from the stored chunk metadata (file_name /
+    file_path).
     """
+    physical = rag_aliases.resolve(collection_name)
     try:
-        existing = {c.name for c in chroma_client.list_collections()}
-        if collection_name not in existing:
+        if not _physical_exists(physical):
             raise ValueError(f"Collection '{collection_name}' not found")
-        collection = chroma_client.get_collection(name=collection_name)
+        files = rag_manifest.list_files(physical)
+        if files is not None:
+            return {"collection": collection_name, "files": files}
+        collection = chroma_client.get_collection(name=physical)
         data = collection.get(include=["metadatas"])
     except ValueError:
         raise
@@ -338,11 +1679,21 @@ def get_collection_files(collection_name: str):
 
 def get_collection_source_folder(collection_name: str):
     """
-    Best-effort recovery of the folder a collection was indexed from, by
-    taking the common parent directory of the stored file paths.
+    The folder a collection was indexed from, as recorded in its manifest.
+    Without one, it is recovered best-effort by taking the common parent
+    directory of the stored file paths.
     """
     import os
 
+    if not _collection_exists(collection_name):
+        raise ValueError(f"Collection '{collection_name}' not found")
+    stats = rag_manifest.collection_stats(rag_aliases.resolve(collection_name))
+    if stats is not None and stats["source_folder"]:
+        return {
+            "collection": collection_name,
+            "folder_path": stats["source_folder"],
+        }
+
     info = get_collection_files(collection_name)
     paths = [
         f["file_path"] for f in info["files"] if f.get("file_path")
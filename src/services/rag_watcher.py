@@ -0,0 +1,251 @@
+"""
+Auto-reindex watcher for indexed RAG folders.
+
+Opt-in per collection: once a collection is watched, its source folder is
+observed with watchdog and created / modified / deleted / moved files are
+collected for DEBOUNCE_SECONDS of quiet (editors and copies fire bursts of
+events) before one incremental job is queued for exactly those files. The
+job runs on the normal rag_job workers at WATCH_PRIORITY, so a user's own
+indexing request always goes first and per-collection locking still holds.
+
+The set of watched collections is persisted so watches survive a restart.
+"""
+
+import json
+import os
+import threading
+
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from services import rag_job, rag_manifest, rag_service
+from services.dir_config import get_rag_state_dir
+
+DEBOUNCE_SECONDS = float(os.environ.get("XCLOUD_RAG_WATCH_DEBOUNCE", "5"))
+# Below interactive (0) so watcher updates never delay a requested index.
+WATCH_PRIORITY = -10
+# Wait this long before retrying when the job queue was full.
+RETRY_SECONDS = 30.0
+
+
+def _watches_path() -> str:
+    return os.path.join(get_rag_state_dir(), "watches.json")
+
+
+def _load_watched() -> list:
+    try:
+        with open(_watches_path(), "r") as f:
+            return list(json.load(f))
+    except (OSError, json.JSONDecodeError, TypeError):
+        return []
+
+
+def _save_watched(names) -> None:
+    os.makedirs(get_rag_state_dir(), exist_ok=True)
+    target = _watches_path()
+    tmp = target + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(sorted(names), f)
+    os.replace(tmp, target)
+
+
+def _watch_folder(collection_name: str) -> str:
+    """
+    The folder to observe, spelled the way the collection's stored file
+    paths are (absolute or relative), so event paths match manifest keys.
+    Only collections with a manifest can be watched: without one an
+    incremental job would fall back to a full rebuild.
+    """
+    manifest = rag_service.get_manifest(collection_name)
+    if manifest is None:
+        raise ValueError(
+            f"Collection '{collection_name}' has no file manifest; "
+            "re-index it once before watching."
+        )
+    return rag_manifest.source_folder(manifest)
+
+
+class CollectionChangeHandler(FileSystemEventHandler):
+    """Collects changed paths of one collection and flushes them debounced."""
+
+    def __init__(self, collection_name: str, folder_path: str):
+        self.collection_name = collection_name
+        self.folder_path = folder_path
+        self._pending = set()
+        self._timer = None
+        self._lock = threading.Lock()
+        self.last_job_id = None
+
+    def on_created(self, event):
+        self._on_event(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._on_event(event.src_path, False)
+
+    def on_deleted(self, event):
+        self._on_event(event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        self._on_event(event.src_path, event.is_directory)
+        self._on_event(event.dest_path, event.is_directory)
+
+    def _on_event(self, file_path: str, is_directory: bool):
+        if is_directory:
+            paths = self._paths_under(file_path)
+        elif (os.path.splitext(file_path)[1].lower()
+              in rag_service.SUPPORTED_EXTENSIONS):
+            paths = [file_path]
+        else:
+            return
+        if paths:
+            self._add(paths, DEBOUNCE_SECONDS)
+
+    def _paths_under(self, dir_path: str) -> list:
+        """
+        Directory events: known files below it (covers removal / rename of a
+        whole tree) plus whatever is on disk there now (covers a tree being
+        moved in, which watchdog reports as a single directory event).
+        """
+        prefix = dir_path.rstrip(os.sep) + os.sep
+        manifest = rag_service.get_manifest(self.collection_name) or {}
+        paths = [p for p in manifest.get("files", {}) if p.startswith(prefix)]
+        if os.path.isdir(dir_path):
+            paths.extend(rag_service.iter_source_files(dir_path))
+        return paths
+
+    def _add(self, paths, delay: float):
+        with self._lock:
+            self._pending.update(paths)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            paths = sorted(self._pending)
+            self._pending.clear()
+            self._timer = None
+        if not paths:
+            return
+        try:
+            job = rag_job.start_index_job(
+                self.folder_path, self.collection_name, incremental=True,
+                priority=WATCH_PRIORITY, paths=paths,
+            )
+        except RuntimeError as e:
+            print(f"[rag-watcher] {self.collection_name}: {e} Retrying.")
+            self._add(paths, RETRY_SECONDS)
+            return
+        self.last_job_id = job["job_id"]
+        print(f"[rag-watcher] {self.collection_name}: queued update of "
+              f"{len(paths)} file(s) ({job['job_id']})")
+
+    def cancel(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending.clear()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+# --- registry ---
+
+_observer = None
+_watches = {}  # collection_name -> (handler, ObservedWatch)
+_lock = threading.Lock()
+
+
+def _schedule_locked(collection_name: str) -> dict:
+    folder = _watch_folder(collection_name)
+    if not os.path.isdir(folder):
+        raise ValueError(
+            f"Collection '{collection_name}' has no source folder to watch."
+        )
+    handler = CollectionChangeHandler(collection_name, folder)
+    watch = _observer.schedule(handler, folder, recursive=True)
+    _watches[collection_name] = (handler, watch)
+    return _describe(collection_name, handler)
+
+
+def _describe(collection_name: str, handler: CollectionChangeHandler) -> dict:
+    return {
+        "collection": collection_name,
+        "folder_path": handler.folder_path,
+        "pending_files": handler.pending(),
+        "last_job_id": handler.last_job_id,
+    }
+
+
+def start_rag_watchers() -> Observer:
+    """Start the shared observer and re-arm persisted watches."""
+    global _observer
+    with _lock:
+        _observer = Observer()
+        _observer.start()
+        for name in _load_watched():
+            try:
+                _schedule_locked(name)
+                print(f"[rag-watcher] Watching collection '{name}'")
+            except (ValueError, OSError) as e:
+                print(f"[rag-watcher] Not watching '{name}': {e}")
+        return _observer
+
+
+def stop_rag_watchers() -> None:
+    global _observer
+    with _lock:
+        for handler, _ in _watches.values():
+            handler.cancel()
+        _watches.clear()
+        if _observer is not None:
+            _observer.stop()
+            _observer.join()
+            _observer = None
+
+
+def watch_collection(collection_name: str) -> dict:
+    """
+    Opt a collection in to auto-reindexing. Raises KeyError if it does not
+    exist and ValueError if it has no manifest or source folder.
+    """
+    if not rag_service.has_index(collection_name):
+        raise KeyError(f"Collection '{collection_name}' not found.")
+    with _lock:
+        if _observer is None:
+            raise RuntimeError("RAG watcher is not running.")
+        if collection_name in _watches:
+            return _describe(collection_name, _watches[collection_name][0])
+        info = _schedule_locked(collection_name)
+        _save_watched(set(_load_watched()) | {collection_name})
+        return info
+
+
+def unwatch_collection(collection_name: str) -> dict:
+    """Stop auto-reindexing a collection. Raises KeyError if not watched."""
+    with _lock:
+        entry = _watches.pop(collection_name, None)
+        watched = set(_load_watched())
+        if entry is None and collection_name not in watched:
+            raise KeyError(f"Collection '{collection_name}' is not watched.")
+        if entry is not None:
+            handler, watch = entry
+            handler.cancel()
+            if _observer is not None:
+                _observer.unschedule(watch)
+        _save_watched(watched - {collection_name})
+        return {"collection": collection_name, "watching": False}
+
+
+def list_watches() -> list:
+    with _lock:
+        return [
+            _describe(name, handler)
+            for name, (handler, _) in sorted(_watches.items())
+        ]
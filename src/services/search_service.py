@@ -14,6 +14,15 @@ def web_search(query: str, max_results: int = 5) -> list[dict]:
         return [{"error": str(e)}]
 
 
+def format_result(result: dict) -> str:
+    """The context text of one search result (below its source label)."""
+    return (
+        f"Title: {result.get('title', 'N/A')}\n"
+        f"URL: {result.get('href', 'N/A')}\n"
+        f"Snippet: {result.get('body', 'N/A')}"
+    )
+
+
 def format_search_results_as_context(query: str, max_results: int = 5) -> str:
     """
     Search the web and format results as context text for the LLM.
@@ -26,10 +35,5 @@ def format_search_results_as_context(query: str, max_results: int = 5) -> str:
         return f"Web search failed: {results[0]['error']}"
     context_parts = []
     for i, result in enumerate(results, 1):
-        context_parts.append(
-            f"[Web Source {i}]\n"
-            f"Title: {result.get('title', 'N/A')}\n"
-            f"URL: {result.get('href', 'N/A')}\n"
-            f"Snippet: {result.get('body', 'N/A')}\n"
-        )
+        context_parts.append(f"[Web Source {i}]\n{format_result(result)}\n")
     return "\n".join(context_parts)